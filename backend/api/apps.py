@@ -4,3 +4,37 @@ from django.apps import AppConfig
 class ApiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'api'
+
+    def ready(self):
+        from django.db.backends.signals import connection_created
+        from django.db.models.signals import (
+            post_delete,
+            post_save,
+            pre_delete,
+        )
+
+        from api.filters.pantry import touch_ingredient_recipes
+
+        from api.filters.search import (
+            index_ingredient_recipes,
+            index_recipe,
+            unindex_recipe,
+        )
+        from core.cache.cache import ingredients_cache, tags_cache
+        from core.metrics.metrics import count_connection
+        from recipes.models import (
+            Ingredient,
+            Recipe,
+            TagRecipe,
+            release_recipe_images,
+        )
+
+        for signal in (post_save, post_delete):
+            signal.connect(ingredients_cache.invalidate, sender=Ingredient)
+            signal.connect(tags_cache.invalidate, sender=TagRecipe)
+        post_save.connect(index_recipe, sender=Recipe)
+        post_delete.connect(unindex_recipe, sender=Recipe)
+        post_save.connect(index_ingredient_recipes, sender=Ingredient)
+        pre_delete.connect(touch_ingredient_recipes, sender=Ingredient)
+        post_delete.connect(release_recipe_images, sender=Recipe)
+        connection_created.connect(count_connection)
@@ -0,0 +1,608 @@
+"""Бюджеты запросов к базе для маршрутов API."""
+import base64
+import io
+import logging
+import tempfile
+import time
+from contextlib import contextmanager
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection, reset_queries
+from django.db.models import Count
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLResolver
+from PIL import Image
+from rest_framework.test import APIClient
+
+from api import urls as api_urls
+from api.filters.pantry import PantryIndex
+from core.benchmarks.benchmarks import percentile
+from recipes.models import (
+    FavoriteRecipeUser,
+    FeedEntry,
+    Ingredient,
+    Recipe,
+    ShoppingCartUser,
+    TagRecipe,
+)
+from users import urls as users_urls
+from users.models import Follow
+
+User = get_user_model()
+
+ANONYMOUS = 'anonymous'
+AUTHENTICATED = 'authenticated'
+
+PASSWORD = 'Budget-check-2023'
+
+RECIPE = {
+    'name': 'Рецепт для проверки бюджета',
+    'text': 'Описание',
+    'cooking_time': 10,
+    'image': '{image}',
+    'tags': ['{tag}'],
+    'ingredients': [{'id': '{ingredient}', 'amount': 100}],
+}
+
+# Маршрут (имя URL, метод) -> замер. path и data - адрес и тело
+# запроса с подстановками из контекста ({recipe}, {author} и т.д.;
+# {call} - номер вызова). page_size - параметры размера страницы,
+# по ним маршрут замеряется на нескольких размерах. save - ключ
+# контекста, в который записывается id созданного объекта.
+# budgets - {зритель: (запросов к базе, p95 в мс, статус ответа)};
+# количество запросов должно совпадать точно, p95 времени ответа -
+# не превышать бюджет.
+# Маршруты выполняются в порядке объявления, поэтому добавление
+# и удаление идут парами и не меняют данные между повторами.
+BUDGETS = {
+    ('api-root', 'get'): {
+        'path': '/api/',
+        'budgets': {
+            ANONYMOUS: (0, 50, 200),
+            AUTHENTICATED: (0, 50, 200),
+        },
+    },
+    ('recipes-list', 'get'): {
+        'path': '/api/recipes/',
+        'page_size': ('limit',),
+        'budgets': {
+            ANONYMOUS: (4, 200, 200),
+            AUTHENTICATED: (7, 200, 200),
+        },
+    },
+    ('recipes-list', 'post'): {
+        'path': '/api/recipes/',
+        'data': RECIPE,
+        'save': 'created',
+        'budgets': {
+            ANONYMOUS: (0, 50, 401),
+            AUTHENTICATED: (50, 300, 201),
+        },
+    },
+    ('recipes-detail', 'get'): {
+        'path': '/api/recipes/{recipe}/',
+        'budgets': {
+            ANONYMOUS: (3, 100, 200),
+            AUTHENTICATED: (6, 100, 200),
+        },
+    },
+    ('recipes-detail', 'put'): {
+        'path': '/api/recipes/{created}/',
+        'data': RECIPE,
+        'budgets': {
+            ANONYMOUS: (0, 50, 401),
+            AUTHENTICATED: (63, 300, 200),
+        },
+    },
+    ('recipes-detail', 'patch'): {
+        'path': '/api/recipes/{created}/',
+        'data': {'cooking_time': 15, 'ingredients': RECIPE['ingredients']},
+        'budgets': {
+            ANONYMOUS: (0, 50, 401),
+            AUTHENTICATED: (18, 300, 200),
+        },
+    },
+    ('recipes-detail', 'delete'): {
+        'path': '/api/recipes/{created}/',
+        'budgets': {
+            ANONYMOUS: (0, 50, 401),
+            AUTHENTICATED: (29, 300, 204),
+        },
+    },
+    ('recipes-favorite', 'post'): {
+        'path': '/api/recipes/{recipe}/favorite/',
+        'budgets': {
+            ANONYMOUS: (0, 50, 401),
+            AUTHENTICATED: (9, 100, 201),
+        },
+    },
+    ('recipes-favorite', 'delete'): {
+        'path': '/api/recipes/{recipe}/favorite/',
+        'budgets': {
+            ANONYMOUS: (0, 50, 401),
+            AUTHENTICATED: (4, 100, 204),
+        },
+    },
+    ('recipes-shopping-cart', 'post'): {
+        'path': '/api/recipes/{recipe}/shopping_cart/',
+        'budgets': {
+            ANONYMOUS: (0, 50, 401),
+            AUTHENTICATED: (14, 100, 201),
+        },
+    },
+    ('recipes-shopping-cart', 'delete'): {
+        'path': '/api/recipes/{recipe}/shopping_cart/',
+        'budgets': {
+            ANONYMOUS: (0, 50, 401),
+            AUTHENTICATED: (12, 100, 204),
+        },
+    },
+    ('recipes-download-shopping-cart', 'get'): {
+        'path': '/api/recipes/download_shopping_cart/',
+        'budgets': {
+            ANONYMOUS: (0, 50, 401),
+            AUTHENTICATED: (1, 100, 200),
+        },
+    },
+    ('recipes-feed', 'get'): {
+        'path': '/api/recipes/feed/',
+        'page_size': ('limit',),
+        'budgets': {
+            ANONYMOUS: (0, 50, 401),
+            AUTHENTICATED: (7, 200, 200),
+        },
+    },
+    ('recipes-similar', 'get'): {
+        'path': '/api/recipes/{recipe}/similar/',
+        'budgets': {
+            ANONYMOUS: (2, 100, 200),
+            AUTHENTICATED: (2, 100, 200),
+        },
+    },
+    ('recipes-pantry', 'get'): {
+        'path': '/api/recipes/pantry/?ingredients={ingredients}',
+        'page_size': ('limit',),
+        'budgets': {
+            ANONYMOUS: (2, 200, 200),
+            AUTHENTICATED: (2, 200, 200),
+        },
+    },
+    ('tags-list', 'get'): {
+        'path': '/api/tags/',
+        'budgets': {
+            ANONYMOUS: (1, 50, 200),
+            AUTHENTICATED: (1, 50, 200),
+        },
+    },
+    ('tags-detail', 'get'): {
+        'path': '/api/tags/{tag}/',
+        'budgets': {
+            ANONYMOUS: (1, 50, 200),
+            AUTHENTICATED: (1, 50, 200),
+        },
+    },
+    ('ingredients-list', 'get'): {
+        'path': '/api/ingredients/?name={ingredient_prefix}',
+        'budgets': {
+            ANONYMOUS: (1, 100, 200),
+            AUTHENTICATED: (1, 100, 200),
+        },
+    },
+    ('ingredients-detail', 'get'): {
+        'path': '/api/ingredients/{ingredient}/',
+        'budgets': {
+            ANONYMOUS: (1, 50, 200),
+            AUTHENTICATED: (1, 50, 200),
+        },
+    },
+    ('subscriptions', 'get'): {
+        'path': '/api/users/subscriptions/',
+        'page_size': ('limit', 'recipes_limit'),
+        'budgets': {
+            ANONYMOUS: (0, 50, 401),
+            AUTHENTICATED: (3, 200, 200),
+        },
+    },
+    ('subscribe', 'post'): {
+        'path': '/api/users/{author}/subscribe/',
+        'budgets': {
+            ANONYMOUS: (0, 50, 401),
+            AUTHENTICATED: (11, 100, 201),
+        },
+    },
+    ('subscribe', 'delete'): {
+        'path': '/api/users/{author}/subscribe/',
+        'budgets': {
+            ANONYMOUS: (0, 50, 401),
+            AUTHENTICATED: (6, 100, 204),
+        },
+    },
+    ('users-list', 'get'): {
+        'path': '/api/users/',
+        'budgets': {
+            ANONYMOUS: (1, 300, 200),
+            AUTHENTICATED: (2, 300, 200),
+        },
+    },
+    ('users-list', 'post'): {
+        'path': '/api/users/',
+        'data': {
+            'email': 'budget{call}@example.com',
+            'username': 'budget{call}',
+            'first_name': 'Бюджет',
+            'last_name': 'Проверка',
+            'password': PASSWORD,
+        },
+        'budgets': {
+            ANONYMOUS: (5, 100, 201),
+        },
+    },
+    ('users-detail', 'get'): {
+        'path': '/api/users/{author}/',
+        'budgets': {
+            ANONYMOUS: (1, 50, 200),
+            AUTHENTICATED: (2, 50, 200),
+        },
+    },
+    ('users-me', 'get'): {
+        'path': '/api/users/me/',
+        'budgets': {
+            AUTHENTICATED: (1, 50, 200),
+        },
+    },
+    ('users-set-password', 'post'): {
+        'path': '/api/users/set_password/',
+        'data': {'new_password': PASSWORD, 'current_password': PASSWORD},
+        'budgets': {
+            ANONYMOUS: (0, 50, 401),
+            AUTHENTICATED: (1, 100, 204),
+        },
+    },
+    ('login', 'post'): {
+        'path': '/api/auth/token/login/',
+        'data': {'email': '{email}', 'password': PASSWORD},
+        'budgets': {
+            ANONYMOUS: (6, 100, 200),
+        },
+    },
+    ('logout', 'post'): {
+        'path': '/api/auth/token/logout/',
+        'budgets': {
+            ANONYMOUS: (0, 50, 401),
+            AUTHENTICATED: (3, 50, 204),
+        },
+    },
+}
+
+# Маршруты без бюджета с причиной. Остальные маршруты api/urls.py
+# и users/urls.py обязаны быть в BUDGETS.
+EXCLUDED = {
+    ('users-activation', 'post'): 'активация по письму отключена',
+    ('users-resend-activation', 'post'): 'активация по письму отключена',
+    ('users-reset-password', 'post'): 'отправляет письмо',
+    ('users-reset-password-confirm', 'post'): 'нужен токен из письма',
+    ('users-reset-username', 'post'): 'отправляет письмо',
+    ('users-reset-username-confirm', 'post'): 'нужен токен из письма',
+    ('users-set-username', 'post'): 'меняет логин пользователя',
+    ('users-me', 'put'): 'сериализатор регистрации требует пароль',
+    ('users-me', 'patch'): 'сериализатор регистрации требует пароль',
+    ('users-me', 'delete'): 'удаляет пользователя',
+    ('users-detail', 'put'): 'сериализатор регистрации требует пароль',
+    ('users-detail', 'patch'): 'сериализатор регистрации требует пароль',
+    ('users-detail', 'delete'): 'удаляет пользователя',
+}
+
+
+def walk(patterns):
+    """Перечисляет конечные шаблоны URL вложенных include."""
+
+    for pattern in patterns:
+        if isinstance(pattern, URLResolver):
+            yield from walk(pattern.url_patterns)
+        else:
+            yield pattern
+
+
+def routes():
+    """
+    Маршруты api/urls.py и users/urls.py: пары (имя URL, метод).
+    Шаблоны с суффиксом формата и перекрытые более ранними
+    шаблонами с тем же адресом пропускаются, как и методы HEAD
+    и OPTIONS (DRF добавляет head в действия вьюсета при первом
+    запросе).
+    """
+
+    seen = set()
+    result = []
+    for module in (users_urls, api_urls):
+        for pattern in walk(module.urlpatterns):
+            regex = str(pattern.pattern)
+            if '(?P<format>' in regex or regex in seen:
+                continue
+            seen.add(regex)
+            actions = getattr(pattern.callback, 'actions', None)
+            if actions is not None:
+                methods = list(actions)
+            else:
+                view = getattr(pattern.callback, 'view_class', None)
+                methods = [
+                    method for method in view.http_method_names
+                    if hasattr(view, method)
+                ] if view is not None else ['get']
+            for method in methods:
+                if method in ('head', 'options'):
+                    continue
+                if (pattern.name, method) not in result:
+                    result.append((pattern.name, method))
+    return result
+
+
+def image_data():
+    """Маленькое изображение в base64, как его присылает фронтенд."""
+
+    buffer = io.BytesIO()
+    Image.new('RGB', (64, 64), (200, 120, 40)).save(buffer, 'PNG')
+    return (
+        'data:image/png;base64,'
+        + base64.b64encode(buffer.getvalue()).decode()
+    )
+
+
+def budget_context():
+    """
+    Выбирает объекты для подстановки в адреса: пользователя
+    с избранным и подписками, рецепт с ингредиентами, которого
+    нет у него в избранном и списке продуктов, и автора, на которого
+    он не подписан. Пользователю задаётся пароль для входа, а лента
+    заполняется рецептами авторов из подписок, чтобы она не была
+    пустой на малых данных. Возвращает пользователя и контекст.
+    """
+
+    viewer = User.objects.annotate(
+        favorites=Count('favorite_recipes', distinct=True),
+        followings=Count('follower', distinct=True),
+    ).filter(favorites__gt=0, followings__gt=0).order_by('id').first()
+    viewer.set_password(PASSWORD)
+    viewer.save(update_fields=('password',))
+    for author in User.objects.filter(author__follower=viewer):
+        FeedEntry.objects.follow(viewer, author)
+
+    recipe = Recipe.objects.filter(
+        ingredients_in_recipe__isnull=False,
+    ).exclude(
+        id__in=FavoriteRecipeUser.objects.filter(
+            user=viewer,
+        ).values('recipe_id'),
+    ).exclude(
+        id__in=ShoppingCartUser.objects.filter(
+            user=viewer,
+        ).values('recipe_id'),
+    ).order_by('id').first()
+    author = User.objects.exclude(id=viewer.id).exclude(
+        id__in=Follow.objects.filter(follower=viewer).values('following_id'),
+    ).order_by('id').first()
+    ingredient = Ingredient.objects.order_by('id').first()
+    return viewer, {
+        'email': viewer.email,
+        'recipe': recipe.id,
+        'created': recipe.id,
+        'author': author.id,
+        'tag': TagRecipe.objects.order_by('id').first().id,
+        'ingredient': ingredient.id,
+        'ingredient_prefix': ingredient.name[:3],
+        'ingredients': ','.join(
+            str(ingredient_id)
+            for ingredient_id in recipe.ingredients_in_recipe.values_list(
+                'ingredient_id',
+                flat=True,
+            )
+        ),
+        'image': image_data(),
+    }
+
+
+def fill(value, context):
+    """
+    Подставляет значения контекста в строки адреса и тела запроса.
+    Строка из одной подстановки заменяется значением как есть.
+    """
+
+    if isinstance(value, dict):
+        return {key: fill(item, context) for key, item in value.items()}
+    if isinstance(value, list):
+        return [fill(item, context) for item in value]
+    if isinstance(value, str):
+        if value.startswith('{') and value.endswith('}') and (
+                value[1:-1] in context
+        ):
+            return context[value[1:-1]]
+        return value.format(**context)
+    return value
+
+
+def cases(names, page_sizes):
+    """Замеры маршрутов: (маршрут, размер страницы или None)."""
+
+    for route in names:
+        if BUDGETS[route].get('page_size'):
+            for page_size in page_sizes:
+                yield route, page_size
+        else:
+            yield route, None
+
+
+def measure_routes(names, page_sizes, repeat):
+    """
+    Выполняет маршруты от имени анонима и пользователя repeat раз
+    и возвращает для каждого замера статус ответа, наибольшее
+    количество запросов к базе и p95 времени ответа. Кэш очищается
+    перед замерами каждого зрителя: запросы считаются и с холодным
+    кэшем, а время - только по повторным вызовам, чтобы разовое
+    построение кэшей не делало результат случайным. Потоковые ответы
+    читаются целиком.
+    """
+
+    call_command('refresh_similar', stdout=io.StringIO())
+    viewer, context = budget_context()
+    # Ошибки сервера считаются неверным статусом, а не прерывают замер.
+    clients = {
+        ANONYMOUS: APIClient(raise_request_exception=False),
+        AUTHENTICATED: APIClient(raise_request_exception=False),
+    }
+    clients[AUTHENTICATED].force_authenticate(viewer)
+
+    # Ответы 4xx ожидаемы и не должны засорять вывод.
+    request_logger = logging.getLogger('django.request')
+    level = request_logger.level
+    request_logger.setLevel(logging.ERROR)
+    try:
+        return measure_viewers(clients, context, names, page_sizes, repeat)
+    finally:
+        request_logger.setLevel(level)
+
+
+def measure_viewers(clients, context, names, page_sizes, repeat):
+    """Замеры маршрутов для каждого зрителя из clients."""
+
+    results = []
+    for viewer_name, client in clients.items():
+        viewer_context = dict(context)
+        viewer_cases = [
+            (route, page_size)
+            for route, page_size in cases(names, page_sizes)
+            if viewer_name in BUDGETS[route]['budgets']
+        ]
+        timings = {case: [] for case in viewer_cases}
+        queries = dict.fromkeys(viewer_cases, 0)
+        statuses = {}
+        cache.clear()
+        for call in range(repeat):
+            viewer_context['call'] = call
+            for case in viewer_cases:
+                (name, method), page_size = case
+                budget = BUDGETS[(name, method)]
+                path = fill(budget['path'], viewer_context)
+                if page_size is not None:
+                    path += '&' if '?' in path else '?'
+                    path += '&'.join(
+                        f'{param}={page_size}'
+                        for param in budget['page_size']
+                    )
+                reset_queries()
+                with CaptureQueriesContext(connection) as captured:
+                    start = time.perf_counter()
+                    if method == 'get':
+                        response = client.get(path)
+                    else:
+                        response = getattr(client, method)(
+                            path,
+                            fill(budget.get('data'), viewer_context),
+                            format='json',
+                        )
+                    if response.streaming:
+                        b''.join(response.streaming_content)
+                    elapsed = (time.perf_counter() - start) * 1000
+                if call or repeat == 1:
+                    timings[case].append(elapsed)
+                queries[case] = max(queries[case], len(captured))
+                statuses.setdefault(case, set()).add(response.status_code)
+                if budget.get('save') and response.status_code == 201:
+                    viewer_context[budget['save']] = response.json()['id']
+        for case in viewer_cases:
+            (name, method), page_size = case
+            results.append({
+                'route': name,
+                'method': method,
+                'viewer': viewer_name,
+                'page_size': page_size,
+                'status': sorted(statuses[case]),
+                'queries': queries[case],
+                'p95_ms': round(percentile(timings[case], 95), 2),
+            })
+    return results
+
+
+@contextmanager
+def budget_settings():
+    """
+    Настройки замеров бюджетов: кэш в памяти процесса, медиафайлы
+    во временном каталоге, изображения обрабатываются в потоке
+    запроса, замеры PerformanceMiddleware выключены, чтобы EXPLAIN
+    медленных запросов не попадал в подсчёт. Индекс подбора рецептов
+    по ингредиентам создаётся заново для каждой базы.
+    """
+
+    with tempfile.TemporaryDirectory() as media_root, override_settings(
+            CACHES={'default': {
+                'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            }},
+            MEDIA_ROOT=media_root,
+            IMAGE_WORKERS=0,
+            PERFORMANCE_SAMPLE_RATE=0,
+            PASSWORD_HASHERS=(
+                'django.contrib.auth.hashers.MD5PasswordHasher',
+            ),
+    ), mock.patch('api.views.pantry_index', PantryIndex()):
+        yield
+
+
+def missing_budgets():
+    """Маршруты без бюджета и без причины в EXCLUDED."""
+
+    return [
+        f'{name} {method.upper()}: нет бюджета'
+        for name, method in routes()
+        if (name, method) not in BUDGETS and (name, method) not in EXCLUDED
+    ]
+
+
+def check_budgets(rows, latency=True):
+    """
+    Сверяет замеры measure_routes с бюджетами. Возвращает список
+    нарушений: неверный статус, количество запросов не равно
+    бюджету или зависит от размера данных или страницы, p95 времени
+    ответа больше бюджета (если latency).
+    """
+
+    failures = []
+    groups = {}
+    for row in rows:
+        queries, p95_ms, status = BUDGETS[
+            (row['route'], row['method'])
+        ]['budgets'][row['viewer']]
+        problems = []
+        if row['status'] != [status]:
+            problems.append(f'статус {row["status"]}, ожидался {status}')
+        if row['queries'] != queries:
+            problems.append(f'запросов {row["queries"]}, бюджет {queries}')
+        if latency and row['p95_ms'] > p95_ms:
+            problems.append(f'p95 {row["p95_ms"]} мс, бюджет {p95_ms} мс')
+        if problems:
+            failures.append(
+                f'{row["route"]} {row["method"].upper()} {row["viewer"]} '
+                f'(рецептов {row.get("recipes", "-")}, '
+                f'страница {row["page_size"] or "-"}): '
+                + ', '.join(problems)
+            )
+        groups.setdefault(
+            (row['route'], row['method'], row['viewer']),
+            [],
+        ).append(row)
+
+    for (name, method, viewer), group in groups.items():
+        if len({row['queries'] for row in group}) > 1:
+            failures.append(
+                f'{name} {method.upper()} {viewer}: '
+                'количество запросов зависит от размера данных '
+                'или страницы: ' + ', '.join(
+                    f'{row["queries"]} '
+                    f'(рецептов {row.get("recipes", "-")}, '
+                    f'страница {row["page_size"] or "-"})'
+                    for row in group
+                )
+            )
+    return failures
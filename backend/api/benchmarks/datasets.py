@@ -0,0 +1,287 @@
+"""Генерация синтетических данных для замеров."""
+import io
+import itertools
+import random
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.utils import timezone
+
+from recipes.models import (
+    FavoriteRecipeUser,
+    Ingredient,
+    IngredientRecipe,
+    Recipe,
+    ShoppingCartUser,
+    TagRecipe,
+)
+from users.models import Follow
+
+User = get_user_model()
+
+BATCH_SIZE = 1000
+
+
+def seed_ingredients(count):
+    """
+    Дополняет каталог ингредиентов до нужного размера.
+    Новые названия строятся из названий существующего каталога.
+    """
+
+    names = list(
+        Ingredient.objects.values_list('name', 'measurement_unit')[:5000]
+    ) or [('ингредиент', 'г')]
+    existing = Ingredient.objects.count()
+    missing = count - existing
+    if missing > 0:
+        Ingredient.objects.bulk_create(
+            (
+                Ingredient(
+                    name=f'{names[number % len(names)][0]} {number}',
+                    measurement_unit=names[number % len(names)][1],
+                )
+                for number in range(existing, count)
+            ),
+            batch_size=BATCH_SIZE,
+        )
+    return list(Ingredient.objects.values_list('id', flat=True)[:count])
+
+
+def seed_users(count, prefix='bench'):
+    """Создаёт пользователей для замеров."""
+
+    User.objects.bulk_create(
+        (
+            User(
+                username=f'{prefix}{number}',
+                email=f'{prefix}{number}@example.com',
+                password='!',
+            )
+            for number in range(count)
+        ),
+        batch_size=BATCH_SIZE,
+    )
+    return list(
+        User.objects.filter(
+            username__startswith=prefix,
+        ).values_list('id', flat=True)
+    )
+
+
+def seed_tags(count=3):
+    """Создаёт теги для замеров."""
+
+    TagRecipe.objects.bulk_create(
+        (
+            TagRecipe(
+                name=f'тег {number}',
+                color=f'#{number:06X}',
+                slug=f'tag-{number}',
+            )
+            for number in range(count)
+        ),
+        ignore_conflicts=True,
+    )
+    return list(TagRecipe.objects.values_list('id', flat=True))
+
+
+def seed_recipes(
+        count,
+        author_ids,
+        ingredient_ids,
+        tag_ids,
+        ingredients_per_recipe=8,
+        seed=0,
+):
+    """Создаёт рецепты с тегами и ингредиентами пакетными вставками."""
+
+    randomizer = random.Random(seed)
+    Recipe.objects.bulk_create(
+        (
+            Recipe(
+                author_id=randomizer.choice(author_ids),
+                name=f'Рецепт {number}',
+                text='Описание рецепта для замеров.',
+                image='recipes/images/benchmark.png',
+                cooking_time=randomizer.randint(1, 180),
+            )
+            for number in range(count)
+        ),
+        batch_size=BATCH_SIZE,
+    )
+    recipe_ids = list(
+        Recipe.objects.order_by('-id').values_list('id', flat=True)[:count]
+    )
+
+    TagThrough = Recipe.tags.through
+    tag_links = []
+    ingredient_links = []
+    for recipe_id in recipe_ids:
+        for tag_id in randomizer.sample(
+                tag_ids,
+                randomizer.randint(1, len(tag_ids)),
+        ):
+            tag_links.append(
+                TagThrough(recipe_id=recipe_id, tagrecipe_id=tag_id)
+            )
+        for ingredient_id in randomizer.sample(
+                ingredient_ids,
+                ingredients_per_recipe,
+        ):
+            ingredient_links.append(
+                IngredientRecipe(
+                    recipe_id=recipe_id,
+                    ingredient_id=ingredient_id,
+                    amount=randomizer.randint(1, 500),
+                )
+            )
+        if len(ingredient_links) >= BATCH_SIZE:
+            TagThrough.objects.bulk_create(tag_links, batch_size=BATCH_SIZE)
+            IngredientRecipe.objects.bulk_create(
+                ingredient_links,
+                batch_size=BATCH_SIZE,
+            )
+            tag_links, ingredient_links = [], []
+
+    TagThrough.objects.bulk_create(tag_links, batch_size=BATCH_SIZE)
+    IngredientRecipe.objects.bulk_create(
+        ingredient_links,
+        batch_size=BATCH_SIZE,
+    )
+    return recipe_ids
+
+
+def seed_user_recipe_list(
+        model,
+        per_user,
+        user_ids,
+        recipe_ids,
+        days=30,
+        seed=0,
+):
+    """
+    Заполняет списки рецептов пользователей (избранное, списки продуктов).
+    Популярность рецептов убывает по закону Ципфа, даты добавления
+    равномерно распределены по последним days дням.
+    Возвращает количество созданных записей.
+    """
+
+    randomizer = random.Random(seed)
+    cum_weights = list(itertools.accumulate(
+        1 / (rank + 1) ** 0.8 for rank in range(len(recipe_ids))
+    ))
+    now = timezone.now()
+    window = days * 24 * 60 * 60
+    created = 0
+    rows = []
+    for user_id in user_ids:
+        picked = dict.fromkeys(randomizer.choices(
+            recipe_ids,
+            cum_weights=cum_weights,
+            k=per_user * 2,
+        ))
+        for recipe_id in itertools.islice(picked, per_user):
+            rows.append(model(
+                user_id=user_id,
+                recipe_id=recipe_id,
+                added_at=now - timedelta(seconds=randomizer.random() * window),
+            ))
+        if len(rows) >= BATCH_SIZE * 10:
+            model.objects.bulk_create(rows, batch_size=BATCH_SIZE)
+            created += len(rows)
+            rows = []
+    model.objects.bulk_create(rows, batch_size=BATCH_SIZE)
+    return created + len(rows)
+
+
+def seed_follows(per_user, user_ids, seed=0):
+    """
+    Создаёт подписки пользователей на авторов. Популярность авторов
+    убывает по закону Ципфа, подписка на себя пропускается.
+    Возвращает количество созданных подписок.
+    """
+
+    randomizer = random.Random(seed)
+    cum_weights = list(itertools.accumulate(
+        1 / (rank + 1) for rank in range(len(user_ids))
+    ))
+    created = 0
+    rows = []
+    for user_id in user_ids:
+        picked = dict.fromkeys(randomizer.choices(
+            user_ids,
+            cum_weights=cum_weights,
+            k=per_user * 2,
+        ))
+        picked.pop(user_id, None)
+        for author_id in itertools.islice(picked, per_user):
+            rows.append(Follow(follower_id=user_id, following_id=author_id))
+        if len(rows) >= BATCH_SIZE * 10:
+            Follow.objects.bulk_create(rows, batch_size=BATCH_SIZE)
+            created += len(rows)
+            rows = []
+    Follow.objects.bulk_create(rows, batch_size=BATCH_SIZE)
+    return created + len(rows)
+
+
+def seed_dataset(
+        users,
+        recipes,
+        ingredients=None,
+        tags=3,
+        favorites=20,
+        carts=5,
+        follows=10,
+        prefix='bench',
+        seed=0,
+):
+    """
+    Создаёт связный набор данных: каталог ингредиентов
+    (из data/ingredients.csv, если он пуст, и дополненный
+    до ingredients), пользователей, теги, рецепты, избранное,
+    списки продуктов и подписки по favorites, carts и follows
+    на пользователя. Затем пересчитывает счётчики, суммы
+    списков продуктов и поисковый индекс, как после загрузки.
+    Возвращает количество созданных записей по типам.
+    """
+
+    output = io.StringIO()
+    if not Ingredient.objects.exists():
+        call_command('load_ingredients', stdout=output)
+    if ingredients:
+        ingredient_ids = seed_ingredients(ingredients)
+    else:
+        ingredient_ids = list(Ingredient.objects.values_list('id', flat=True))
+    user_ids = seed_users(users, prefix)
+    recipe_ids = seed_recipes(
+        recipes,
+        user_ids,
+        ingredient_ids,
+        seed_tags(tags),
+        seed=seed,
+    )
+    counts = {
+        'ingredients': len(ingredient_ids),
+        'users': len(user_ids),
+        'recipes': len(recipe_ids),
+        'favorites': seed_user_recipe_list(
+            FavoriteRecipeUser,
+            favorites,
+            user_ids,
+            recipe_ids,
+            seed=seed,
+        ),
+        'shopping_carts': seed_user_recipe_list(
+            ShoppingCartUser,
+            carts,
+            user_ids,
+            recipe_ids,
+            seed=seed + 1,
+        ),
+        'follows': seed_follows(follows, user_ids, seed=seed),
+    }
+    call_command('reconcile_counters', stdout=output)
+    call_command('shopping_cart_totals', rebuild=True, stdout=output)
+    call_command('rebuild_search_index', stdout=output)
+    return counts
@@ -0,0 +1,476 @@
+"""Сценарии замеров производительности API."""
+import itertools
+import random
+import time
+import tracemalloc
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db.models import Count, F, Q
+from django.test import override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from api.benchmarks.datasets import (
+    BATCH_SIZE,
+    seed_dataset,
+    seed_ingredients,
+    seed_recipes,
+    seed_tags,
+    seed_user_recipe_list,
+    seed_users,
+)
+from api.filters.autocomplete import get_autocomplete
+from api.filters.pantry import PantryIndex
+from api.filters.search import DatabaseRecipeSearch, get_recipe_search
+from core.benchmarks.benchmarks import measure, replay
+from users.models import Follow, UserStats
+from recipes.models import (
+    FavoriteRecipeUser,
+    FeedEntry,
+    Ingredient,
+    Recipe,
+    ShoppingCartUser,
+    SimilarRecipe,
+)
+
+User = get_user_model()
+
+
+def recipes_list(size, repeat):
+    """
+    Замер страниц списка рецептов для анонима и пользователя.
+    Страницы берутся из начала, середины и конца выдачи.
+    """
+
+    author_ids = seed_users(50)
+    seed_recipes(
+        size,
+        author_ids,
+        seed_ingredients(500),
+        seed_tags(),
+    )
+
+    anonymous = APIClient()
+    authenticated = APIClient()
+    authenticated.force_authenticate(User.objects.get(id=author_ids[0]))
+
+    results = []
+    for viewer, client in (
+            ('anonymous', anonymous),
+            ('authenticated', authenticated),
+    ):
+        for limit in (6, 50, 200):
+            last_page = max(size // limit, 1)
+            for page in sorted({1, last_page // 2 or 1, last_page}):
+                url = f'/api/recipes/?limit={limit}&page={page}'
+                results.append({
+                    'viewer': viewer,
+                    'url': url,
+                    **measure(lambda: client.get(url), repeat),
+                })
+    return results
+
+
+def autocomplete(size, repeat):
+    """
+    Замер автодополнения ингредиентов на каталоге заданного размера.
+    Для сравнения замеряется и наивный поиск name__icontains.
+    """
+
+    seed_ingredients(size)
+    names = list(Ingredient.objects.values_list('name', flat=True)[:2000])
+    randomizer = random.Random(0)
+    queries = [
+        name[:randomizer.randint(2, 5)]
+        for name in randomizer.sample(names, min(len(names), 200))
+    ]
+    engine = get_autocomplete()
+    engine.search('прогрев', settings.INGREDIENT_AUTOCOMPLETE_LIMIT)
+    client = APIClient()
+
+    cases = (
+        ('naive_icontains', lambda query: list(
+            Ingredient.objects.filter(name__icontains=query)
+        )),
+        (type(engine).__name__, lambda query: list(engine.search(
+            query,
+            settings.INGREDIENT_AUTOCOMPLETE_LIMIT,
+        ))),
+        ('api', lambda query: client.get(
+            '/api/ingredients/',
+            {'name': query},
+        )),
+    )
+    results = []
+    for name, func in cases:
+        pending = itertools.cycle(queries)
+        results.append({
+            'engine': name,
+            'catalogue': size,
+            **measure(lambda: func(next(pending)), len(queries) * repeat),
+        })
+    return results
+
+
+def trending(size, repeat):
+    """
+    Замер рейтинга популярности на size добавлениях в избранное
+    (и вдвое меньшем числе добавлений в списки продуктов).
+    Сравниваются пересчёт рейтинга командой, сортировка списка
+    по сохранённому рейтингу и подсчёт добавлений во время запроса.
+    """
+
+    per_user = 200
+    user_ids = seed_users(max(size // per_user, 1))
+    recipe_ids = seed_recipes(
+        max(size // 100, per_user * 2),
+        user_ids[:50],
+        seed_ingredients(500),
+        seed_tags(),
+    )
+    favorites = seed_user_recipe_list(
+        FavoriteRecipeUser,
+        per_user,
+        user_ids,
+        recipe_ids,
+    )
+    seed_user_recipe_list(
+        ShoppingCartUser,
+        per_user // 2,
+        user_ids,
+        recipe_ids,
+        seed=1,
+    )
+
+    client = APIClient()
+    since = timezone.now() - timedelta(days=settings.TRENDING_WINDOW_DAYS)
+    window = Q(in_favorite__added_at__gte=since)
+
+    results = []
+    for name, func in (
+            ('refresh_trending', Recipe.objects.refresh_trending),
+            ('api_ordering_trending', lambda: client.get(
+                '/api/recipes/?ordering=trending&limit=50',
+            )),
+            ('api_ordering_popular', lambda: client.get(
+                '/api/recipes/?ordering=popular&limit=50',
+            )),
+            ('stored_trending_query', lambda: list(
+                Recipe.objects.order_by('-trending_score', '-id')[:50]
+            )),
+            ('naive_request_time_count', lambda: list(
+                Recipe.objects.annotate(
+                    score=Count('in_favorite', filter=window),
+                ).order_by('-score', '-id')[:50]
+            )),
+    ):
+        results.append({
+            'case': name,
+            'favorites': favorites,
+            'recipes': len(recipe_ids),
+            **measure(func, repeat),
+        })
+    return results
+
+
+def search(size, repeat):
+    """
+    Замер полнотекстового поиска рецептов на size рецептах.
+    Запросы - слова из названий ингредиентов. Для сравнения
+    замеряется поиск по вхождению (icontains) без индекса.
+    """
+
+    ingredient_ids = seed_ingredients(2000)
+    seed_recipes(size, seed_users(50), ingredient_ids, seed_tags())
+    engine = get_recipe_search()
+
+    words = sorted({
+        name.split()[0]
+        for name in Ingredient.objects.filter(
+            id__in=ingredient_ids,
+        ).values_list('name', flat=True)
+        if len(name.split()[0]) > 3
+    })
+    queries = random.Random(0).sample(words, min(len(words), 50))
+    client = APIClient()
+
+    results = [{
+        'engine': f'{type(engine).__name__}.update',
+        'recipes': size,
+        **measure(engine.update, 1),
+    }]
+    cases = (
+        ('naive_icontains', lambda query: list(
+            DatabaseRecipeSearch().search(Recipe.objects.all(), query)[:50]
+        )),
+        (type(engine).__name__, lambda query: list(
+            engine.search(Recipe.objects.all(), query)[:50]
+        )),
+        ('api', lambda query: client.get(
+            '/api/recipes/',
+            {'search': query, 'limit': 50},
+        )),
+    )
+    for name, func in cases:
+        pending = itertools.cycle(queries)
+        results.append({
+            'engine': name,
+            'recipes': size,
+            **measure(lambda: func(next(pending)), len(queries) * repeat),
+        })
+    return results
+
+
+def pantry(size, repeat):
+    """
+    Замер подбора рецептов по ингредиентам на size рецептах
+    и 5000 ингредиентах. Для сравнения замеряется подсчёт
+    совпадений соединением с IngredientRecipe в базе данных.
+    """
+
+    ingredient_ids = seed_ingredients(5000)
+    seed_recipes(size, seed_users(50), ingredient_ids, seed_tags())
+    randomizer = random.Random(0)
+    pantries = [
+        randomizer.sample(ingredient_ids, randomizer.randint(5, 30))
+        for _ in range(20)
+    ]
+    limit = settings.PANTRY_RESULTS_LIMIT
+    index = PantryIndex()
+    client = APIClient()
+
+    def naive(ingredients):
+        return list(
+            Recipe.objects.annotate(
+                matched=Count(
+                    'ingredients_in_recipe',
+                    filter=Q(ingredients_in_recipe__ingredient_id__in=(
+                        ingredients
+                    )),
+                ),
+                total=Count('ingredients_in_recipe'),
+            ).filter(
+                matched__gt=0,
+            ).annotate(
+                missing=F('total') - F('matched'),
+            ).order_by('missing', '-matched', '-id')[:limit]
+        )
+
+    results = [{
+        'engine': 'PantryIndex.build',
+        'recipes': size,
+        **measure(lambda: index.match(pantries[0], limit), 1),
+    }]
+    cases = (
+        ('naive_join', naive),
+        ('PantryIndex', lambda ingredients: index.match(ingredients, limit)),
+        ('api', lambda ingredients: client.get(
+            '/api/recipes/pantry/',
+            {'ingredients': ','.join(map(str, ingredients))},
+        )),
+    )
+    for name, func in cases:
+        pending = itertools.cycle(pantries)
+        results.append({
+            'engine': name,
+            'recipes': size,
+            **measure(lambda: func(next(pending)), len(pantries) * repeat),
+        })
+    return results
+
+
+def similar(size, repeat):
+    """
+    Замер построения таблицы похожих рецептов на size рецептах:
+    время и пик памяти полного пересчёта, обновление одного
+    рецепта и ответ API.
+    """
+
+    recipe_ids = seed_recipes(
+        size,
+        seed_users(50),
+        seed_ingredients(5000),
+        seed_tags(),
+    )
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    pairs = SimilarRecipe.objects.rebuild()
+    build_ms = (time.perf_counter() - start) * 1000
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    sample = random.Random(0).sample(recipe_ids, min(len(recipe_ids), 20))
+    pending = itertools.cycle(sample)
+    client = APIClient()
+    return [
+        {
+            'case': 'rebuild',
+            'recipes': size,
+            'pairs': pairs,
+            'build_ms': round(build_ms, 2),
+            'peak_memory_mb': round(peak / 1024 / 1024, 1),
+        },
+        {
+            'case': 'refresh_one_recipe',
+            'recipes': size,
+            **measure(
+                lambda: SimilarRecipe.objects.refresh([next(pending)]),
+                len(sample) * repeat,
+            ),
+        },
+        {
+            'case': 'api',
+            'recipes': size,
+            **measure(
+                lambda: client.get(f'/api/recipes/{next(pending)}/similar/'),
+                len(sample) * repeat,
+            ),
+        },
+    ]
+
+
+def feed(size, repeat):
+    """
+    Замер персональной ленты для автора с size подписчиками:
+    раскладка нового рецепта по лентам при публикации, чтение
+    ленты подписчиком при раскладке и при подмешивании рецептов
+    автора во время чтения, ограничение длины лент.
+    """
+
+    author_id, *follower_ids = seed_users(size + 1)
+    Follow.objects.bulk_create(
+        (
+            Follow(follower_id=follower_id, following_id=author_id)
+            for follower_id in follower_ids
+        ),
+        batch_size=BATCH_SIZE,
+    )
+    UserStats.objects.create(user_id=author_id, followers_count=size)
+    recipe_ids = seed_recipes(
+        repeat + 50,
+        [author_id],
+        seed_ingredients(500),
+        seed_tags(),
+    )
+    recipes = Recipe.objects.filter(id__in=recipe_ids).order_by('id')
+    pending = iter(recipes[:repeat])
+    follower = APIClient()
+    follower.force_authenticate(User.objects.get(id=follower_ids[0]))
+
+    results = []
+    with override_settings(FEED_FANOUT_LIMIT=size):
+        results.append({
+            'case': 'fan_out_on_write',
+            'followers': size,
+            **measure(
+                lambda: FeedEntry.objects.fan_out(next(pending)),
+                repeat,
+            ),
+        })
+        results.append({
+            'case': 'read_fanned_out_feed',
+            'followers': size,
+            **measure(lambda: follower.get('/api/recipes/feed/'), repeat),
+        })
+    with override_settings(FEED_FANOUT_LIMIT=size - 1):
+        results.append({
+            'case': 'read_with_fan_out_on_read',
+            'followers': size,
+            **measure(lambda: follower.get('/api/recipes/feed/'), repeat),
+        })
+    with override_settings(FEED_LENGTH=1):
+        results.append({
+            'case': 'trim_feeds',
+            'followers': size,
+            'entries': FeedEntry.objects.count(),
+            **measure(FeedEntry.objects.trim, 1),
+        })
+    return results
+
+
+def request_mix(size, repeat):
+    """
+    Воспроизведение фиксированной смеси запросов к API на связном
+    наборе данных из size рецептов: списки и страницы рецептов,
+    фильтры, поиск, справочники, подписки, лента, выгрузка списка
+    продуктов и переключение избранного. Веса примерно повторяют
+    долю запросов на сайте; на каждый повтор приходится 200 запросов.
+    """
+
+    seed_dataset(users=max(size // 10, 20), recipes=size)
+    viewer = User.objects.annotate(
+        favorites=Count('favorite_recipes'),
+    ).filter(favorites__gt=0).order_by('id').first()
+    anonymous = APIClient()
+    authenticated = APIClient()
+    authenticated.force_authenticate(viewer)
+
+    recipe_ids = list(Recipe.objects.values_list('id', flat=True)[:1000])
+    detail_ids = itertools.cycle(
+        random.Random(0).sample(recipe_ids, min(len(recipe_ids), 100))
+    )
+    toggled = recipe_ids[-1]
+    toggle_methods = itertools.cycle(
+        (authenticated.post, authenticated.delete),
+    )
+
+    requests = {
+        'recipes_list_anonymous': (25, lambda: anonymous.get(
+            '/api/recipes/',
+            {'limit': 6},
+        )),
+        'recipes_list': (15, lambda: authenticated.get(
+            '/api/recipes/',
+            {'limit': 6, 'page': 2},
+        )),
+        'recipes_by_tags': (8, lambda: anonymous.get(
+            '/api/recipes/',
+            {'limit': 6, 'tags': ['tag-0', 'tag-1']},
+        )),
+        'recipes_by_author': (4, lambda: authenticated.get(
+            '/api/recipes/',
+            {'limit': 6, 'author': viewer.id},
+        )),
+        'recipes_search': (4, lambda: anonymous.get(
+            '/api/recipes/',
+            {'limit': 6, 'search': 'рецепт 1'},
+        )),
+        'recipe_detail': (15, lambda: anonymous.get(
+            f'/api/recipes/{next(detail_ids)}/',
+        )),
+        'ingredients_autocomplete': (8, lambda: anonymous.get(
+            '/api/ingredients/',
+            {'name': 'сол'},
+        )),
+        'tags': (4, lambda: anonymous.get('/api/tags/')),
+        'subscriptions': (5, lambda: authenticated.get(
+            '/api/users/subscriptions/',
+            {'recipes_limit': 3},
+        )),
+        'feed': (5, lambda: authenticated.get('/api/recipes/feed/')),
+        'download_shopping_cart': (3, lambda: authenticated.get(
+            '/api/recipes/download_shopping_cart/',
+        )),
+        'favorite_toggle': (4, lambda: next(toggle_methods)(
+            f'/api/recipes/{toggled}/favorite/',
+        )),
+    }
+    return [
+        {'recipes': size, **row}
+        for row in replay(requests, 200 * repeat)
+    ]
+
+
+SCENARIOS = {
+    'recipes_list': (recipes_list, 5000),
+    'autocomplete': (autocomplete, 100000),
+    'trending': (trending, 1000000),
+    'search': (search, 50000),
+    'pantry': (pantry, 100000),
+    'similar': (similar, 50000),
+    'feed': (feed, 100000),
+    'request_mix': (request_mix, 10000),
+}
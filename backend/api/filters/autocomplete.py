@@ -0,0 +1,110 @@
+"""Автодополнение названий ингредиентов."""
+import bisect
+import threading
+
+from django.db import connection
+from django.db.models import Case, IntegerField, Value, When
+
+from core.cache.cache import ingredients_cache
+from recipes.models import Ingredient
+
+
+class DatabaseAutocomplete:
+    """
+    Автодополнение средствами базы данных.
+    Совпадения по началу названия идут первыми, затем по вхождению.
+    На PostgreSQL поиск опирается на индексы по UPPER(name)
+    с text_pattern_ops и gin_trgm_ops.
+    """
+
+    def search(self, query, limit):
+        return Ingredient.objects.filter(
+            name__icontains=query,
+        ).annotate(
+            rank=Case(
+                When(name__istartswith=query, then=Value(0)),
+                default=Value(1),
+                output_field=IntegerField(),
+            ),
+        ).order_by('rank', 'name')[:limit]
+
+
+class PrefixIndexAutocomplete:
+    """
+    Автодополнение по отсортированному индексу в памяти процесса.
+    Совпадения по началу названия ищутся бинарным поиском,
+    по вхождению - просмотром индекса по порядку до набора лимита.
+    Индекс пересобирается при смене версии каталога в кэше справочников.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.keys = []
+        self.entries = []
+        self.version = None
+
+    def _ensure_index(self):
+        """Пересобирает индекс, если сменилась версия каталога."""
+
+        version = ingredients_cache.version()
+        if version == self.version:
+            return
+
+        with self.lock:
+            if version == self.version:
+                return
+            entries = sorted(
+                (name.lower(), pk, name, measurement_unit)
+                for pk, name, measurement_unit in (
+                    Ingredient.objects.values_list(
+                        'id',
+                        'name',
+                        'measurement_unit',
+                    ).iterator()
+                )
+            )
+            self.keys = [entry[0] for entry in entries]
+            self.entries = entries
+            self.version = version
+
+    def search(self, query, limit):
+        self._ensure_index()
+        keys, entries = self.keys, self.entries
+        query = query.lower()
+
+        found = []
+        position = bisect.bisect_left(keys, query)
+        while (
+                position < len(keys)
+                and len(found) < limit
+                and keys[position].startswith(query)
+        ):
+            found.append(entries[position])
+            position += 1
+
+        if len(found) < limit:
+            for entry in entries:
+                if query in entry[0] and not entry[0].startswith(query):
+                    found.append(entry)
+                    if len(found) >= limit:
+                        break
+
+        return [
+            Ingredient(id=pk, name=name, measurement_unit=measurement_unit)
+            for _, pk, name, measurement_unit in found
+        ]
+
+
+_engines = {}
+
+
+def get_autocomplete():
+    """Возвращает движок автодополнения для текущей базы данных."""
+
+    vendor = connection.vendor
+    if vendor not in _engines:
+        if vendor == 'postgresql':
+            _engines[vendor] = DatabaseAutocomplete()
+        else:
+            _engines[vendor] = PrefixIndexAutocomplete()
+    return _engines[vendor]
@@ -1,36 +1,94 @@
 """Фильтры для рецептов."""
 import django_filters
+from django.conf import settings
 from django.contrib.auth import get_user_model
 from rest_framework.filters import SearchFilter
 
+from api.filters.autocomplete import get_autocomplete
+from api.filters.search import get_recipe_search
+from core.cache.cache import tags_cache
 from recipes.models import Recipe, TagRecipe
 
 User = get_user_model()
 
 
 class IngredientFilter(SearchFilter):
-    """Фильтр для ингредиентов."""
+    """
+    Фильтр для ингредиентов.
+    В списке ингредиентов поиск по названию выполняет движок
+    автодополнения: сначала совпадения по началу названия,
+    затем по вхождению, не больше INGREDIENT_AUTOCOMPLETE_LIMIT.
+    """
 
     search_param = 'name'
 
     def filter_queryset(self, request, queryset, view):
-        search_value = request.query_params.get(self.search_param)
+        search_value = request.query_params.get(self.search_param, '')
+        search_value = search_value.strip()
 
-        if search_value:
-            queryset = queryset.filter(name__icontains=search_value)
+        if not search_value:
+            return queryset
+        if view.action == 'list':
+            return get_autocomplete().search(
+                search_value,
+                settings.INGREDIENT_AUTOCOMPLETE_LIMIT,
+            )
+        return queryset.filter(name__icontains=search_value)
 
-        return queryset
+
+def get_tag_choices():
+    """Возвращает варианты слагов тегов из кэша справочников."""
+
+    return tags_cache.get(
+        'slugs',
+        lambda: [
+            (slug, slug)
+            for slug in TagRecipe.objects.values_list('slug', flat=True)
+        ],
+    )
+
+
+SEARCH_ORDERING = ('-search_rank', '-id')
+
+FEED_ORDERING = ('-feed_at', '-id')
+
+RECIPE_ORDERINGS = {
+    'popular': ('-favorites_count', '-id'),
+    'trending': ('-trending_score', '-id'),
+    'quickest': ('cooking_time', '-id'),
+}
 
 
 class RecipeFilter(django_filters.FilterSet):
-    """Фильтр рецептов."""
+    """
+    Фильтр рецептов.
+    Параметр ordering задаёт сортировку по сохранённым счётчикам:
+    popular - по избранному, trending - по рейтингу за последние дни,
+    quickest - по времени приготовления.
+    Параметр search ищет по названию, описанию и ингредиентам
+    в полнотекстовом индексе; без ordering результаты упорядочены
+    по релевантности.
+    """
 
-    tags = django_filters.ModelMultipleChoiceFilter(
+    tags = django_filters.MultipleChoiceFilter(
         field_name='tags__slug',
-        to_field_name='slug',
-        queryset=TagRecipe.objects.all(),
+        choices=get_tag_choices,
+    )
+    search = django_filters.CharFilter(method='filter_search')
+    ordering = django_filters.ChoiceFilter(
+        choices=[(name, name) for name in RECIPE_ORDERINGS],
+        method='filter_ordering',
     )
 
     class Meta:
         model = Recipe
         fields = ('tags', 'author')
+
+    def filter_search(self, queryset, name, value):
+        value = value.strip()
+        if not value:
+            return queryset
+        return get_recipe_search().search(queryset, value)
+
+    def filter_ordering(self, queryset, name, value):
+        return queryset.order_by(*RECIPE_ORDERINGS[value])
@@ -0,0 +1,157 @@
+"""Подбор рецептов по имеющимся ингредиентам."""
+import heapq
+import threading
+from array import array
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from recipes.models import IngredientRecipe, Recipe
+
+
+class PantryIndex:
+    """
+    Инвертированный индекс "ингредиент -> рецепты" в памяти процесса.
+    Списки рецептов и составы рецептов хранятся в компактных
+    массивах целых чисел. Индекс строится при первом запросе,
+    изменённые рецепты подгружаются по updated_at перед каждым
+    поиском. Удалённые рецепты убираются из индекса, когда поиск
+    их находит (discard), а при удалении ингредиента меняется
+    updated_at его рецептов.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.postings = {}
+        self.recipes = {}
+        self.synced_at = None
+
+    def _set_recipe(self, recipe_id, ingredient_ids):
+        """Заменяет состав рецепта в индексе."""
+
+        old = set(self.recipes.get(recipe_id, ()))
+        new = set(ingredient_ids)
+        for ingredient_id in old - new:
+            self.postings[ingredient_id].remove(recipe_id)
+        for ingredient_id in new - old:
+            self.postings.setdefault(
+                ingredient_id,
+                array('q'),
+            ).append(recipe_id)
+        if new:
+            self.recipes[recipe_id] = array('q', sorted(new))
+        else:
+            self.recipes.pop(recipe_id, None)
+
+    def _rebuild(self):
+        """Строит индекс по всем ингредиентам рецептов."""
+
+        synced_at = timezone.now()
+        compositions = {}
+        for recipe_id, ingredient_id in IngredientRecipe.objects.filter(
+                recipe__isnull=False,
+                ingredient__isnull=False,
+        ).values_list('recipe_id', 'ingredient_id').iterator():
+            compositions.setdefault(recipe_id, set()).add(ingredient_id)
+
+        postings = {}
+        recipes = {}
+        for recipe_id, ingredient_ids in compositions.items():
+            recipes[recipe_id] = array('q', sorted(ingredient_ids))
+            for ingredient_id in ingredient_ids:
+                postings.setdefault(
+                    ingredient_id,
+                    array('q'),
+                ).append(recipe_id)
+
+        self.postings = postings
+        self.recipes = recipes
+        self.synced_at = synced_at
+
+    def _sync(self):
+        """
+        Подгружает рецепты, изменённые с прошлой синхронизации.
+        Окно захватывает PANTRY_INDEX_SYNC_OVERLAP секунд назад,
+        чтобы не пропустить транзакции, зафиксированные с задержкой.
+        """
+
+        if self.synced_at is None:
+            self._rebuild()
+            return
+
+        synced_at = timezone.now()
+        since = self.synced_at - timedelta(
+            seconds=settings.PANTRY_INDEX_SYNC_OVERLAP,
+        )
+        compositions = {}
+        for recipe_id, ingredient_id in Recipe.objects.filter(
+                updated_at__gte=since,
+        ).values_list('id', 'ingredients_in_recipe__ingredient_id'):
+            ingredient_ids = compositions.setdefault(recipe_id, set())
+            if ingredient_id is not None:
+                ingredient_ids.add(ingredient_id)
+        for recipe_id, ingredient_ids in compositions.items():
+            self._set_recipe(recipe_id, ingredient_ids)
+        self.synced_at = synced_at
+
+    def discard(self, recipe_ids):
+        """Убирает из индекса удалённые рецепты."""
+
+        with self.lock:
+            for recipe_id in recipe_ids:
+                self._set_recipe(recipe_id, ())
+
+    def match(self, ingredient_ids, limit, max_missing=None):
+        """
+        Подбирает рецепты, в которых есть хотя бы один из ингредиентов.
+        Сначала идут рецепты без недостающих ингредиентов, затем
+        с одним недостающим и так далее; при равенстве - с большим
+        числом совпадений и более новые.
+        Возвращает список кортежей
+        (id рецепта, число совпадений, недостающие ингредиенты).
+        """
+
+        pantry = set(ingredient_ids)
+        with self.lock:
+            self._sync()
+            hits = {}
+            for ingredient_id in pantry:
+                for recipe_id in self.postings.get(ingredient_id, ()):
+                    hits[recipe_id] = hits.get(recipe_id, 0) + 1
+
+            ranked = (
+                (len(self.recipes[recipe_id]) - matched, -matched, -recipe_id)
+                for recipe_id, matched in hits.items()
+            )
+            if max_missing is not None:
+                ranked = (key for key in ranked if key[0] <= max_missing)
+            return [
+                (
+                    -negative_id,
+                    -negative_matched,
+                    [
+                        ingredient_id
+                        for ingredient_id in self.recipes[-negative_id]
+                        if ingredient_id not in pantry
+                    ],
+                )
+                for _, negative_matched, negative_id in heapq.nsmallest(
+                    limit,
+                    ranked,
+                )
+            ]
+
+
+pantry_index = PantryIndex()
+
+
+def touch_ingredient_recipes(sender, instance, **kwargs):
+    """
+    Перед удалением ингредиента отмечает его рецепты изменёнными,
+    чтобы индексы процессов подгрузили их новый состав.
+    """
+
+    Recipe.objects.filter(
+        ingredients_in_recipe__ingredient=instance,
+    ).update(updated_at=timezone.now())
@@ -0,0 +1,244 @@
+"""Полнотекстовый поиск рецептов."""
+import re
+from threading import local
+
+from django.db import connection, transaction
+from django.db.models import FloatField, Q
+from django.db.models.expressions import RawSQL
+
+from recipes.models import IngredientRecipe
+
+SEARCH_TABLE = 'recipes_recipe_search'
+
+# Поля рецепта в индексе: сохранение других полей не обновляет его.
+INDEXED_FIELDS = frozenset(('name', 'text'))
+
+
+class DatabaseRecipeSearch:
+    """
+    Поиск по вхождению подстроки в название, описание
+    и названия ингредиентов. Используется на базах
+    без полнотекстового индекса и не требует его обновления.
+    """
+
+    def search(self, queryset, query):
+        return queryset.filter(
+            Q(name__icontains=query)
+            | Q(text__icontains=query)
+            | Q(ingredients_in_recipe__ingredient__name__icontains=query)
+        ).distinct()
+
+    def update(self, recipe_ids=None):
+        """Обновляет индекс рецептов (все рецепты, если ids не заданы)."""
+
+    def delete(self, recipe_ids):
+        """Удаляет рецепты из индекса."""
+
+
+class PostgresRecipeSearch(DatabaseRecipeSearch):
+    """
+    Поиск по tsvector с русской морфологией и GIN-индексом.
+    Название весит больше ингредиентов, ингредиенты - больше описания.
+    Результаты упорядочены по ts_rank_cd.
+    """
+
+    document_sql = (
+        "setweight(to_tsvector('russian', r.name), 'A') || "
+        "setweight(to_tsvector('russian', "
+        "coalesce(string_agg(i.name, ' '), '')), 'B') || "
+        "setweight(to_tsvector('russian', r.text), 'C')"
+    )
+    query_sql = "websearch_to_tsquery('russian', %s)"
+
+    def search(self, queryset, query):
+        return queryset.filter(
+            id__in=RawSQL(
+                f'SELECT recipe_id FROM {SEARCH_TABLE} '
+                f'WHERE document @@ {self.query_sql}',
+                (query,),
+            ),
+        ).annotate(
+            search_rank=RawSQL(
+                f'SELECT ts_rank_cd(document, {self.query_sql}) '
+                f'FROM {SEARCH_TABLE} '
+                f'WHERE recipe_id = recipes_recipe.id',
+                (query,),
+                output_field=FloatField(),
+            ),
+        ).order_by('-search_rank', '-id')
+
+    def update(self, recipe_ids=None):
+        condition, params = '', ()
+        if recipe_ids is not None:
+            condition, params = 'WHERE r.id = ANY(%s)', (list(recipe_ids),)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {SEARCH_TABLE} (recipe_id, document) '
+                f'SELECT r.id, {self.document_sql} '
+                'FROM recipes_recipe r '
+                'LEFT JOIN recipes_ingredientrecipe ir '
+                'ON ir.recipe_id = r.id '
+                'LEFT JOIN recipes_ingredient i ON i.id = ir.ingredient_id '
+                f'{condition} GROUP BY r.id '
+                'ON CONFLICT (recipe_id) '
+                'DO UPDATE SET document = EXCLUDED.document',
+                params,
+            )
+
+    def delete(self, recipe_ids):
+        # Строки индекса удаляются каскадно вместе с рецептом.
+        pass
+
+
+class SQLiteRecipeSearch(DatabaseRecipeSearch):
+    """
+    Поиск по виртуальной таблице FTS5 для локальной разработки.
+    Морфологии нет, поэтому каждое слово запроса ищется как префикс.
+    Результаты упорядочены по bm25 с весами колонок
+    название > ингредиенты > описание.
+    """
+
+    word = re.compile(r'\w+')
+
+    def match_query(self, query):
+        """Экранирует слова запроса для выражения MATCH."""
+
+        return ' '.join(
+            f'"{word}"*' for word in self.word.findall(query.lower())
+        )
+
+    def search(self, queryset, query):
+        match = self.match_query(query)
+        if not match:
+            return queryset.none()
+        # bm25 вычисляется в материализованном CTE один раз на запрос:
+        # подзапрос с MATCH по rowid выполнял бы MATCH для каждого
+        # найденного рецепта.
+        return queryset.filter(
+            id__in=RawSQL(
+                f'SELECT rowid FROM {SEARCH_TABLE} '
+                f'WHERE {SEARCH_TABLE} MATCH %s',
+                (match,),
+            ),
+        ).annotate(
+            search_rank=RawSQL(
+                'WITH ranked AS MATERIALIZED ('
+                'SELECT rowid AS recipe_id, '
+                f'-bm25({SEARCH_TABLE}, 10.0, 5.0, 1.0) AS rank '
+                f'FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH %s) '
+                'SELECT rank FROM ranked '
+                'WHERE ranked.recipe_id = recipes_recipe.id',
+                (match,),
+                output_field=FloatField(),
+            ),
+        ).order_by('-search_rank', '-id')
+
+    def update(self, recipe_ids=None):
+        condition, params = '', ()
+        if recipe_ids is not None:
+            recipe_ids = list(recipe_ids)
+            placeholders = ', '.join(['%s'] * len(recipe_ids))
+            condition = f'WHERE r.id IN ({placeholders})'
+            params = recipe_ids
+        with connection.cursor() as cursor:
+            if recipe_ids is None:
+                cursor.execute(f'DELETE FROM {SEARCH_TABLE}')
+            else:
+                self.delete(recipe_ids)
+            cursor.execute(
+                f'INSERT INTO {SEARCH_TABLE} '
+                '(rowid, name, ingredients, text) '
+                'SELECT r.id, r.name, '
+                "coalesce(group_concat(i.name, ' '), ''), r.text "
+                'FROM recipes_recipe r '
+                'LEFT JOIN recipes_ingredientrecipe ir '
+                'ON ir.recipe_id = r.id '
+                'LEFT JOIN recipes_ingredient i ON i.id = ir.ingredient_id '
+                f'{condition} GROUP BY r.id',
+                params,
+            )
+
+    def delete(self, recipe_ids):
+        recipe_ids = list(recipe_ids)
+        if not recipe_ids:
+            return
+        placeholders = ', '.join(['%s'] * len(recipe_ids))
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {SEARCH_TABLE} WHERE rowid IN ({placeholders})',
+                recipe_ids,
+            )
+
+
+_pending = local()
+
+
+def schedule_index(recipe_ids):
+    """
+    Откладывает обновление рецептов в индексе до фиксации транзакции,
+    когда ингредиенты рецептов уже сохранены. Рецепты всех сохранений
+    транзакции обновляются одним вызовом update().
+    """
+
+    pending = getattr(_pending, 'recipe_ids', None)
+    if pending is None:
+        pending = _pending.recipe_ids = set()
+    pending.update(recipe_ids)
+    transaction.on_commit(flush_index)
+
+
+def flush_index():
+    """Обновляет в индексе рецепты, накопленные schedule_index."""
+
+    recipe_ids = getattr(_pending, 'recipe_ids', None)
+    if recipe_ids:
+        _pending.recipe_ids = set()
+        get_recipe_search().update(recipe_ids)
+
+
+def index_recipe(sender, instance, update_fields=None, **kwargs):
+    """Обновляет рецепт в индексе, если изменились индексируемые поля."""
+
+    if update_fields is not None and INDEXED_FIELDS.isdisjoint(
+            update_fields,
+    ):
+        return
+    schedule_index([instance.pk])
+
+
+def unindex_recipe(sender, instance, **kwargs):
+    """Удаляет рецепт из индекса."""
+
+    get_recipe_search().delete([instance.pk])
+
+
+def index_ingredient_recipes(sender, instance, created=False, **kwargs):
+    """Обновляет в индексе рецепты с переименованным ингредиентом."""
+
+    if created:
+        return
+    recipe_ids = list(
+        IngredientRecipe.objects.filter(
+            ingredient=instance,
+            recipe__isnull=False,
+        ).values_list('recipe_id', flat=True).distinct()
+    )
+    if recipe_ids:
+        schedule_index(recipe_ids)
+
+
+_engines = {}
+
+
+def get_recipe_search():
+    """Возвращает движок поиска рецептов для текущей базы данных."""
+
+    vendor = connection.vendor
+    if vendor not in _engines:
+        if vendor == 'postgresql':
+            _engines[vendor] = PostgresRecipeSearch()
+        elif vendor == 'sqlite':
+            _engines[vendor] = SQLiteRecipeSearch()
+        else:
+            _engines[vendor] = DatabaseRecipeSearch()
+    return _engines[vendor]
@@ -0,0 +1,167 @@
+"""Команда для замеров производительности API."""
+import json
+import subprocess
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+
+from api.benchmarks.scenarios import SCENARIOS
+from core.benchmarks.benchmarks import benchmark_database
+
+
+class Command(BaseCommand):
+    """
+    Запускает сценарии замеров на временной базе данных
+    и выводит количество запросов и время выполнения.
+    Отчёт можно сохранить в JSON (--output) вместе с коммитом
+    и параметрами запуска и сравнить с отчётом другого коммита
+    (--compare).
+    """
+
+    # Поля строк отчёта со значениями замеров; остальные поля
+    # (кроме количества вызовов) описывают сам замер.
+    metric_suffixes = ('_ms', '_mb', '_kb')
+
+    help = 'Замеры производительности API на синтетических данных.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'scenarios',
+            nargs='*',
+            help=f'Сценарии: {", ".join(SCENARIOS)}. По умолчанию все.',
+        )
+        parser.add_argument(
+            '--size',
+            type=int,
+            help='Размер набора данных (у каждого сценария свой).',
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=5,
+            help='Количество повторов каждого замера.',
+        )
+        parser.add_argument(
+            '--json',
+            action='store_true',
+            help='Вывести результаты в формате JSON.',
+        )
+        parser.add_argument(
+            '--output',
+            help='Сохранить отчёт в JSON-файл.',
+        )
+        parser.add_argument(
+            '--compare',
+            help='Сравнить результаты с сохранённым отчётом.',
+        )
+
+    def handle(self, *args, **options):
+        names = options['scenarios'] or list(SCENARIOS)
+        unknown = set(names) - set(SCENARIOS)
+        if unknown:
+            raise CommandError(
+                f'Неизвестные сценарии: {", ".join(sorted(unknown))}'
+            )
+
+        report = {}
+        for name in names:
+            scenario, default_size = SCENARIOS[name]
+            with benchmark_database():
+                report[name] = scenario(
+                    options['size'] or default_size,
+                    options['repeat'],
+                )
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                json.dump(
+                    {
+                        'commit': self.commit(),
+                        'created': timezone.now().isoformat(),
+                        'database': connection.vendor,
+                        'size': options['size'],
+                        'repeat': options['repeat'],
+                        'scenarios': report,
+                    },
+                    file,
+                    ensure_ascii=False,
+                    indent=2,
+                )
+
+        if options['compare']:
+            with open(options['compare'], encoding='utf-8') as file:
+                baseline = json.load(file)
+            self.compare(baseline, report)
+            return
+
+        if options['json']:
+            self.stdout.write(json.dumps(report, ensure_ascii=False, indent=2))
+            return
+
+        for name, rows in report.items():
+            self.stdout.write(self.style.MIGRATE_HEADING(name))
+            for row in rows:
+                self.stdout.write(
+                    '  '.join(f'{key}={value}' for key, value in row.items())
+                )
+
+    @staticmethod
+    def commit():
+        """Текущий коммит git, если он доступен."""
+
+        try:
+            return subprocess.run(
+                ('git', 'rev-parse', '--short', 'HEAD'),
+                capture_output=True,
+                check=True,
+                text=True,
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+
+    def compare(self, baseline, report):
+        """
+        Выводит изменения метрик относительно сохранённого отчёта.
+        Строки сопоставляются по полям, которые не являются метриками.
+        """
+
+        self.stdout.write(
+            f'Сравнение с {baseline.get("commit") or "отчётом"} '
+            f'({baseline.get("created")})'
+        )
+        for name, rows in report.items():
+            old_rows = {
+                self.row_key(row): row
+                for row in baseline['scenarios'].get(name, [])
+            }
+            self.stdout.write(self.style.MIGRATE_HEADING(name))
+            for row in rows:
+                key = self.row_key(row)
+                old = old_rows.get(key)
+                changes = []
+                for metric in filter(self.is_metric, row):
+                    if old is None or metric not in old:
+                        changes.append(f'{metric}={row[metric]}')
+                        continue
+                    change = f'{metric}={old[metric]}->{row[metric]}'
+                    if old[metric]:
+                        percent = (row[metric] - old[metric]) / old[metric]
+                        change += f' ({percent:+.0%})'
+                    changes.append(change)
+                self.stdout.write(
+                    '  '.join(
+                        [f'{field}={value}' for field, value in key]
+                        + changes
+                    )
+                )
+
+    def is_metric(self, field):
+        return field == 'queries' or field.endswith(self.metric_suffixes)
+
+    def row_key(self, row):
+        return tuple(
+            (field, value)
+            for field, value in row.items()
+            if not self.is_metric(field) and field not in ('calls', 'errors')
+        )
@@ -0,0 +1,106 @@
+"""Команда для проверки бюджетов запросов маршрутов API."""
+from django.core.management.base import BaseCommand, CommandError
+
+from api.benchmarks.budgets import (
+    BUDGETS,
+    budget_settings,
+    check_budgets,
+    measure_routes,
+    missing_budgets,
+)
+from api.benchmarks.datasets import seed_dataset
+from core.benchmarks.benchmarks import benchmark_database, sqlite_database
+
+
+class Command(BaseCommand):
+    """
+    Проверяет бюджеты маршрутов api/urls.py и users/urls.py
+    из api/benchmarks/budgets.py на временной базе SQLite в памяти,
+    независимо от настроенной базы данных. Каждый маршрут
+    выполняется от имени анонима и пользователя на данных двух
+    размеров, списки - с несколькими размерами страницы.
+    Команда завершается ошибкой, если количество запросов к базе
+    не равно бюджету или растёт с размером страницы или данных,
+    p95 времени ответа больше бюджета, статус ответа не тот
+    или у маршрута нет бюджета. Те же проверки, кроме времени
+    ответа, выполняет api.tests.test_query_budgets.
+    """
+
+    help = 'Проверка бюджетов запросов к базе маршрутов API.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'routes',
+            nargs='*',
+            help='Имена маршрутов (имя URL). По умолчанию все.',
+        )
+        parser.add_argument(
+            '--scales',
+            type=int,
+            nargs=2,
+            default=(100, 1000),
+            help='Количество рецептов в малом и большом наборе данных.',
+        )
+        parser.add_argument(
+            '--page-sizes',
+            type=int,
+            nargs='+',
+            default=(6, 50),
+            help='Размеры страницы для списков.',
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=5,
+            help='Количество повторов каждого замера.',
+        )
+
+    def handle(self, *args, **options):
+        names = [
+            route for route in BUDGETS
+            if not options['routes'] or route[0] in options['routes']
+        ]
+        if not names:
+            raise CommandError('Нет маршрутов с такими именами')
+
+        failures = missing_budgets()
+        rows = []
+        for scale in options['scales']:
+            with sqlite_database(), benchmark_database(), budget_settings():
+                seed_dataset(users=max(scale // 10, 20), recipes=scale)
+                rows.extend(
+                    {'recipes': scale, **row}
+                    for row in measure_routes(
+                        names,
+                        options['page_sizes'],
+                        options['repeat'],
+                    )
+                )
+
+        for row in rows:
+            queries, p95_ms, _ = BUDGETS[
+                (row['route'], row['method'])
+            ]['budgets'][row['viewer']]
+            line = self.format_row(row, queries, p95_ms)
+            if row['queries'] != queries or row['p95_ms'] > p95_ms:
+                line = self.style.ERROR(line)
+            self.stdout.write(line)
+
+        failures += check_budgets(rows)
+        if failures:
+            for failure in failures:
+                self.stderr.write(failure)
+            raise CommandError(f'Бюджеты нарушены: {len(failures)}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Бюджеты соблюдены: {len(rows)} замеров.'
+        ))
+
+    @staticmethod
+    def format_row(row, queries, p95_ms):
+        return (
+            f'{row["route"]} {row["method"].upper()} {row["viewer"]} '
+            f'recipes={row["recipes"]} page_size={row["page_size"] or "-"} '
+            f'status={",".join(map(str, row["status"]))} '
+            f'queries={row["queries"]}/{queries} '
+            f'p95_ms={row["p95_ms"]}/{p95_ms}'
+        )
@@ -0,0 +1,94 @@
+"""Команда для генерации синтетических данных."""
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from api.benchmarks.datasets import seed_dataset
+
+
+class Command(BaseCommand):
+    """
+    Заполняет базу синтетическими данными заданного размера
+    пакетными вставками: ингредиенты из data/ingredients.csv,
+    пользователи, теги, рецепты, избранное, списки продуктов
+    и подписки. Популярность рецептов и авторов убывает по закону
+    Ципфа. Данные пишутся в рабочую базу, для замеров на временной
+    базе есть команда benchmark.
+    """
+
+    help = 'Генерация синтетических данных для разработки и замеров.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--users',
+            type=int,
+            default=1000,
+            help='Количество пользователей.',
+        )
+        parser.add_argument(
+            '--recipes',
+            type=int,
+            default=10000,
+            help='Количество рецептов.',
+        )
+        parser.add_argument(
+            '--ingredients',
+            type=int,
+            help='Размер каталога ингредиентов. По умолчанию из файла.',
+        )
+        parser.add_argument(
+            '--tags',
+            type=int,
+            default=3,
+            help='Количество тегов.',
+        )
+        parser.add_argument(
+            '--favorites',
+            type=int,
+            default=20,
+            help='Рецептов в избранном у каждого пользователя.',
+        )
+        parser.add_argument(
+            '--carts',
+            type=int,
+            default=5,
+            help='Рецептов в списке продуктов у каждого пользователя.',
+        )
+        parser.add_argument(
+            '--follows',
+            type=int,
+            default=10,
+            help='Подписок у каждого пользователя.',
+        )
+        parser.add_argument(
+            '--prefix',
+            default='user',
+            help='Префикс имён пользователей (должен быть новым).',
+        )
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=0,
+            help='Начальное значение генератора случайных чисел.',
+        )
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        with transaction.atomic():
+            counts = seed_dataset(
+                users=options['users'],
+                recipes=options['recipes'],
+                ingredients=options['ingredients'],
+                tags=options['tags'],
+                favorites=options['favorites'],
+                carts=options['carts'],
+                follows=options['follows'],
+                prefix=options['prefix'],
+                seed=options['seed'],
+            )
+        for name, count in counts.items():
+            self.stdout.write(f'{name}: {count}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Данные созданы за {time.perf_counter() - start:.1f} с.'
+        ))
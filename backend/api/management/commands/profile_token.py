@@ -0,0 +1,34 @@
+"""Команда для выдачи подписи профилирования запросов."""
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from core.profiling.profiling import HEADER, make_token
+
+
+class Command(BaseCommand):
+    """
+    Выводит значение заголовка X-Profile для сотрудника. Запросы
+    с этим заголовком профилируются ProfilingMiddleware, отчёты
+    появляются в админке в разделе «Профили запросов». Подпись
+    действует PROFILING_TOKEN_MAX_AGE секунд и перестаёт
+    действовать, если пользователь больше не сотрудник.
+    """
+
+    help = 'Подпись заголовка X-Profile для профилирования запросов.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('username', help='Имя сотрудника.')
+
+    def handle(self, *args, **options):
+        user = get_user_model().objects.filter(
+            username=options['username'],
+        ).first()
+        if user is None:
+            raise CommandError('Нет такого пользователя')
+        if not (user.is_staff and user.is_active):
+            raise CommandError('Пользователь не сотрудник')
+        self.stdout.write(f'{HEADER}: {make_token(user)}')
+        self.stderr.write(
+            f'Действует {settings.PROFILING_TOKEN_MAX_AGE} с.'
+        )
@@ -0,0 +1,20 @@
+"""Команда для пересборки полнотекстового индекса рецептов."""
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from api.filters.search import get_recipe_search
+
+
+class Command(BaseCommand):
+    """
+    Пересобирает полнотекстовый индекс рецептов.
+    Нужна после массовой загрузки рецептов или ингредиентов
+    в обход моделей (bulk_create, COPY).
+    """
+
+    help = 'Пересборка полнотекстового индекса рецептов.'
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            get_recipe_search().update()
+        self.stdout.write(self.style.SUCCESS('Индекс пересобран.'))
@@ -5,15 +5,19 @@ from rest_framework import serializers
 from rest_framework.exceptions import ValidationError
 from django.db import transaction
 
+from core.images.images import LimitedBase64ImageField, srcset, submit
 from recipes.models import (
     FavoriteRecipeUser,
+    FeedEntry,
     Ingredient,
     IngredientRecipe,
     Recipe,
+    ShoppingCartIngredient,
     ShoppingCartUser,
     TagRecipe,
+    rendition_names,
 )
-from users.models import Follow
+from users.models import Follow, UserStats
 from users.serializers import CustomUserSerializer
 
 User = get_user_model()
@@ -77,7 +81,25 @@ class RecipeIngredientReadSerializer(serializers.ModelSerializer):
         model = IngredientRecipe
 
 
-class RecipesReadSerializer(serializers.ModelSerializer):
+class ImageSrcsetMixin(serializers.Serializer):
+    """
+    Добавляет к рецепту набор адресов вариантов изображения
+    в формате srcset для каждого формата: {"webp": "url 320w, ..."}.
+    Пока изображение не обработано, набор пустой.
+    """
+
+    image_srcset = serializers.SerializerMethodField()
+
+    def get_image_srcset(self, obj):
+        request = self.context.get('request')
+        return srcset(
+            obj.image.storage,
+            obj.image_renditions,
+            request.build_absolute_uri if request else None,
+        )
+
+
+class RecipesReadSerializer(ImageSrcsetMixin, serializers.ModelSerializer):
     """Сериализатор вывода рецептов."""
 
     tags = TagsSerializer(many=True)
@@ -94,6 +116,7 @@ class RecipesReadSerializer(serializers.ModelSerializer):
             'author',
             'name',
             'image',
+            'image_srcset',
             'text',
             'id',
             'ingredients',
@@ -114,12 +137,18 @@ class RecipesReadSerializer(serializers.ModelSerializer):
         ]
 
     def get_ingredients(self, obj):
-        """Возвращает сериализованные данные ингредиентов рецепта."""
+        """
+        Возвращает сериализованные данные ингредиентов рецепта.
+        Использует строки, загруженные заранее во вьюсете,
+        если они есть.
+        """
 
-        return RecipeIngredientReadSerializer(
-            obj.ingredients_in_recipe.all(),
-            many=True,
-        ).data
+        ingredients = getattr(obj, 'prefetched_ingredients', None)
+        if ingredients is None:
+            ingredients = obj.ingredients_in_recipe.select_related(
+                'ingredient',
+            )
+        return RecipeIngredientReadSerializer(ingredients, many=True).data
 
     def get_is_favorited(self, obj):
         """
@@ -127,6 +156,10 @@ class RecipesReadSerializer(serializers.ModelSerializer):
         добавления рецепта в избранное.
         """
 
+        flags = self.context.get('flags')
+        if flags is not None:
+            return obj.id in flags['favorited']
+
         request = self.context.get('request')
         if request.user.is_anonymous:
             return False
@@ -141,6 +174,10 @@ class RecipesReadSerializer(serializers.ModelSerializer):
         добавления рецепта в список продуктов.
         """
 
+        flags = self.context.get('flags')
+        if flags is not None:
+            return obj.id in flags['in_shopping_cart']
+
         request = self.context.get('request')
         if request.user.is_anonymous:
             return False
@@ -155,6 +192,10 @@ class RecipesReadSerializer(serializers.ModelSerializer):
         и возвращает значение флажка.
         """
 
+        flags = self.context.get('flags')
+        if flags is not None:
+            return obj.author_id in flags['subscribed']
+
         request = self.context.get('request')
         if request.user.is_anonymous:
             return False
@@ -174,7 +215,7 @@ class RecipesWriteSerializer(serializers.ModelSerializer):
     author = CustomUserSerializer(
         read_only=True, default=serializers.CurrentUserDefault()
     )
-    image = Base64ImageField(max_length=None, use_url=True)
+    image = LimitedBase64ImageField(max_length=None, use_url=True)
 
     class Meta:
         model = Recipe
@@ -195,38 +236,83 @@ class RecipesWriteSerializer(serializers.ModelSerializer):
         serializer = RecipesReadSerializer(instance, context=self.context)
         return serializer.data
 
-    def _add_ingredients(self, recipe, ingredients):
-        """Метод для добавления ингредиентов в рецепт."""
-
-        for ingredient in ingredients:
-            ingredient_id = ingredient.get('id')
-            amount = ingredient.get('amount')
-            ingredient_recipe, created = (
-                IngredientRecipe.objects.get_or_create(
-                    recipe=recipe,
-                    ingredient_id=ingredient_id,
-                    defaults={'amount': amount}
+    def _set_ingredients(self, recipe, ingredients, created=False):
+        """
+        Метод для записи ингредиентов рецепта.
+        Сравнивает новый состав с текущим и выполняет пакетные
+        вставку, обновление и удаление строк, поэтому количество
+        запросов не зависит от количества ингредиентов.
+        Возвращает старые и новые количества ингредиентов.
+        """
+
+        new_amounts = {
+            ingredient['id']: ingredient['amount']
+            for ingredient in ingredients
+        }
+        current = [] if created else list(recipe.ingredients_in_recipe.all())
+
+        old_amounts = {}
+        kept = set()
+        to_update, to_delete = [], []
+        for row in current:
+            if row.ingredient_id is not None:
+                old_amounts[row.ingredient_id] = (
+                    old_amounts.get(row.ingredient_id, 0) + row.amount
                 )
+            if (
+                    row.ingredient_id not in new_amounts
+                    or row.ingredient_id in kept
+            ):
+                to_delete.append(row.id)
+                continue
+            kept.add(row.ingredient_id)
+            if row.amount != new_amounts[row.ingredient_id]:
+                row.amount = new_amounts[row.ingredient_id]
+                to_update.append(row)
+
+        if to_delete:
+            IngredientRecipe.objects.filter(id__in=to_delete).delete()
+        IngredientRecipe.objects.bulk_update(to_update, ('amount',))
+        IngredientRecipe.objects.bulk_create(
+            IngredientRecipe(
+                recipe=recipe,
+                ingredient_id=ingredient_id,
+                amount=amount,
             )
-            if not created:
-                ingredient_recipe.amount = amount
-                ingredient_recipe.save()
+            for ingredient_id, amount in new_amounts.items()
+            if ingredient_id not in kept
+        )
+
+        return old_amounts, new_amounts
+
+    def _process_image(self, recipe):
+        """
+        Отправляет загруженное изображение на обработку в пул потоков
+        после фиксации транзакции, чтобы не задерживать ответ.
+        """
+
+        transaction.on_commit(
+            lambda: submit(Recipe.objects.process_image, recipe.id)
+        )
 
     def validate_ingredients(self, data):
         """Метод для валидации ингедиентов рецепта."""
 
-        ingredients = self.initial_data.get('ingredients')
-
-        if not ingredients:
+        if not data:
             raise ValidationError('Необходим хотя бы 1 ингредиент')
 
-        unique_ingredients = []
-        for ingredient in ingredients:
-            ingredient_id = ingredient['id']
+        ingredient_ids = [ingredient['id'] for ingredient in data]
+        if len(set(ingredient_ids)) != len(ingredient_ids):
+            raise ValidationError('Повторный ингредиент недопустим')
 
-            if ingredient_id in unique_ingredients:
-                raise ValidationError('Повторный ингредиент недопустим')
-            unique_ingredients.append(ingredient_id)
+        missing = set(ingredient_ids) - set(
+            Ingredient.objects.in_bulk(ingredient_ids)
+        )
+        if missing:
+            raise ValidationError(
+                'Ингредиенты не найдены: '
+                f'{", ".join(map(str, sorted(missing)))}'
+            )
 
         return data
 
@@ -238,6 +324,7 @@ class RecipesWriteSerializer(serializers.ModelSerializer):
             raise ValidationError('Время приготовления должно быть больше 0')
         return data
 
+    @transaction.atomic
     def create(self, validated_data):
         """Метод для создания рецепта с ингредиентами и тегами."""
 
@@ -249,36 +336,83 @@ class RecipesWriteSerializer(serializers.ModelSerializer):
             **validated_data,
         )
         new_recipe.tags.set(tags)
-        self._add_ingredients(new_recipe, ingredients)
+        self._set_ingredients(new_recipe, ingredients, created=True)
+        UserStats.objects.increment(author.id, 'recipes_count')
+        transaction.on_commit(
+            lambda: FeedEntry.objects.fan_out(new_recipe)
+        )
+        self._process_image(new_recipe)
 
         return new_recipe
 
+    @transaction.atomic
     def update(self, recipe, validated_data):
-        """Метод обновления рецепта."""
+        """
+        Метод обновления рецепта.
+        Ингредиенты и теги обновляются по разнице с текущим составом,
+        суммы в списках продуктов - на изменившиеся количества.
+        Прежнее изображение и его варианты освобождаются в хранилище.
+        """
 
+        ingredients = validated_data.pop('ingredients', None)
+        obsolete = None
+        if 'image' in validated_data:
+            obsolete = [recipe.image.name] + rendition_names(
+                recipe.image_renditions,
+            )
+            validated_data['image_renditions'] = {}
         super().update(recipe, validated_data)
-
-        recipe.ingredients_in_recipe.all().delete()
-        ingredients = validated_data.pop('ingredients')
-
-        with transaction.atomic():
-            self._add_ingredients(recipe, ingredients)
+        if obsolete is not None:
+            for name in obsolete:
+                recipe.image.storage.delete(name)
+            self._process_image(recipe)
+
+        if ingredients is not None:
+            old_amounts, new_amounts = self._set_ingredients(
+                recipe,
+                ingredients,
+            )
+            ShoppingCartIngredient.objects.change_recipe(
+                recipe.id,
+                old_amounts,
+                new_amounts,
+            )
 
         tags_data = self.initial_data.get('tags')
         if tags_data:
-            recipe.tags.clear()
-            for tag in tags_data:
-                recipe.tags.add(tag)
+            recipe.tags.set(tags_data)
 
         return recipe
 
 
-class RecipeListSerializer(serializers.ModelSerializer):
+class RecipeListSerializer(ImageSrcsetMixin, serializers.ModelSerializer):
     """Сериализатор списка рецептов."""
 
     class Meta:
         model = Recipe
-        fields = ('id', 'name', 'image', 'cooking_time')
+        fields = ('id', 'name', 'image', 'image_srcset', 'cooking_time')
+
+
+class PantryRecipeSerializer(RecipeListSerializer):
+    """
+    Сериализатор рецептов, подобранных по ингредиентам.
+    Совпадения берутся из контекста (словарь matches).
+    """
+
+    matched = serializers.SerializerMethodField()
+    missing_ingredients = serializers.SerializerMethodField()
+
+    class Meta(RecipeListSerializer.Meta):
+        fields = RecipeListSerializer.Meta.fields + (
+            'matched',
+            'missing_ingredients',
+        )
+
+    def get_matched(self, obj):
+        return self.context['matches'][obj.id][0]
+
+    def get_missing_ingredients(self, obj):
+        return self.context['matches'][obj.id][1]
 
 
 class FavoriteSerializer(serializers.ModelSerializer):
@@ -292,7 +426,7 @@ class FavoriteSerializer(serializers.ModelSerializer):
         fields = ('id',)
 
 
-class FollowRecipeSerializer(serializers.ModelSerializer):
+class FollowRecipeSerializer(ImageSrcsetMixin, serializers.ModelSerializer):
     """Сериализатор для рецептов авторов на которых подписан пользователь."""
 
     image = Base64ImageField(max_length=None, use_url=True)
@@ -303,6 +437,7 @@ class FollowRecipeSerializer(serializers.ModelSerializer):
             'id',
             'name',
             'image',
+            'image_srcset',
             'cooking_time',
         )
 
@@ -334,23 +469,31 @@ class FollowSerializer(serializers.ModelSerializer):
 
     def get_is_subscribed(self, obj):
         """
-        Проверяет подписан ли пользователь на автора
-        и возвращает результат проверки.
+        Возвращает флажок подписки на автора.
+        Объект подписки сам по себе означает, что пользователь подписан.
         """
 
-        return obj.follower.follower.filter(following=obj.following).exists()
+        return True
 
     def get_recipes(self, obj):
-        """Возвращает рецепты авторов на которых пописан пользователь."""
+        """
+        Возвращает рецепты авторов на которых пописан пользователь.
+        Использует рецепты, загруженные заранее во вьюсете, если они есть.
+        """
 
-        queryset = obj.following.recipes.all().order_by('-pub_date')
-        limit = self.context.get('request').query_params.get('recipes_limit')
-        if limit:
-            queryset = queryset[: int(limit)]
+        queryset = getattr(obj.following, 'limited_recipes', None)
+        if queryset is None:
+            queryset = obj.following.recipes.all().order_by('-pub_date')
+            limit = self.context.get('request').query_params.get(
+                'recipes_limit',
+            )
+            if limit:
+                queryset = queryset[: int(limit)]
 
         return FollowRecipeSerializer(queryset, many=True).data
 
     def get_recipes_count(self, obj):
         """Возвращает количество рецептов."""
 
-        return obj.following.recipes.all().count()
+        stats = getattr(obj.following, 'stats', None)
+        return stats.recipes_count if stats else 0
@@ -0,0 +1,52 @@
+"""Условные запросы к рецептам (ETag и 304)."""
+from django.core.cache import cache
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from api.benchmarks.datasets import seed_dataset
+from recipes.models import Recipe
+
+
+class RecipeETagTest(TestCase):
+    """ETag меняется вместе с любыми данными в выдаче рецепта."""
+
+    @classmethod
+    def setUpTestData(cls):
+        seed_dataset(users=5, recipes=10)
+        cls.recipe = Recipe.objects.filter(
+            ingredients_in_recipe__isnull=False,
+        ).select_related('author').first()
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+
+    def assertRevalidated(self, path, change):
+        etag = self.client.get(path)['ETag']
+        self.assertEqual(
+            self.client.get(path, HTTP_IF_NONE_MATCH=etag).status_code,
+            304,
+        )
+        change()
+        self.assertEqual(
+            self.client.get(path, HTTP_IF_NONE_MATCH=etag).status_code,
+            200,
+        )
+
+    def test_ingredient_rename_changes_detail_etag(self):
+        ingredient = self.recipe.ingredients_in_recipe.first().ingredient
+
+        def rename():
+            ingredient.name = f'{ingredient.name} новое'
+            ingredient.save()
+
+        self.assertRevalidated(f'/api/recipes/{self.recipe.id}/', rename)
+
+    def test_author_change_changes_list_etag(self):
+        author = self.recipe.author
+
+        def rename():
+            author.first_name = 'Другое имя'
+            author.save()
+
+        self.assertRevalidated('/api/recipes/?limit=20', rename)
@@ -0,0 +1,50 @@
+"""Загрузка каталога ингредиентов (load_ingredients --update-units)."""
+import io
+import os
+import tempfile
+
+from django.core.management import call_command
+from django.test import TestCase
+
+from recipes.models import Ingredient
+
+
+class UpdateUnitsTest(TestCase):
+    """Единица обновляется, только если в файле она у названия одна."""
+
+    def load(self, lines):
+        file, path = tempfile.mkstemp(suffix='.csv')
+        self.addCleanup(os.remove, path)
+        with os.fdopen(file, 'w', encoding='utf-8') as csv_file:
+            csv_file.write('\n'.join(lines) + '\n')
+        call_command(
+            'load_ingredients',
+            path,
+            '--update-units',
+            '--no-copy',
+            stdout=io.StringIO(),
+        )
+
+    def units(self, name):
+        return sorted(Ingredient.objects.filter(name=name).values_list(
+            'measurement_unit',
+            flat=True,
+        ))
+
+    def test_single_unit_updates(self):
+        Ingredient.objects.create(name='zzsalt', measurement_unit='г')
+        self.load(['zzsalt,кг', 'zzsalt,кг'])
+
+        self.assertEqual(self.units('zzsalt'), ['кг'])
+
+    def test_existing_unit_counts_as_ambiguous(self):
+        Ingredient.objects.create(name='zzsalt', measurement_unit='г')
+        self.load(['zzsalt,г', 'zzsalt,кг'])
+
+        self.assertEqual(self.units('zzsalt'), ['г', 'кг'])
+
+    def test_same_unit_is_skipped(self):
+        Ingredient.objects.create(name='zzsalt', measurement_unit='г')
+        self.load(['zzsalt,г'])
+
+        self.assertEqual(self.units('zzsalt'), ['г'])
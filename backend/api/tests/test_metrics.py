@@ -0,0 +1,31 @@
+"""Доступ к метрикам Prometheus."""
+from django.test import TestCase, override_settings
+
+
+class MetricsAccessTest(TestCase):
+    """Метрики отдаются только сборщику."""
+
+    def test_private_network_without_token(self):
+        for address, status in (
+                ('127.0.0.1', 200),
+                ('172.18.0.5', 200),
+                ('8.8.8.8', 403),
+        ):
+            with self.subTest(address=address):
+                response = self.client.get('/metrics', REMOTE_ADDR=address)
+                self.assertEqual(response.status_code, status)
+
+    @override_settings(METRICS_TOKEN='secret')
+    def test_token_required_when_configured(self):
+        for authorization, status in (
+                ('', 403),
+                ('Bearer wrong', 403),
+                ('Bearer секрет', 403),
+                ('Bearer secret', 200),
+        ):
+            with self.subTest(authorization=authorization):
+                response = self.client.get(
+                    '/metrics',
+                    HTTP_AUTHORIZATION=authorization,
+                )
+                self.assertEqual(response.status_code, status)
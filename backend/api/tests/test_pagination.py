@@ -0,0 +1,50 @@
+"""Постраничная навигация по смещению и по курсору."""
+from django.core.cache import cache
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from api.benchmarks.datasets import seed_dataset
+from recipes.models import FeedEntry
+from users.models import Follow
+
+
+class CursorOrderTest(TestCase):
+    """Курсор не меняет порядок выдачи."""
+
+    @classmethod
+    def setUpTestData(cls):
+        seed_dataset(users=20, recipes=100, follows=8)
+        follow = Follow.objects.select_related(
+            'follower',
+        ).order_by('id').first()
+        cls.viewer = follow.follower
+        for follow in cls.viewer.follower.select_related('following'):
+            FeedEntry.objects.follow(cls.viewer, follow.following)
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.viewer)
+
+    def assertSameOrder(self, path, limit):
+        offset = self.client.get(f'{path}&limit={limit}').json()['results']
+        cursor = self.client.get(
+            f'{path}&limit={limit}&cursor=',
+        ).json()['results']
+        self.assertTrue(offset)
+        self.assertEqual(
+            [item['id'] for item in offset],
+            [item['id'] for item in cursor],
+        )
+
+    def test_subscriptions(self):
+        self.assertGreater(self.viewer.follower.count(), 3)
+        self.assertSameOrder('/api/users/subscriptions/?recipes_limit=1', 3)
+
+    def test_feed_ordering(self):
+        for ordering in ('popular', 'quickest'):
+            with self.subTest(ordering=ordering):
+                self.assertSameOrder(
+                    f'/api/recipes/feed/?ordering={ordering}',
+                    10,
+                )
@@ -0,0 +1,73 @@
+"""Обновление индекса подбора рецептов по ингредиентам."""
+from unittest import mock
+
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from api.benchmarks.datasets import seed_dataset
+from api.filters.pantry import PantryIndex
+from recipes.models import Ingredient, IngredientRecipe, Recipe
+
+
+class PantryIndexTest(TestCase):
+    """Изменения рецептов и ингредиентов не пересобирают индекс."""
+
+    @classmethod
+    def setUpTestData(cls):
+        seed_dataset(users=5, recipes=30)
+        cls.ingredient_ids = list(
+            IngredientRecipe.objects.values_list(
+                'ingredient_id',
+                flat=True,
+            ).distinct()[:10]
+        )
+
+    def setUp(self):
+        self.client = APIClient()
+        self.index = PantryIndex()
+        patcher = mock.patch('api.views.pantry_index', self.index)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.rebuild = mock.patch.object(
+            self.index,
+            '_rebuild',
+            wraps=self.index._rebuild,
+        ).start()
+
+    def match(self, limit=5):
+        response = self.client.get('/api/recipes/pantry/', {
+            'ingredients': ','.join(map(str, self.ingredient_ids)),
+            'limit': limit,
+        })
+        self.assertEqual(response.status_code, 200)
+        return [recipe['id'] for recipe in response.json()]
+
+    def test_deleted_recipe_is_dropped_without_rebuild(self):
+        found = self.match()
+        self.assertEqual(len(found), 5)
+
+        Recipe.objects.get(pk=found[0]).delete()
+        refound = self.match()
+
+        self.assertEqual(len(refound), 5)
+        self.assertNotIn(found[0], refound)
+        self.assertNotIn(found[0], self.index.recipes)
+        self.assertEqual(self.rebuild.call_count, 1)
+
+    def test_ingredient_changes_are_synced_incrementally(self):
+        self.match()
+        ingredient = Ingredient.objects.get(pk=self.ingredient_ids[0])
+        recipe_ids = set(
+            ingredient.entry_into_recipe.values_list('recipe_id', flat=True)
+        )
+        ingredient.name = f'{ingredient.name} новое'
+        ingredient.save()
+        ingredient.delete()
+        self.match()
+
+        self.assertEqual(self.rebuild.call_count, 1)
+        for recipe_id in recipe_ids:
+            self.assertNotIn(
+                self.ingredient_ids[0],
+                self.index.recipes.get(recipe_id, ()),
+            )
@@ -0,0 +1,45 @@
+"""Бюджеты запросов к базе маршрутов API (api/benchmarks/budgets.py)."""
+from django.core.management import call_command
+from django.test import TransactionTestCase
+
+from api.benchmarks.budgets import (
+    BUDGETS,
+    budget_settings,
+    check_budgets,
+    measure_routes,
+    missing_budgets,
+)
+from api.benchmarks.datasets import seed_dataset
+
+
+class QueryBudgetsTest(TransactionTestCase):
+    """
+    Маршруты укладываются в бюджеты запросов на данных двух
+    размеров. Транзакции фиксируются, как в работе, поэтому запросы
+    обработчиков on_commit тоже считаются. Время ответа зависит
+    от машины и проверяется только командой check_query_budgets.
+    """
+
+    scales = (20, 80)
+    page_sizes = (6, 50)
+
+    def test_every_route_has_budget(self):
+        self.assertEqual(missing_budgets(), [])
+
+    def test_query_budgets(self):
+        rows = []
+        for scale in self.scales:
+            call_command('flush', interactive=False, verbosity=0)
+            with budget_settings():
+                seed_dataset(users=20, recipes=scale)
+                rows.extend(
+                    {'recipes': scale, **row}
+                    for row in measure_routes(
+                        list(BUDGETS),
+                        self.page_sizes,
+                        repeat=2,
+                    )
+                )
+
+        self.maxDiff = None
+        self.assertEqual(check_budgets(rows, latency=False), [])
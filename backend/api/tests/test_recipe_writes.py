@@ -0,0 +1,94 @@
+"""Количество запросов к базе при создании и изменении рецептов."""
+import tempfile
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from api.benchmarks.budgets import image_data
+from api.benchmarks.datasets import seed_dataset
+from recipes.models import Ingredient, Recipe, TagRecipe
+
+
+class RecipeWriteQueriesTest(TestCase):
+    """
+    Ингредиенты и теги рецепта пишутся пакетно: количество
+    запросов к базе не растёт с количеством ингредиентов.
+    """
+
+    INGREDIENTS = 30
+
+    @classmethod
+    def setUpTestData(cls):
+        seed_dataset(users=10, recipes=50)
+        cls.author = Recipe.objects.order_by('id').first().author
+        cls.ingredient_ids = list(
+            Ingredient.objects.order_by('id').values_list(
+                'id',
+                flat=True,
+            )[:cls.INGREDIENTS * 2]
+        )
+        cls.tag_ids = list(TagRecipe.objects.values_list('id', flat=True))
+
+    def setUp(self):
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        media = override_settings(MEDIA_ROOT=media_root.name)
+        media.enable()
+        self.addCleanup(media.disable)
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.author)
+
+    def payload(self, ingredient_ids, name='Рецепт'):
+        return {
+            'name': name,
+            'text': 'Описание',
+            'cooking_time': 10,
+            'image': image_data(),
+            'tags': self.tag_ids,
+            'ingredients': [
+                {'id': ingredient_id, 'amount': 100}
+                for ingredient_id in ingredient_ids
+            ],
+        }
+
+    def count_queries(self, method, path, data):
+        """
+        Запросы к базе вместе с работой после фиксации транзакции:
+        поисковый индекс, похожие рецепты, ленты, изображения.
+        """
+
+        with CaptureQueriesContext(connection) as context, \
+                self.captureOnCommitCallbacks(execute=True):
+            response = getattr(self.client, method)(path, data, format='json')
+        self.assertIn(response.status_code, (200, 201), response.content)
+        return len(context), response.json()
+
+    def test_write_queries_do_not_depend_on_ingredient_count(self):
+        self.count_queries(
+            'post',
+            '/api/recipes/',
+            self.payload(self.ingredient_ids[:1], 'Прогрев'),
+        )
+        counts = {}
+        for size in (1, self.INGREDIENTS):
+            created, recipe = self.count_queries(
+                'post',
+                '/api/recipes/',
+                self.payload(self.ingredient_ids[:size], f'Рецепт {size}'),
+            )
+            self.assertEqual(len(recipe['ingredients']), size)
+            updated, recipe = self.count_queries(
+                'put',
+                f'/api/recipes/{recipe["id"]}/',
+                self.payload(
+                    self.ingredient_ids[size:size * 2],
+                    f'Рецепт {size}',
+                ),
+            )
+            self.assertEqual(len(recipe['ingredients']), size)
+            counts[size] = (created, updated)
+        self.assertEqual(counts[1], counts[self.INGREDIENTS], counts)
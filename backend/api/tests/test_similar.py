@@ -0,0 +1,115 @@
+"""Обновление таблицы похожих рецептов."""
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from api.benchmarks.datasets import seed_dataset
+from recipes.models import FeedEntry, IngredientRecipe, Recipe, SimilarRecipe
+
+User = get_user_model()
+
+
+@override_settings(SIMILAR_RECIPES_LIMIT=3)
+class SimilarRecipeRefreshTest(TestCase):
+    """Обновление изменённых рецептов совпадает с полным пересчётом."""
+
+    @classmethod
+    def setUpTestData(cls):
+        seed_dataset(users=5, recipes=60, ingredients=40)
+
+    def setUp(self):
+        cache.clear()
+        SimilarRecipe.objects.rebuild()
+        first, second = Recipe.objects.filter(
+            ingredients_in_recipe__isnull=False,
+        ).distinct().order_by('id')[:2]
+        self.changed = {first.id, second.id}
+        # Обмен составами не меняет частоты ингредиентов,
+        # поэтому полный пересчёт даёт ту же таблицу.
+        first_rows = list(first.ingredients_in_recipe.values_list(
+            'id',
+            flat=True,
+        ))
+        second.ingredients_in_recipe.update(recipe=first)
+        IngredientRecipe.objects.filter(id__in=first_rows).update(
+            recipe=second,
+        )
+        first.save()
+        second.save()
+
+    @staticmethod
+    def pairs():
+        rows = SimilarRecipe.objects.values_list(
+            'recipe_id',
+            'similar_id',
+            'score',
+        )
+        return {
+            (recipe_id, similar_id): round(score, 5)
+            for recipe_id, similar_id, score in rows
+        }
+
+    def test_refresh_matches_rebuild(self):
+        SimilarRecipe.objects.refresh(self.changed)
+        refreshed = self.pairs()
+        SimilarRecipe.objects.rebuild()
+
+        self.assertEqual(refreshed, self.pairs())
+
+    @override_settings(SIMILAR_RECIPES_SYNC_OVERLAP=0)
+    def test_refresh_changed_takes_changed_recipes(self):
+        with mock.patch.object(
+                SimilarRecipe.objects,
+                'refresh',
+                wraps=SimilarRecipe.objects.refresh,
+        ) as refresh:
+            SimilarRecipe.objects.refresh_changed()
+
+        self.assertEqual(set(refresh.call_args.args[0]), self.changed)
+
+
+class FeedSimilarTest(TestCase):
+    """Добавление в избранное пополняет ленту похожими рецептами."""
+
+    @classmethod
+    def setUpTestData(cls):
+        seed_dataset(users=5, recipes=30)
+        SimilarRecipe.objects.rebuild()
+        cls.user = User.objects.create_user(
+            username='feed_reader',
+            email='feed_reader@example.com',
+            password='password',
+        )
+        cls.recipe_id = SimilarRecipe.objects.values_list(
+            'recipe_id',
+            flat=True,
+        ).order_by('recipe_id').first()
+
+    def test_favorite_adds_similar_recipes(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            response = client.post(
+                f'/api/recipes/{self.recipe_id}/favorite/',
+            )
+
+        self.assertEqual(response.status_code, 201)
+        self.assertTrue(callbacks)
+        expected = list(SimilarRecipe.objects.filter(
+            recipe_id=self.recipe_id,
+        ).order_by('-score').values_list(
+            'similar_id',
+            flat=True,
+        )[:settings.FEED_SIMILAR_PER_FAVORITE])
+        self.assertTrue(expected)
+        self.assertEqual(
+            set(FeedEntry.objects.filter(
+                user=self.user,
+                reason=FeedEntry.SIMILAR,
+            ).values_list('recipe_id', flat=True)),
+            set(expected),
+        )
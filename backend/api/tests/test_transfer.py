@@ -0,0 +1,78 @@
+"""Выгрузка и загрузка рецептов (dump_recipes и load_recipes)."""
+import io
+import json
+import os
+import tempfile
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TransactionTestCase
+
+from api.benchmarks.datasets import seed_dataset
+from recipes.models import (
+    FavoriteRecipeUser,
+    IngredientRecipe,
+    Recipe,
+    ShoppingCartUser,
+)
+from users.models import Follow
+
+User = get_user_model()
+
+
+class TransferTest(TransactionTestCase):
+    """Загрузка повторяема и не переносит учётные данные."""
+
+    def setUp(self):
+        seed_dataset(users=5, recipes=10)
+        self.path = tempfile.mkdtemp()
+        call_command(
+            'dump_recipes',
+            self.path,
+            '--no-media',
+            stdout=io.StringIO(),
+        )
+
+    def counts(self):
+        return [
+            model.objects.count()
+            for model in (
+                User,
+                Follow,
+                Recipe,
+                IngredientRecipe,
+                FavoriteRecipeUser,
+                ShoppingCartUser,
+            )
+        ]
+
+    def load(self):
+        call_command('load_recipes', self.path, stdout=io.StringIO())
+
+    def test_dump_has_no_credentials(self):
+        with open(os.path.join(self.path, 'data.ndjson')) as file:
+            users = [
+                record for record in map(json.loads, file)
+                if record['type'] == 'user'
+            ]
+
+        self.assertTrue(users)
+        for field in ('password', 'is_staff', 'is_superuser'):
+            self.assertFalse(any(field in user for user in users))
+
+    def test_load_is_idempotent(self):
+        counts = self.counts()
+        self.load()
+        self.assertEqual(self.counts(), counts)
+        self.load()
+        self.assertEqual(self.counts(), counts)
+
+    def test_loaded_users_cannot_log_in(self):
+        User.objects.all().delete()
+        self.load()
+
+        self.assertTrue(User.objects.exists())
+        self.assertFalse(any(
+            user.has_usable_password() or user.is_staff or user.is_superuser
+            for user in User.objects.all()
+        ))
@@ -0,0 +1,59 @@
+"""Количество запросов к базе при выдаче рецептов пользователю."""
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from api.benchmarks.datasets import seed_dataset
+from recipes.models import Recipe
+
+
+class ViewerFlagsQueriesTest(TestCase):
+    """
+    Флажки избранного, списка продуктов и подписок находятся
+    постоянным числом запросов независимо от размера страницы.
+    """
+
+    PAGE_SIZES = (6, 50, 200)
+
+    @classmethod
+    def setUpTestData(cls):
+        seed_dataset(users=20, recipes=210, favorites=30, carts=10)
+        cls.viewer = Recipe.objects.order_by('id').first().author
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.viewer)
+
+    def count_queries(self, path):
+        """Количество запросов к базе при повторном запросе path."""
+
+        self.assertEqual(self.client.get(path).status_code, 200)
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(path)
+        self.assertEqual(response.status_code, 200)
+        return len(context), response.json()
+
+    def test_list_queries_do_not_depend_on_page_size(self):
+        counts = {}
+        for page_size in self.PAGE_SIZES:
+            counts[page_size], data = self.count_queries(
+                f'/api/recipes/?limit={page_size}',
+            )
+            self.assertEqual(len(data['results']), page_size)
+        self.assertEqual(len(set(counts.values())), 1, counts)
+        self.assertTrue(any(
+            recipe['is_favorited'] for recipe in data['results']
+        ))
+
+    def test_retrieve_queries_do_not_depend_on_recipe(self):
+        counts = {
+            self.count_queries(f'/api/recipes/{recipe_id}/')[0]
+            for recipe_id in Recipe.objects.order_by('id').values_list(
+                'id',
+                flat=True,
+            )[:10]
+        }
+        self.assertEqual(len(counts), 1, counts)
@@ -1,39 +1,80 @@
 """Обработчики приложения api."""
+from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.http import HttpResponse
+from django.db import transaction
+from django.db.models import (
+    F,
+    Prefetch,
+    Window,
+    prefetch_related_objects,
+)
+from django.db.models.functions import RowNumber
+from django.http import StreamingHttpResponse
 from django.shortcuts import get_object_or_404
+from django.utils.cache import get_conditional_response
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import status, viewsets
 from rest_framework.decorators import action
 from rest_framework.generics import ListAPIView
-from rest_framework.pagination import LimitOffsetPagination
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import AllowAny, IsAuthenticated
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
-from api.filters.filters import IngredientFilter, RecipeFilter
-from core.pagination.paginators import CustomPagination
+from api.filters.filters import (
+    FEED_ORDERING,
+    RECIPE_ORDERINGS,
+    SEARCH_ORDERING,
+    IngredientFilter,
+    RecipeFilter,
+)
+from api.filters.pantry import pantry_index
+from core.cache.cache import (
+    ReferenceCacheMixin,
+    ingredients_cache,
+    tags_cache,
+)
+from core.exporters.exporters import EXPORTERS
+from core.metrics.metrics import SHOPPING_LIST_DOWNLOADS, count_list_change
+from core.pagination.paginators import (
+    CustomPagination,
+    SubscriptionsPagination,
+)
 from core.permissions.permissions import IsAuthorOrReadOnly
-from core.utils.utils import get_response, preparation_shopping_list
+from core.utils.utils import (
+    get_response,
+    get_shopping_list,
+    make_etag,
+    set_validators,
+)
 from api.serializers import (
     FavoriteSerializer,
     FollowSerializer,
     IngredientSerializer,
+    PantryRecipeSerializer,
     RecipeListSerializer,
+    RecipesReadSerializer,
     RecipesWriteSerializer,
     TagsSerializer,
 )
 from recipes.models import (
     FavoriteRecipeUser,
+    FeedEntry,
     Ingredient,
+    IngredientRecipe,
     Recipe,
+    ShoppingCartIngredient,
     ShoppingCartUser,
     TagRecipe,
 )
+from users.models import UserStats
 
 
 User = get_user_model()
 
+# Поля автора в выдаче рецепта, от которых зависит ETag.
+AUTHOR_FIELDS = ('email', 'username', 'first_name', 'last_name')
+
 
 class RecipesViewSet(viewsets.ModelViewSet):
     """Вьюсет для обработки запросов к рецептам."""
@@ -43,30 +84,206 @@ class RecipesViewSet(viewsets.ModelViewSet):
     permission_classes = (IsAuthorOrReadOnly,)
     pagination_class = CustomPagination
 
+    @property
+    def keyset_ordering(self):
+        """
+        Ключ постраничной навигации совпадает с сортировкой выдачи:
+        ordering важнее поиска, поиск - сортировки ленты.
+        """
+
+        params = self.request.query_params
+        if params.get('ordering') in RECIPE_ORDERINGS:
+            return RECIPE_ORDERINGS[params['ordering']]
+        if params.get('search', '').strip():
+            return SEARCH_ORDERING
+        if self.action == 'feed':
+            return FEED_ORDERING
+        return CustomPagination.keyset_ordering
+
     def get_serializer_class(self):
         """Метод опредления сериализатора в зависимости от запроса."""
 
         if self.action in ('favorite', 'shopping_cart'):
             return FavoriteSerializer
+        if self.action in ('list', 'retrieve', 'feed'):
+            return RecipesReadSerializer
+        if self.action == 'pantry':
+            return PantryRecipeSerializer
+        if self.action == 'similar':
+            return RecipeListSerializer
         return RecipesWriteSerializer
 
+    def get_flags(self, recipes):
+        """
+        Метод для получения флажков пользователя для набора рецептов.
+        Избранное, список продуктов и подписки на авторов находятся
+        тремя запросами независимо от количества рецептов.
+        """
+
+        flags = {
+            'favorited': set(),
+            'in_shopping_cart': set(),
+            'subscribed': set(),
+        }
+        user = self.request.user
+        if user.is_anonymous or not recipes:
+            return flags
+
+        recipe_ids = {recipe.id for recipe in recipes}
+        author_ids = {recipe.author_id for recipe in recipes}
+        flags['favorited'] = set(
+            user.favorite_recipes.filter(
+                recipe_id__in=recipe_ids,
+            ).values_list('recipe_id', flat=True)
+        )
+        flags['in_shopping_cart'] = set(
+            user.shopping_carts.filter(
+                recipe_id__in=recipe_ids,
+            ).values_list('recipe_id', flat=True)
+        )
+        flags['subscribed'] = set(
+            user.follower.filter(
+                following_id__in=author_ids,
+            ).values_list('following_id', flat=True)
+        )
+        return flags
+
+    def prefetch_recipes(self, recipes):
+        """
+        Метод для загрузки тегов и ингредиентов набора рецептов.
+        Выполняется фиксированным числом запросов после проверки ETag.
+        """
+
+        prefetch_related_objects(
+            recipes,
+            'tags',
+            Prefetch(
+                'ingredients_in_recipe',
+                queryset=IngredientRecipe.objects.select_related(
+                    'ingredient',
+                ),
+                to_attr='prefetched_ingredients',
+            ),
+        )
+
+    def get_etag(self, recipes, flags, *parts):
+        """
+        Метод для вычисления ETag набора рецептов.
+        Учитывает версии рецептов, тегов и ингредиентов, данные
+        авторов (загружены вместе с рецептами) и флажки пользователя.
+        """
+
+        return make_etag(
+            [
+                (
+                    recipe.id,
+                    recipe.updated_at,
+                    [getattr(recipe.author, field) for field in AUTHOR_FIELDS],
+                )
+                for recipe in recipes
+            ],
+            sorted((key, sorted(value)) for key, value in flags.items()),
+            tags_cache.version(),
+            ingredients_cache.version(),
+            *parts,
+        )
+
+    def list(self, request, *args, **kwargs):
+        """
+        Метод вывода списка рецептов.
+        Если страница не изменилась, отвечает 304 без сериализации.
+        """
+
+        queryset = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(queryset)
+        recipes = list(queryset) if page is None else page
+        flags = self.get_flags(recipes)
+
+        envelope = None
+        if page is not None:
+            envelope = self.get_paginated_response([]).data
+        etag = self.get_etag(recipes, flags, request.get_full_path(), envelope)
+        last_modified = max(
+            (recipe.updated_at for recipe in recipes),
+            default=None,
+        )
+        not_modified = get_conditional_response(request, etag=etag)
+        if not_modified is not None:
+            return set_validators(not_modified, etag, last_modified)
+
+        self.prefetch_recipes(recipes)
+        context = self.get_serializer_context()
+        context['flags'] = flags
+        serializer = self.get_serializer(recipes, many=True, context=context)
+
+        if page is None:
+            response = Response(serializer.data)
+        else:
+            response = self.get_paginated_response(serializer.data)
+        return set_validators(response, etag, last_modified)
+
+    def retrieve(self, request, *args, **kwargs):
+        """
+        Метод вывода одного рецепта.
+        Если рецепт не изменился, отвечает 304 без сериализации.
+        """
+
+        recipe = self.get_object()
+        flags = self.get_flags([recipe])
+
+        etag = self.get_etag([recipe], flags)
+        not_modified = get_conditional_response(request, etag=etag)
+        if not_modified is not None:
+            return set_validators(not_modified, etag, recipe.updated_at)
+
+        self.prefetch_recipes([recipe])
+        context = self.get_serializer_context()
+        context['flags'] = flags
+        serializer = self.get_serializer(recipe, context=context)
+
+        return set_validators(
+            Response(serializer.data),
+            etag,
+            recipe.updated_at,
+        )
+
     def get_queryset(self):
         """Метод для получения списка рецептов."""
 
         queryset = Recipe.objects.all()
         author = self.request.user
+        if self.action == 'feed':
+            queryset = FeedEntry.objects.feed(author)
         if self.request.GET.get('is_favorited'):
-            return Recipe.objects.filter(
+            queryset = queryset.filter(
                 in_favorite__user=author.id,
             )
-
-        if self.request.GET.get('is_in_shopping_cart'):
-            return Recipe.objects.filter(
+        elif self.request.GET.get('is_in_shopping_cart'):
+            queryset = queryset.filter(
                 recipes_in_shopping_cart__user=author,
             )
 
+        if self.action in ('list', 'retrieve', 'feed'):
+            queryset = queryset.select_related('author')
+
         return queryset
 
+    @transaction.atomic
+    def perform_destroy(self, instance):
+        """
+        Метод удаления рецепта.
+        Перед удалением рецепт вычитается из сумм ингредиентов
+        в списках продуктов.
+        """
+
+        ShoppingCartIngredient.objects.change_recipe(
+            instance.id,
+            ShoppingCartIngredient.objects.recipe_amounts(instance.id),
+            new_amounts={},
+        )
+        UserStats.objects.increment(instance.author_id, 'recipes_count', -1)
+        instance.delete()
+
     @action(
         methods=['post', 'delete'],
         detail=True,
@@ -76,7 +293,7 @@ class RecipesViewSet(viewsets.ModelViewSet):
         """
         Метод для добавления или удаления рецепта в избранное.
         """
-        return get_response(
+        response = get_response(
             Recipe,
             FavoriteRecipeUser,
             request.user,
@@ -84,6 +301,8 @@ class RecipesViewSet(viewsets.ModelViewSet):
             request.method,
             RecipeListSerializer,
         )
+        count_list_change('favorite', request, response)
+        return response
 
     @action(
         methods=('post', 'delete'),
@@ -95,7 +314,7 @@ class RecipesViewSet(viewsets.ModelViewSet):
         Метод для добавления или удаления рецепта в список продуктов.
         """
 
-        return get_response(
+        response = get_response(
             Recipe,
             ShoppingCartUser,
             request.user,
@@ -103,6 +322,8 @@ class RecipesViewSet(viewsets.ModelViewSet):
             request.method,
             RecipeListSerializer,
         )
+        count_list_change('shopping_cart', request, response)
+        return response
 
     @action(
         methods=('GET', ),
@@ -111,35 +332,163 @@ class RecipesViewSet(viewsets.ModelViewSet):
     )
     def download_shopping_cart(self, request):
         """
-        Метод для скачивания списка продуктов в виде текстового файла.
+        Метод для скачивания списка продуктов.
+        Формат файла задаётся параметром format: txt, csv или pdf.
         """
 
-        shopping_list = preparation_shopping_list(request=request)
+        export_format = request.query_params.get('format', 'txt')
+        exporter_class = EXPORTERS.get(export_format)
+        if exporter_class is None:
+            return Response(
+                {'errors': f'Неподдерживаемый формат: {export_format}'},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
 
-        response = HttpResponse(shopping_list, content_type='text/plain')
+        exporter = exporter_class(get_shopping_list(request.user))
+        SHOPPING_LIST_DOWNLOADS.labels(exporter.format).inc()
+        response = StreamingHttpResponse(
+            exporter.stream(),
+            content_type=exporter.content_type,
+        )
         response['Content-Disposition'] = (
             'attachment; '
-            f'filename="{self.request.user.username} shopping list.txt"'
+            f'filename="{request.user.username} shopping list'
+            f'.{exporter.format}"'
         )
 
         return response
 
+    @action(
+        methods=('GET',),
+        detail=False,
+        permission_classes=(IsAuthenticated,),
+    )
+    def feed(self, request):
+        """
+        Метод вывода персональной ленты пользователя:
+        рецепты авторов из подписок и рецепты, похожие на избранное,
+        от новых к старым. Фильтры и пагинация - как у списка рецептов.
+        """
+
+        return self.list(request)
 
-class TagsViewSet(viewsets.ReadOnlyModelViewSet):
+    @action(
+        methods=('GET',),
+        detail=True,
+        permission_classes=(AllowAny,),
+    )
+    def similar(self, request, pk=None):
+        """
+        Метод вывода похожих рецептов.
+        Соседи берутся из предрассчитанной таблицы SimilarRecipe.
+        """
+
+        recipe = get_object_or_404(Recipe, pk=pk)
+        recipes = Recipe.objects.filter(
+            similar_to__recipe=recipe,
+        ).order_by('-similar_to__score', '-id')
+        serializer = self.get_serializer(recipes, many=True)
+        return Response(serializer.data)
+
+    @action(
+        methods=('GET',),
+        detail=False,
+        permission_classes=(AllowAny,),
+    )
+    def pantry(self, request):
+        """
+        Метод подбора рецептов по имеющимся ингредиентам.
+        Ингредиенты передаются параметром ingredients (id через запятую
+        или несколько параметров), необязательные limit и max_missing
+        ограничивают выдачу. Сначала идут рецепты, которые можно
+        приготовить полностью, затем с одним недостающим ингредиентом
+        и так далее.
+        """
+
+        params = request.query_params
+        try:
+            ingredient_ids = {
+                int(value)
+                for param in params.getlist('ingredients')
+                for value in param.split(',')
+                if value.strip()
+            }
+            limit = min(
+                int(params.get('limit', settings.PANTRY_RESULTS_LIMIT)),
+                settings.PANTRY_RESULTS_LIMIT,
+            )
+            max_missing = params.get('max_missing')
+            if max_missing is not None:
+                max_missing = int(max_missing)
+        except ValueError:
+            return Response(
+                {'errors': 'Параметры должны быть целыми числами'},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        if not ingredient_ids:
+            return Response(
+                {'errors': 'Укажите ингредиенты в параметре ingredients'},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        # Рецепты, удалённые после построения индекса, убираются из него,
+        # и подбор повторяется, чтобы выдача не стала короче.
+        while True:
+            found = pantry_index.match(
+                ingredient_ids,
+                max(limit, 0),
+                max_missing,
+            )
+            recipes = Recipe.objects.in_bulk(
+                [recipe_id for recipe_id, _, _ in found]
+            )
+            deleted = [
+                recipe_id for recipe_id, _, _ in found
+                if recipe_id not in recipes
+            ]
+            if not deleted:
+                break
+            pantry_index.discard(deleted)
+        matches = {
+            recipe_id: (matched, missing)
+            for recipe_id, matched, missing in found
+        }
+        serializer = self.get_serializer(
+            [recipes[recipe_id] for recipe_id, _, _ in found],
+            many=True,
+            context={**self.get_serializer_context(), 'matches': matches},
+        )
+        return Response(serializer.data)
+
+    def perform_content_negotiation(self, request, force=False):
+        """
+        Параметр format у выгрузки списка продуктов задаёт формат файла,
+        поэтому ошибки этого действия всегда отдаются в JSON.
+        """
+
+        if self.action == 'download_shopping_cart':
+            renderer = JSONRenderer()
+            return renderer, renderer.media_type
+        return super().perform_content_negotiation(request, force)
+
+
+class TagsViewSet(ReferenceCacheMixin, viewsets.ReadOnlyModelViewSet):
     """
     Вьюсет для просмотра тегов рецептов.
     """
 
+    reference_cache = tags_cache
     queryset = TagRecipe.objects.all()
     serializer_class = TagsSerializer
     pagination_class = None
 
 
-class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
+class IngredientViewSet(ReferenceCacheMixin, viewsets.ReadOnlyModelViewSet):
     """
     Вьюсет для просмотра ингредиентов.
     """
 
+    reference_cache = ingredients_cache
     serializer_class = IngredientSerializer
     queryset = Ingredient.objects.all()
     permission_classes = (IsAuthorOrReadOnly,)
@@ -167,8 +516,12 @@ class FollowUserView(APIView):
                 status=status.HTTP_400_BAD_REQUEST,
             )
 
+        with transaction.atomic():
+            follow = request.user.follower.create(following=author)
+            UserStats.objects.increment(author.id, 'followers_count')
+            FeedEntry.objects.follow(request.user, author)
         serializer = FollowSerializer(
-            request.user.follower.create(following=author),
+            follow,
             context={'request': request},
         )
 
@@ -180,7 +533,18 @@ class FollowUserView(APIView):
         """
 
         author = get_object_or_404(User, id=id)
-        if request.user.follower.filter(following=author).delete()[0] > 0:
+        with transaction.atomic():
+            num_deleted, _ = request.user.follower.filter(
+                following=author,
+            ).delete()
+            if num_deleted:
+                UserStats.objects.increment(
+                    author.id,
+                    'followers_count',
+                    -num_deleted,
+                )
+                FeedEntry.objects.unfollow(request.user, author)
+        if num_deleted > 0:
             return Response(status=status.HTTP_204_NO_CONTENT)
 
         return Response(
@@ -195,8 +559,44 @@ class SubscriptionsView(ListAPIView):
     """
 
     serializer_class = FollowSerializer
-    pagination_class = LimitOffsetPagination
+    pagination_class = SubscriptionsPagination
     permission_classes = (IsAuthenticated,)
 
+    def get_recipes_limit(self):
+        """Возвращает ограничение количества рецептов автора или None."""
+
+        try:
+            limit = int(self.request.query_params.get('recipes_limit'))
+        except (TypeError, ValueError):
+            return None
+        return limit if limit >= 0 else None
+
     def get_queryset(self):
-        return self.request.user.follower.all()
+        """
+        Метод для получения подписок пользователя.
+        Количество рецептов берётся из счётчиков автора, а последние
+        рецепты всех авторов страницы загружаются одним запросом
+        с оконной функцией, поэтому число запросов не зависит
+        от количества подписок.
+        """
+
+        recipes = Recipe.objects.order_by('-pub_date', '-id')
+        limit = self.get_recipes_limit()
+        if limit is not None:
+            recipes = recipes.annotate(
+                row_number=Window(
+                    RowNumber(),
+                    partition_by=F('author_id'),
+                    order_by=(F('pub_date').desc(), F('id').desc()),
+                ),
+            ).filter(row_number__lte=limit)
+
+        return self.request.user.follower.select_related(
+            'following__stats',
+        ).prefetch_related(
+            Prefetch(
+                'following__recipes',
+                queryset=recipes,
+                to_attr='limited_recipes',
+            ),
+        ).order_by(*SubscriptionsPagination.keyset_ordering)
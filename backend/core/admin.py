@@ -0,0 +1,87 @@
+"""Регистрация профилей запросов в админке."""
+from django.contrib import admin
+from django.core.exceptions import PermissionDenied
+from django.http import HttpResponse
+from django.shortcuts import get_object_or_404
+from django.urls import path, reverse
+from django.utils.html import format_html
+
+from core.models import ProfileReport
+
+
+@admin.register(ProfileReport)
+class ProfileReportAdmin(admin.ModelAdmin):
+    """
+    Просмотр профилей запросов. Статистику pstats можно скачать
+    и открыть в snakeviz или python -m pstats.
+    """
+
+    list_display = (
+        'created',
+        'method',
+        'path',
+        'view',
+        'status',
+        'duration_ms',
+        'queries',
+        'db_ms',
+        'user',
+    )
+    list_filter = ('method', 'status', 'view')
+    search_fields = ('path', 'view')
+    fields = (
+        'created',
+        'user',
+        'method',
+        'path',
+        'view',
+        'status',
+        'duration_ms',
+        'queries',
+        'db_ms',
+        'stats_file',
+        'report_text',
+    )
+    readonly_fields = fields
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    @admin.display(description='Отчёт')
+    def report_text(self, obj):
+        return format_html('<pre>{}</pre>', obj.report)
+
+    @admin.display(description='Статистика pstats')
+    def stats_file(self, obj):
+        return format_html(
+            '<a href="{}">profile-{}.prof</a>',
+            reverse('admin:core_profilereport_stats', args=(obj.pk,)),
+            obj.pk,
+        )
+
+    def get_urls(self):
+        return [
+            path(
+                '<int:pk>/stats/',
+                self.admin_site.admin_view(self.download_stats),
+                name='core_profilereport_stats',
+            ),
+        ] + super().get_urls()
+
+    def download_stats(self, request, pk):
+        """Файл статистики pstats профиля."""
+
+        if not self.has_view_permission(request):
+            raise PermissionDenied
+        report = get_object_or_404(ProfileReport, pk=pk)
+        response = HttpResponse(
+            bytes(report.stats),
+            content_type='application/octet-stream',
+        )
+        response['Content-Disposition'] = (
+            f'attachment; filename="profile-{pk}.prof"'
+        )
+        return response
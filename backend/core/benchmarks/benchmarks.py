@@ -0,0 +1,158 @@
+"""Инструменты для замеров производительности."""
+import math
+import random
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+from django.db import (
+    DEFAULT_DB_ALIAS,
+    connection,
+    connections,
+    reset_queries,
+)
+from django.test.utils import (
+    CaptureQueriesContext,
+    setup_test_environment,
+    teardown_test_environment,
+)
+
+
+@contextmanager
+def benchmark_database(verbosity=0):
+    """
+    Контекстный менеджер временной базы данных для замеров.
+    Данные для замеров не попадают в рабочую базу.
+    """
+
+    setup_test_environment()
+    old_name = connection.settings_dict['NAME']
+    connection.creation.create_test_db(
+        verbosity=verbosity,
+        autoclobber=True,
+    )
+    try:
+        yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=verbosity)
+        teardown_test_environment()
+
+
+@contextmanager
+def sqlite_database():
+    """
+    Контекстный менеджер, подменяющий базу по умолчанию на SQLite
+    в памяти: замеры не зависят от настроенной базы данных и не
+    требуют внешних сервисов. Временная база создаётся поверх
+    подменённой базой benchmark_database.
+    """
+
+    original = connections[DEFAULT_DB_ALIAS]
+    original_settings = connections.settings[DEFAULT_DB_ALIAS]
+    connections.settings[DEFAULT_DB_ALIAS] = {
+        **original_settings,
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': ':memory:',
+        'USER': '',
+        'PASSWORD': '',
+        'HOST': '',
+        'PORT': '',
+        'OPTIONS': {},
+        'TEST': {**original_settings['TEST'], 'NAME': None},
+    }
+    connections[DEFAULT_DB_ALIAS] = connections.create_connection(
+        DEFAULT_DB_ALIAS,
+    )
+    try:
+        yield
+    finally:
+        # Обёртка SQLite не закрывает соединение с базой в памяти,
+        # чтобы не потерять данные; здесь база больше не нужна.
+        sqlite = connections[DEFAULT_DB_ALIAS]
+        if sqlite.connection is not None:
+            sqlite.connection.close()
+            sqlite.connection = None
+        connections.settings[DEFAULT_DB_ALIAS] = original_settings
+        connections[DEFAULT_DB_ALIAS] = original
+
+
+def percentile(values, percent):
+    """Возвращает перцентиль списка значений."""
+
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = math.ceil(percent / 100 * len(ordered)) - 1
+    return ordered[max(index, 0)]
+
+
+def measure(func, repeat=5):
+    """
+    Выполняет функцию несколько раз и возвращает
+    количество запросов к базе и время выполнения в миллисекундах.
+    """
+
+    timings = []
+    queries = 0
+    for _ in range(repeat):
+        reset_queries()
+        with CaptureQueriesContext(connection) as context:
+            start = time.perf_counter()
+            func()
+            timings.append((time.perf_counter() - start) * 1000)
+        queries = len(context)
+
+    return {
+        'queries': queries,
+        'p50_ms': round(percentile(timings, 50), 2),
+        'p95_ms': round(percentile(timings, 95), 2),
+    }
+
+
+def replay(requests, total, seed=0):
+    """
+    Воспроизводит смесь запросов. requests - словарь
+    {имя: (вес, функция)}; последовательность из total вызовов
+    выбирается по весам и при одном seed всегда одинакова.
+    Для каждого имени возвращает количество вызовов и ответов
+    с ошибкой, наибольшее количество запросов к базе, p50/p95
+    времени и пик выделенной за вызов памяти (замеряется
+    отдельным вызовом, чтобы tracemalloc не искажал время).
+    """
+
+    names = list(requests)
+    order = random.Random(seed).choices(
+        names,
+        weights=[requests[name][0] for name in names],
+        k=total,
+    )
+    timings = {name: [] for name in names}
+    queries = dict.fromkeys(names, 0)
+    errors = dict.fromkeys(names, 0)
+    for name in order:
+        with CaptureQueriesContext(connection) as context:
+            start = time.perf_counter()
+            response = requests[name][1]()
+            timings[name].append((time.perf_counter() - start) * 1000)
+        queries[name] = max(queries[name], len(context))
+        if getattr(response, 'status_code', 200) >= 400:
+            errors[name] += 1
+
+    results = []
+    for name in names:
+        if not timings[name]:
+            continue
+        tracemalloc.start()
+        requests[name][1]()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        results.append({
+            'endpoint': name,
+            'calls': len(timings[name]),
+            'errors': errors[name],
+            'queries': queries[name],
+            'p50_ms': round(percentile(timings[name], 50), 2),
+            'p95_ms': round(percentile(timings[name], 95), 2),
+            'peak_memory_kb': round(peak / 1024, 1),
+        })
+    return results
@@ -0,0 +1,145 @@
+"""Кэш справочных данных (теги, ингредиенты)."""
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from rest_framework.renderers import JSONRenderer
+
+from core.metrics.metrics import CACHE_REQUESTS
+
+
+class ReferenceCache:
+    """
+    Версионированный кэш справочника.
+    Версия хранится в общем кэше Django и меняется при любом изменении
+    справочника, поэтому её видят все процессы. Значения лежат
+    в общем кэше и дополнительно в памяти процесса.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.version_key = f'reference:{name}:version'
+        self.local = {}
+
+    def version(self):
+        """Возвращает текущую версию справочника (время изменения)."""
+
+        version = cache.get(self.version_key)
+        if version is None:
+            cache.add(self.version_key, time.time(), None)
+            version = cache.get(self.version_key)
+        return version
+
+    def invalidate(self, **kwargs):
+        """Меняет версию справочника. Подходит как обработчик сигналов."""
+
+        cache.set(self.version_key, time.time(), None)
+
+    def get(self, key, build):
+        """
+        Возвращает значение для текущей версии справочника.
+        Если значения нет ни в памяти процесса, ни в общем кэше,
+        оно строится функцией build.
+        """
+
+        version = self.version()
+        local = self.local.get(key)
+        if local is not None and local[0] == version:
+            CACHE_REQUESTS.labels(self.name, 'hit').inc()
+            return local[1]
+
+        shared_key = f'reference:{self.name}:{version}:{key}'
+        value = cache.get(shared_key)
+        CACHE_REQUESTS.labels(
+            self.name,
+            'miss' if value is None else 'hit',
+        ).inc()
+        if value is None:
+            value = build()
+            cache.set(
+                shared_key,
+                value,
+                settings.REFERENCE_CACHE_TIMEOUT,
+            )
+        self.local[key] = (version, value)
+        return value
+
+
+tags_cache = ReferenceCache('tags')
+ingredients_cache = ReferenceCache('ingredients')
+
+
+class ReferenceCacheMixin:
+    """
+    Примесь для вьюсетов справочников.
+    Отдаёт заранее сериализованный JSON из кэша с заголовками
+    ETag и Last-Modified и отвечает 304, если данные не изменились.
+    Запросы с параметрами обрабатываются без кэша.
+    """
+
+    reference_cache = None
+
+    def get_reference_cache_key(self):
+        """Ключ кэша для запроса или None, если ответ не кэшируется."""
+
+        if self.request.query_params:
+            return None
+        if self.action == 'list':
+            return 'list'
+        if self.action == 'retrieve':
+            return f'detail:{self.kwargs.get(self.lookup_field)}'
+        return None
+
+    def cached_response(self, request, key, build_data):
+        """Возвращает ответ из кэша справочника."""
+
+        def build():
+            body = JSONRenderer().render(build_data())
+            return {
+                'body': body,
+                'etag': f'"{hashlib.md5(body).hexdigest()}"',
+                'last_modified': int(self.reference_cache.version()),
+            }
+
+        entry = self.reference_cache.get(key, build)
+        response = get_conditional_response(
+            request,
+            etag=entry['etag'],
+            last_modified=entry['last_modified'],
+        )
+        if response is None:
+            response = HttpResponse(
+                entry['body'],
+                content_type='application/json',
+            )
+        response['ETag'] = entry['etag']
+        response['Last-Modified'] = http_date(entry['last_modified'])
+        return response
+
+    def list(self, request, *args, **kwargs):
+        key = self.get_reference_cache_key()
+        if key is None:
+            return super().list(request, *args, **kwargs)
+        return self.cached_response(
+            request,
+            key,
+            lambda: super(ReferenceCacheMixin, self).list(
+                request, *args, **kwargs
+            ).data,
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        key = self.get_reference_cache_key()
+        if key is None:
+            return super().retrieve(request, *args, **kwargs)
+        return self.cached_response(
+            request,
+            key,
+            lambda: super(ReferenceCacheMixin, self).retrieve(
+                request, *args, **kwargs
+            ).data,
+        )
@@ -0,0 +1,140 @@
+"""Выгрузка списка продуктов в разных форматах."""
+import csv
+import io
+import os
+
+from django.conf import settings
+from reportlab.lib.pagesizes import A4
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.pdfgen import canvas
+
+CHUNK_SIZE = 64 * 1024
+
+
+class ShoppingListExporter:
+    """
+    Базовый класс выгрузки списка продуктов.
+    Принимает итератор строк с ключами name, measurement_unit и amount
+    и отдаёт файл частями за один проход по строкам.
+    """
+
+    format = None
+    content_type = None
+
+    def __init__(self, rows):
+        self.rows = rows
+
+    def stream(self):
+        """Генератор частей файла."""
+
+        raise NotImplementedError
+
+
+class TextExporter(ShoppingListExporter):
+    """Выгрузка списка продуктов в текстовый файл."""
+
+    format = 'txt'
+    content_type = 'text/plain; charset=utf-8'
+
+    def stream(self):
+        yield 'Список ингредиентов:\n\n'
+
+        count = 0
+        for count, row in enumerate(self.rows, 1):
+            yield '{number}) {name} - {amount} ({unit})\n'.format(
+                number=count,
+                name=row['name'],
+                amount=row['amount'],
+                unit=row['measurement_unit'],
+            )
+
+        yield f'\nКоличество ингредиентов: {count}\n'
+
+
+class CSVExporter(ShoppingListExporter):
+    """Выгрузка списка продуктов в CSV."""
+
+    format = 'csv'
+    content_type = 'text/csv; charset=utf-8'
+
+    def stream(self):
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(('name', 'amount', 'measurement_unit'))
+
+        for row in self.rows:
+            writer.writerow(
+                (row['name'], row['amount'], row['measurement_unit'])
+            )
+            if buffer.tell() >= CHUNK_SIZE:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+
+        yield buffer.getvalue()
+
+
+class PDFExporter(ShoppingListExporter):
+    """
+    Выгрузка списка продуктов в PDF с разбивкой на страницы.
+    Для кириллицы нужен TTF-шрифт из настройки SHOPPING_LIST_PDF_FONT.
+    """
+
+    format = 'pdf'
+    content_type = 'application/pdf'
+    font_name = 'ShoppingListFont'
+    font_size = 11
+    line_height = 16
+    margin = 50
+
+    def _get_font(self):
+        """Регистрирует шрифт с кириллицей, если он доступен."""
+
+        if self.font_name in pdfmetrics.getRegisteredFontNames():
+            return self.font_name
+        font_path = settings.SHOPPING_LIST_PDF_FONT
+        if font_path and os.path.exists(font_path):
+            pdfmetrics.registerFont(TTFont(self.font_name, font_path))
+            return self.font_name
+        return 'Helvetica'
+
+    def stream(self):
+        buffer = io.BytesIO()
+        document = canvas.Canvas(buffer, pagesize=A4)
+        font = self._get_font()
+        top = A4[1] - self.margin
+
+        def new_page():
+            document.setFont(font, self.font_size)
+            return top
+
+        position = new_page()
+        document.drawString(self.margin, position, 'Список ингредиентов')
+        position -= self.line_height * 2
+
+        for number, row in enumerate(self.rows, 1):
+            if position < self.margin:
+                document.showPage()
+                position = new_page()
+            document.drawString(
+                self.margin,
+                position,
+                '{number}) {name} - {amount} ({unit})'.format(
+                    number=number,
+                    name=row['name'],
+                    amount=row['amount'],
+                    unit=row['measurement_unit'],
+                ),
+            )
+            position -= self.line_height
+
+        document.save()
+        buffer.seek(0)
+        yield from iter(lambda: buffer.read(CHUNK_SIZE), b'')
+
+
+EXPORTERS = {
+    exporter.format: exporter
+    for exporter in (TextExporter, CSVExporter, PDFExporter)
+}
@@ -0,0 +1,186 @@
+"""Обработка загруженных изображений."""
+import io
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import close_old_connections
+from django.template.defaultfilters import filesizeformat
+from drf_extra_fields.fields import Base64ImageField
+from PIL import Image, ImageOps
+from rest_framework.exceptions import ValidationError
+
+logger = logging.getLogger(__name__)
+
+# Параметры сохранения: формат Pillow, расширение, параметры кодека.
+FORMATS = {
+    'avif': ('AVIF', 'avif', {'quality': 60}),
+    'webp': ('WEBP', 'webp', {'quality': 80, 'method': 4}),
+    'jpeg': ('JPEG', 'jpg', {'quality': 82, 'optimize': True}),
+}
+
+
+def available_formats():
+    """Форматы вариантов, которые умеет сохранять установленный Pillow."""
+
+    Image.init()
+    return [
+        name
+        for name, (pillow_format, _, _) in FORMATS.items()
+        if pillow_format in Image.SAVE
+    ]
+
+
+class LimitedBase64ImageField(Base64ImageField):
+    """
+    Поле изображения в base64 с ограничением размера.
+    Слишком большая строка отклоняется до декодирования,
+    чтобы не держать в памяти лишние мегабайты.
+    """
+
+    def to_internal_value(self, data):
+        limit = settings.IMAGE_MAX_UPLOAD_SIZE
+        if isinstance(data, str) and len(data) * 3 // 4 > limit:
+            raise ValidationError(
+                f'Размер изображения больше {filesizeformat(limit)}'
+            )
+        return super().to_internal_value(data)
+
+
+def open_image(storage, name):
+    """
+    Открывает изображение, поворачивает по EXIF и уменьшает
+    до IMAGE_MAX_SIDE по большей стороне. Метаданные при
+    последующем сохранении не переносятся.
+    """
+
+    with storage.open(name) as file:
+        image = Image.open(file)
+        image = ImageOps.exif_transpose(image)
+        image.load()
+    image.thumbnail(
+        (settings.IMAGE_MAX_SIDE, settings.IMAGE_MAX_SIDE),
+        Image.LANCZOS,
+    )
+    return image
+
+
+def encode(image, format_name):
+    """Кодирует изображение в указанный формат без метаданных."""
+
+    pillow_format, _, options = FORMATS[format_name]
+    if pillow_format == 'JPEG' or image.mode not in ('RGB', 'RGBA'):
+        if image.mode in ('RGBA', 'LA', 'P'):
+            image = image.convert('RGBA')
+            background = Image.new('RGB', image.size, (255, 255, 255))
+            background.paste(image, mask=image.getchannel('A'))
+            image = background
+        else:
+            image = image.convert('RGB')
+    buffer = io.BytesIO()
+    image.save(buffer, pillow_format, **options)
+    return buffer.getvalue()
+
+
+def make_renditions(storage, name):
+    """
+    Готовит изображение к раздаче: кодирует оригинал без метаданных
+    и с ограничением размера, а также варианты шириной
+    IMAGE_RENDITION_WIDTHS во всех доступных форматах.
+    Ничего не сохраняет, возвращает файл оригинала и словарь
+    {формат: {ширина: файл}}.
+    """
+
+    image = open_image(storage, name)
+    stem = os.path.splitext(os.path.basename(name))[0]
+
+    original = ContentFile(encode(image, 'jpeg'), name=f'{stem}.jpg')
+    widths = sorted({
+        width
+        for width in settings.IMAGE_RENDITION_WIDTHS
+        if width < image.width
+    } | {image.width})
+
+    renditions = {}
+    for format_name in available_formats():
+        extension = FORMATS[format_name][1]
+        renditions[format_name] = {}
+        for width in widths:
+            resized = image
+            if width < image.width:
+                resized = image.resize(
+                    (width, max(round(image.height * width / image.width), 1)),
+                    Image.LANCZOS,
+                )
+            renditions[format_name][str(width)] = ContentFile(
+                encode(resized, format_name),
+                name=f'{stem}-{width}.{extension}',
+            )
+    return original, renditions
+
+
+def srcset(storage, renditions, build_url=None):
+    """
+    Собирает для каждого формата строку srcset
+    вида "url 320w, url 640w".
+    """
+
+    build_url = build_url or (lambda url: url)
+    return {
+        format_name: ', '.join(
+            f'{build_url(storage.url(name))} {width}w'
+            for width, name in sorted(
+                sizes.items(),
+                key=lambda item: int(item[0]),
+            )
+        )
+        for format_name, sizes in renditions.items()
+    }
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def submit(func, *args):
+    """
+    Выполняет функцию в пуле из IMAGE_WORKERS потоков,
+    не задерживая ответ на запрос. Ошибки пишутся в лог.
+    Задачи пула не переживают перезапуск процесса: необработанные
+    изображения подбирает периодическая команда process_images.
+    При IMAGE_WORKERS = 0 функция выполняется сразу в текущем
+    потоке: так работают тесты и замеры на SQLite в памяти,
+    где запись из другого потока блокирует таблицы.
+    """
+
+    global _executor
+
+    def run():
+        try:
+            func(*args)
+        except Exception:
+            logger.exception('Ошибка обработки изображения')
+
+    def run_in_pool():
+        # Потоки пула не получают сигналов о конце запроса,
+        # поэтому соединения с базой закрываются после каждой задачи.
+        close_old_connections()
+        try:
+            run()
+        finally:
+            close_old_connections()
+
+    if not settings.IMAGE_WORKERS:
+        run()
+        return None
+
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.IMAGE_WORKERS,
+                thread_name_prefix='images',
+            )
+    return _executor.submit(run_in_pool)
@@ -0,0 +1,217 @@
+"""Замеры производительности запросов к API."""
+import json
+import logging
+import random
+import time
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.db import DatabaseError, connections
+
+request_logger = logging.getLogger('performance.request')
+slow_query_logger = logging.getLogger('performance.slow_query')
+
+# Сколько медленных запросов одного запроса к API объясняется EXPLAIN.
+EXPLAIN_LIMIT = 5
+
+
+class QueryRecorder:
+    """
+    Обёртка выполнения запросов к базе (connection.execute_wrapper).
+    Считает запросы и их суммарное время, запоминает запросы
+    дольше PERFORMANCE_SLOW_QUERY_MS.
+    """
+
+    def __init__(self, slow_query_ms):
+        self.slow_query_ms = slow_query_ms
+        self.count = 0
+        self.duration = 0.0
+        self.slow = []
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = (time.perf_counter() - start) * 1000
+            self.count += 1
+            self.duration += duration
+            if duration >= self.slow_query_ms:
+                self.slow.append((
+                    context['connection'],
+                    sql,
+                    params,
+                    many,
+                    duration,
+                ))
+
+
+def view_name(request):
+    """
+    Имя обработчика запроса: класс и действие вьюсета
+    (RecipesViewSet.list) или путь к функции представления.
+    """
+
+    match = request.resolver_match
+    if match is None:
+        return None
+    view_class = getattr(match.func, 'cls', None)
+    if view_class is None:
+        return match._func_path
+    actions = getattr(match.func, 'actions', None) or {}
+    action = actions.get(request.method.lower(), request.method.lower())
+    return f'{view_class.__name__}.{action}'
+
+
+def explain(connection, sql, params):
+    """План выполнения запроса или None, если его не получить."""
+
+    if not sql.lstrip().upper().startswith(('SELECT', 'WITH')):
+        return None
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'{connection.ops.explain_query_prefix()} {sql}',
+                params,
+            )
+            return '\n'.join(
+                ' '.join(str(value) for value in row)
+                for row in cursor.fetchall()
+            )
+    except DatabaseError:
+        return None
+
+
+@contextmanager
+def recording(recorder):
+    """Подключает recorder ко всем соединениям с базой."""
+
+    with ExitStack() as stack:
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(recorder))
+        yield
+
+
+class PerformanceMiddleware:
+    """
+    Замеряет выборку запросов (доля PERFORMANCE_SAMPLE_RATE):
+    количество и время запросов к базе, время отрисовки ответа
+    (сериализация в JSON, CSV, PDF), остальное время обработчика
+    и размер ответа. Результат добавляется в заголовок Server-Timing
+    и пишется строкой JSON в лог performance.request. Запросы к базе
+    дольше PERFORMANCE_SLOW_QUERY_MS пишутся в лог
+    performance.slow_query вместе с планом EXPLAIN. Запросы вне
+    выборки обрабатываются без обёрток. Потоковые ответы
+    (выгрузка списка продуктов) замеряются до конца передачи тела
+    и попадают только в лог: заголовки к этому времени уже ушли.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if random.random() >= settings.PERFORMANCE_SAMPLE_RATE:
+            return self.get_response(request)
+
+        recorder = QueryRecorder(settings.PERFORMANCE_SLOW_QUERY_MS)
+        request.performance = {'render_ms': 0.0}
+        start = time.perf_counter()
+        with recording(recorder):
+            response = self.get_response(request)
+
+        if response.streaming:
+            response.streaming_content = self.stream(
+                response.streaming_content,
+                request,
+                response,
+                recorder,
+                start,
+            )
+            return response
+
+        record = self.finish(request, response, recorder, start)
+        if settings.PERFORMANCE_SERVER_TIMING:
+            response['Server-Timing'] = ', '.join((
+                f'db;dur={record["db_ms"]};desc="{recorder.count} queries"',
+                f'render;dur={record["render_ms"]}',
+                f'app;dur={record["app_ms"]}',
+                f'total;dur={record["total_ms"]}',
+            ))
+        return response
+
+    def stream(self, content, request, response, recorder, start):
+        """
+        Передаёт тело потокового ответа, продолжая замер. Заголовки
+        уже отправлены, поэтому результат попадает только в лог.
+        """
+
+        size = 0
+        try:
+            with recording(recorder):
+                for chunk in content:
+                    size += len(chunk)
+                    yield chunk
+        finally:
+            self.finish(request, response, recorder, start, size)
+
+    def finish(self, request, response, recorder, start, size=None):
+        """Пишет замер запроса и медленные запросы к базе в лог."""
+
+        total = (time.perf_counter() - start) * 1000
+        render = request.performance['render_ms']
+        record = {
+            'view': view_name(request),
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'queries': recorder.count,
+            'db_ms': round(recorder.duration, 2),
+            'render_ms': round(render, 2),
+            'app_ms': round(max(total - recorder.duration - render, 0), 2),
+            'total_ms': round(total, 2),
+            'size': size if response.streaming else len(response.content),
+        }
+        request_logger.info(json.dumps(record, ensure_ascii=False))
+        self.log_slow_queries(record['view'], recorder.slow)
+        return record
+
+    def process_template_response(self, request, response):
+        """
+        Засекает отрисовку ответа DRF. Методы process_template_response
+        вызываются в обратном порядке MIDDLEWARE, а у стоящих выше
+        ProfilingMiddleware и MetricsMiddleware их нет, поэтому этот
+        метод вызывается последним, непосредственно перед render().
+        """
+
+        performance = getattr(request, 'performance', None)
+        if performance is not None:
+            start = time.perf_counter()
+
+            def rendered(response):
+                performance['render_ms'] += (
+                    time.perf_counter() - start
+                ) * 1000
+
+            response.add_post_render_callback(rendered)
+        return response
+
+    @staticmethod
+    def log_slow_queries(view, slow):
+        """Пишет медленные запросы в лог, первые - с планом EXPLAIN."""
+
+        for number, (connection, sql, params, many, duration) in enumerate(
+                slow,
+        ):
+            plan = None
+            if not many and number < EXPLAIN_LIMIT:
+                plan = explain(connection, sql, params)
+            slow_query_logger.warning(json.dumps(
+                {
+                    'view': view,
+                    'duration_ms': round(duration, 2),
+                    'sql': sql,
+                    'params': None if many else repr(params),
+                    'explain': plan,
+                },
+                ensure_ascii=False,
+            ))
@@ -0,0 +1,184 @@
+"""Метрики приложения в формате Prometheus."""
+import hmac
+import ipaddress
+import os
+import time
+
+from django.conf import settings
+from django.db import connections
+from django.http import HttpResponse, HttpResponseForbidden
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+
+from core.instrumentation.instrumentation import recording, view_name
+
+# При нескольких процессах gunicorn значения пишутся в файлы каталога
+# PROMETHEUS_MULTIPROC_DIR и суммируются при чтении (см. gunicorn.conf.py).
+REQUEST_LATENCY = Histogram(
+    'foodgram_request_duration_seconds',
+    'Время обработки запроса по обработчикам и действиям.',
+    ('view', 'method'),
+)
+DB_QUERIES = Counter(
+    'foodgram_db_queries_total',
+    'Запросы к базе данных по обработчикам.',
+    ('view',),
+)
+DB_CONNECTIONS = Counter(
+    'foodgram_db_connections_total',
+    'Соединения с базой: opened - открытые заново, '
+    'reused - доставшиеся запросу открытыми от предыдущего.',
+    ('alias', 'state'),
+)
+CACHE_REQUESTS = Counter(
+    'foodgram_cache_requests_total',
+    'Обращения к кэшам: hit или miss.',
+    ('cache', 'result'),
+)
+SHOPPING_LIST_DOWNLOADS = Counter(
+    'foodgram_shopping_list_downloads_total',
+    'Выгрузки списка продуктов по форматам.',
+    ('format',),
+)
+RECIPE_LIST_CHANGES = Counter(
+    'foodgram_recipe_list_changes_total',
+    'Добавления и удаления рецептов в избранном и списке продуктов.',
+    ('list', 'action'),
+)
+
+
+def count_connection(sender, connection, **kwargs):
+    """Обработчик сигнала connection_created."""
+
+    DB_CONNECTIONS.labels(connection.alias, 'opened').inc()
+
+
+def count_list_change(name, request, response):
+    """Учитывает успешное добавление или удаление рецепта в списке."""
+
+    if response.status_code in (201, 204):
+        RECIPE_LIST_CHANGES.labels(
+            name,
+            'add' if request.method == 'POST' else 'remove',
+        ).inc()
+
+
+class QueryCounter:
+    """Обёртка выполнения запросов к базе, считающая запросы."""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+class MetricsMiddleware:
+    """
+    Считает время обработки каждого запроса и количество запросов
+    к базе по обработчикам, переиспользование соединений с базой
+    и попадания в HTTP-кэш клиента (ответы 304 на условные запросы).
+    Потоковые ответы учитываются после передачи тела.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        for connection in connections.all(initialized_only=True):
+            if connection.connection is not None:
+                DB_CONNECTIONS.labels(connection.alias, 'reused').inc()
+
+        counter = QueryCounter()
+        start = time.perf_counter()
+        with recording(counter):
+            response = self.get_response(request)
+
+        if 'If-None-Match' in request.headers or (
+                'If-Modified-Since' in request.headers
+        ):
+            CACHE_REQUESTS.labels(
+                'http',
+                'hit' if response.status_code == 304 else 'miss',
+            ).inc()
+
+        if response.streaming:
+            response.streaming_content = self.stream(
+                response.streaming_content,
+                request,
+                counter,
+                start,
+            )
+        else:
+            self.observe(request, counter, start)
+        return response
+
+    def stream(self, content, request, counter, start):
+        try:
+            with recording(counter):
+                yield from content
+        finally:
+            self.observe(request, counter, start)
+
+    @staticmethod
+    def observe(request, counter, start):
+        view = view_name(request) or 'unknown'
+        REQUEST_LATENCY.labels(view, request.method).observe(
+            time.perf_counter() - start,
+        )
+        if counter.count:
+            DB_QUERIES.labels(view).inc(counter.count)
+
+
+def registry():
+    """
+    Реестр для выдачи: в режиме нескольких процессов - сумма
+    значений всех процессов, иначе метрики текущего процесса.
+    """
+
+    if 'PROMETHEUS_MULTIPROC_DIR' not in os.environ:
+        return REGISTRY
+    collector_registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(collector_registry)
+    return collector_registry
+
+
+def metrics_allowed(request):
+    """
+    Проверяет доступ к метрикам: по токену METRICS_TOKEN,
+    если он задан, иначе по адресу клиента из частной сети.
+    """
+
+    if settings.METRICS_TOKEN:
+        return hmac.compare_digest(
+            request.headers.get('Authorization', '').encode(),
+            f'Bearer {settings.METRICS_TOKEN}'.encode(),
+        )
+    try:
+        address = ipaddress.ip_address(request.META.get('REMOTE_ADDR', ''))
+    except ValueError:
+        return False
+    return address.is_private or address.is_loopback
+
+
+def metrics(request):
+    """
+    Метрики в текстовом формате Prometheus.
+    Снаружи недоступны: nginx не проксирует /metrics,
+    а сам обработчик проверяет токен или адрес сборщика.
+    """
+
+    if not metrics_allowed(request):
+        return HttpResponseForbidden()
+    return HttpResponse(
+        generate_latest(registry()),
+        content_type=CONTENT_TYPE_LATEST,
+    )
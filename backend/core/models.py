@@ -0,0 +1,130 @@
+"""Модели приложения core."""
+from django.conf import settings
+from django.db import models
+from django.db.models import F
+from django.db.models.functions import Greatest
+
+
+class StoredFileManager(models.Manager):
+    """Менеджер счётчиков ссылок на файлы хранилища."""
+
+    def acquire(self, name, size):
+        """
+        Увеличивает число ссылок на файл, создавая запись
+        при первой загрузке. Вызывается в транзакции, запись
+        блокируется до её завершения.
+        Возвращает True, если файл загружен впервые.
+        """
+
+        stored, created = self.select_for_update().get_or_create(
+            name=name,
+            defaults={'size': size, 'references': 1},
+        )
+        if not created:
+            self.filter(pk=stored.pk).update(references=F('references') + 1)
+        return created
+
+    def release(self, name):
+        """
+        Уменьшает число ссылок на файл, не опуская его ниже нуля.
+        Возвращает False, если файла нет в учёте.
+        """
+
+        return bool(
+            self.filter(name=name).update(
+                references=Greatest(F('references') - 1, 0),
+            )
+        )
+
+
+class StoredFile(models.Model):
+    """
+    Файл хранилища с адресацией по содержимому.
+    Одинаковые загрузки хранятся одним файлом,
+    счётчик показывает, сколько объектов на него ссылается.
+    """
+
+    name = models.CharField(
+        max_length=255,
+        unique=True,
+        verbose_name='Имя файла',
+    )
+    size = models.PositiveBigIntegerField(verbose_name='Размер')
+    references = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Ссылок',
+    )
+    created = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name='Дата загрузки',
+    )
+
+    objects = StoredFileManager()
+
+    class Meta:
+        verbose_name = 'Файл хранилища'
+        verbose_name_plural = 'Файлы хранилища'
+
+    def __str__(self):
+        return self.name
+
+
+class ProfileReportManager(models.Manager):
+    """Менеджер отчётов профилировщика."""
+
+    def add(self, **fields):
+        """
+        Сохраняет отчёт и удаляет старые сверх PROFILING_MAX_REPORTS.
+        """
+
+        report = self.create(**fields)
+        stale = self.order_by('-created', '-pk').values_list(
+            'pk',
+            flat=True,
+        )[settings.PROFILING_MAX_REPORTS:]
+        self.filter(pk__in=list(stale)).delete()
+        return report
+
+
+class ProfileReport(models.Model):
+    """
+    Профиль одного запроса к API, снятый по подписанному
+    заголовку X-Profile сотрудника: время функций с графом
+    вызовов и запросы к базе. stats - статистика cProfile
+    в формате pstats для snakeviz и подобных инструментов.
+    """
+
+    created = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name='Дата',
+    )
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        related_name='profile_reports',
+        verbose_name='Сотрудник',
+    )
+    method = models.CharField(max_length=10, verbose_name='Метод')
+    path = models.CharField(max_length=2048, verbose_name='Путь')
+    view = models.CharField(
+        max_length=255,
+        blank=True,
+        verbose_name='Обработчик',
+    )
+    status = models.PositiveSmallIntegerField(verbose_name='Статус')
+    duration_ms = models.FloatField(verbose_name='Время, мс')
+    queries = models.PositiveIntegerField(verbose_name='Запросов к базе')
+    db_ms = models.FloatField(verbose_name='Время базы, мс')
+    report = models.TextField(verbose_name='Отчёт')
+    stats = models.BinaryField(verbose_name='Статистика pstats')
+
+    objects = ProfileReportManager()
+
+    class Meta:
+        ordering = ('-created',)
+        verbose_name = 'Профиль запроса'
+        verbose_name_plural = 'Профили запросов'
+
+    def __str__(self):
+        return f'{self.method} {self.path} ({self.duration_ms:.0f} мс)'
@@ -1,11 +1,208 @@
 """Пацинация для рецептов."""
-from rest_framework.pagination import PageNumberPagination
+import base64
+import json
 
 from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist
+from django.db import connection
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import (
+    LimitOffsetPagination,
+    PageNumberPagination,
+)
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
 
 
-class CustomPagination(PageNumberPagination):
-    """Кастомная пагинация на 6 рецептов на страницу."""
+class KeysetPaginationMixin:
+    """
+    Примесь постраничной навигации по ключу сортировки.
+    Включается параметром cursor: пустое значение - первая страница,
+    дальше - непрозрачные курсоры из полей next и previous.
+    Выборка страницы не использует OFFSET и COUNT(*), поэтому время
+    ответа не зависит от глубины прокрутки. Параметр count=approx
+    добавляет в ответ оценку количества объектов.
+    """
+
+    cursor_query_param = 'cursor'
+    count_query_param = 'count'
+    keyset_ordering = ('-pub_date', '-id')
+    invalid_cursor_message = 'Неверный курсор'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset = self.cursor_query_param in request.query_params
+        if not self.keyset:
+            return super().paginate_queryset(queryset, request, view)
+
+        self.request = request
+        self.ordering = getattr(view, 'keyset_ordering', self.keyset_ordering)
+        self.page_size = self.get_keyset_page_size(request)
+        self.has_cursor = bool(request.query_params[self.cursor_query_param])
+        values, reverse = self.decode_cursor(queryset)
+
+        ordering = self.ordering
+        if reverse:
+            ordering = [self.invert(field) for field in ordering]
+        self.count = None
+        if request.query_params.get(self.count_query_param) == 'approx':
+            self.count = self.estimate_count(queryset.order_by())
+
+        if values is not None:
+            queryset = queryset.filter(self.get_keyset_filter(
+                ordering,
+                values,
+            ))
+
+        page = list(queryset.order_by(*ordering)[:self.page_size + 1])
+        has_more = len(page) > self.page_size
+        page = page[:self.page_size]
+        if reverse:
+            page.reverse()
+
+        self.next_values = self.previous_values = None
+        if page and (has_more or reverse):
+            self.next_values = self.get_values(page[-1])
+        if page and (self.has_cursor and not reverse or has_more and reverse):
+            self.previous_values = self.get_values(page[0])
+        return page
+
+    def get_keyset_page_size(self, request):
+        """Размер страницы из параметров limit или page_size."""
+
+        if hasattr(self, 'get_limit'):
+            return self.get_limit(request) or settings.PAGE_SIZE
+        return self.get_page_size(request) or settings.PAGE_SIZE
+
+    @staticmethod
+    def invert(field):
+        """Меняет направление сортировки поля."""
+
+        return field[1:] if field.startswith('-') else f'-{field}'
+
+    @staticmethod
+    def get_keyset_filter(ordering, values):
+        """
+        Строит условие "после строки с ключом values" для сортировки:
+        (k1 < v1) OR (k1 = v1 AND k2 < v2) OR ...
+        """
+
+        condition = Q()
+        equal = Q()
+        for field, value in zip(ordering, values):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            condition |= equal & Q(**{f'{name}__{lookup}': value})
+            equal &= Q(**{name: value})
+        return condition
+
+    def get_values(self, obj):
+        """Значения ключа сортировки объекта."""
+
+        return [getattr(obj, field.lstrip('-')) for field in self.ordering]
+
+    def decode_cursor(self, queryset):
+        """Разбирает курсор в значения ключа и направление."""
+
+        cursor = self.request.query_params[self.cursor_query_param]
+        if not cursor:
+            return None, False
+        try:
+            padding = '=' * (-len(cursor) % 4)
+            data = json.loads(base64.urlsafe_b64decode(cursor + padding))
+            values = [
+                self.parse_value(queryset, field.lstrip('-'), value)
+                for field, value in zip(self.ordering, data['v'])
+            ]
+            if len(values) != len(self.ordering):
+                raise ValueError
+            return values, bool(data.get('r'))
+        except Exception:
+            raise NotFound(self.invalid_cursor_message)
+
+    @staticmethod
+    def parse_value(queryset, name, value):
+        """
+        Приводит значение из курсора к типу поля модели
+        или аннотации (например, релевантности поиска).
+        """
+
+        try:
+            field = queryset.model._meta.get_field(name)
+        except FieldDoesNotExist:
+            field = queryset.query.annotations[name].output_field
+        if isinstance(value, (bool, dict, list)):
+            raise ValueError(name)
+        return field.to_python(value)
+
+    def encode_cursor(self, values, reverse=False):
+        """Собирает курсор из значений ключа и направления."""
+
+        data = {
+            'v': [
+                value.isoformat() if hasattr(value, 'isoformat') else value
+                for value in values
+            ],
+            'r': int(reverse),
+        }
+        cursor = base64.urlsafe_b64encode(
+            json.dumps(data, separators=(',', ':')).encode()
+        ).decode().rstrip('=')
+        url = self.request.build_absolute_uri()
+        for param in ('page', 'offset'):
+            url = remove_query_param(url, param)
+        return replace_query_param(url, self.cursor_query_param, cursor)
+
+    @staticmethod
+    def estimate_count(queryset):
+        """
+        Оценка количества объектов.
+        На PostgreSQL берётся из плана запроса без его выполнения,
+        на остальных базах считается точно.
+        """
+
+        if connection.vendor != 'postgresql':
+            return queryset.count()
+
+        sql, params = queryset.values('pk').query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+            plan = cursor.fetchone()[0]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return int(plan[0]['Plan']['Plan Rows'])
+
+    def get_paginated_response(self, data):
+        if not self.keyset:
+            return super().get_paginated_response(data)
+
+        return Response({
+            'count': self.count,
+            'next': self.next_values and self.encode_cursor(self.next_values),
+            'previous': self.previous_values and self.encode_cursor(
+                self.previous_values,
+                reverse=True,
+            ),
+            'results': data,
+        })
+
+
+class CustomPagination(KeysetPaginationMixin, PageNumberPagination):
+    """
+    Кастомная пагинация на 6 рецептов на страницу.
+    С параметром cursor работает по ключу (pub_date, id)
+    или по ключу сортировки вьюсета (keyset_ordering).
+    """
 
     page_size_query_param = 'limit'
     page_size = settings.PAGE_SIZE
+
+
+class SubscriptionsPagination(KeysetPaginationMixin, LimitOffsetPagination):
+    """
+    Пагинация подписок по limit/offset.
+    С параметром cursor работает по ключу id подписки
+    в том же порядке, от старых подписок к новым.
+    """
+
+    keyset_ordering = ('id',)
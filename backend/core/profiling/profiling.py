@@ -0,0 +1,191 @@
+"""Профилирование отдельных запросов к API по запросу сотрудника."""
+import cProfile
+import io
+import logging
+import marshal
+import pstats
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core import signing
+
+from core.instrumentation.instrumentation import (
+    QueryRecorder,
+    recording,
+    view_name,
+)
+from core.models import ProfileReport
+
+logger = logging.getLogger('performance.profiling')
+
+HEADER = 'X-Profile'
+SALT = 'core.profiling'
+
+# Разделы отчёта: стек сериализации DRF и ORM.
+SERIALIZERS = (
+    r'(api|users)/serializers\.py'
+    r'|rest_framework/(serializers|fields|relations)\.py'
+)
+ORM = r'django/db/'
+
+# Сколько разных запросов к базе попадает в отчёт.
+QUERY_LIMIT = 20
+
+
+def make_token(user):
+    """Подписанное значение заголовка X-Profile для сотрудника."""
+
+    return signing.TimestampSigner(salt=SALT).sign(str(user.pk))
+
+
+def staff_user(token):
+    """
+    Сотрудник, которому выдано значение заголовка, или None,
+    если подпись неверна, устарела или пользователь больше
+    не сотрудник.
+    """
+
+    try:
+        pk = signing.TimestampSigner(salt=SALT).unsign(
+            token,
+            max_age=settings.PROFILING_TOKEN_MAX_AGE,
+        )
+    except signing.BadSignature:
+        logger.warning('Неверная или устаревшая подпись %s', HEADER)
+        return None
+    return get_user_model().objects.filter(
+        pk=pk,
+        is_staff=True,
+        is_active=True,
+    ).first()
+
+
+def build_report(stats, recorder):
+    """
+    Текст отчёта: функции по суммарному времени, сериализаторы,
+    ORM, граф вызовов и самые долгие запросы к базе.
+    """
+
+    limit = settings.PROFILING_REPORT_LINES
+    stream = io.StringIO()
+    stats.stream = stream
+    stats.sort_stats(pstats.SortKey.CUMULATIVE)
+    for title, restrictions in (
+            ('Функции по суммарному времени', ()),
+            ('Сериализаторы', (SERIALIZERS,)),
+            ('ORM', (ORM,)),
+    ):
+        stream.write(f'{title}\n')
+        stats.print_stats(*restrictions, limit)
+    stream.write('Граф вызовов\n')
+    stats.print_callees(limit)
+
+    queries = {}
+    for connection, sql, params, many, duration in recorder.slow:
+        count, total = queries.get(sql, (0, 0.0))
+        queries[sql] = (count + 1, total + duration)
+    stream.write(
+        f'Запросы к базе: {recorder.count}, '
+        f'{recorder.duration:.2f} мс\n\n'
+    )
+    for sql, (count, total) in sorted(
+            queries.items(),
+            key=lambda item: item[1][1],
+            reverse=True,
+    )[:QUERY_LIMIT]:
+        stream.write(f'{total:10.2f} мс {count:5} x {sql}\n')
+    return stream.getvalue()
+
+
+class ProfilingMiddleware:
+    """
+    Профилирует запрос через cProfile, если в нём есть заголовок
+    X-Profile, подписанный для сотрудника (команда profile_token).
+    Учитываются все функции, включая сериализаторы DRF и ORM,
+    и каждый запрос к базе. Отчёт сохраняется в ProfileReport
+    и доступен в админке, номер отчёта возвращается в заголовке
+    X-Profile-Report. Потоковые ответы профилируются до конца
+    передачи тела, номер отчёта для них не возвращается.
+    Запросы без заголовка обрабатываются без обёрток.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        token = request.headers.get(HEADER)
+        if token is None:
+            return self.get_response(request)
+        user = staff_user(token)
+        if user is None:
+            return self.get_response(request)
+
+        profiler = cProfile.Profile()
+        recorder = QueryRecorder(slow_query_ms=0)
+        start = time.perf_counter()
+        with recording(recorder):
+            profiler.enable()
+            try:
+                response = self.get_response(request)
+            finally:
+                profiler.disable()
+
+        if response.streaming:
+            response.streaming_content = self.stream(
+                response.streaming_content,
+                request,
+                response,
+                user,
+                profiler,
+                recorder,
+                start,
+            )
+        else:
+            report = self.save(
+                request,
+                response,
+                user,
+                profiler,
+                recorder,
+                start,
+            )
+            response[f'{HEADER}-Report'] = str(report.pk)
+        return response
+
+    def stream(self, content, request, response, user, profiler, recorder,
+               start):
+        """
+        Передаёт тело потокового ответа, профилируя получение
+        каждой части, но не её отправку клиенту.
+        """
+
+        chunks = iter(content)
+        with recording(recorder):
+            while True:
+                profiler.enable()
+                try:
+                    chunk = next(chunks, None)
+                finally:
+                    profiler.disable()
+                if chunk is None:
+                    break
+                yield chunk
+        self.save(request, response, user, profiler, recorder, start)
+
+    @staticmethod
+    def save(request, response, user, profiler, recorder, start):
+        duration = (time.perf_counter() - start) * 1000
+        stats = pstats.Stats(profiler)
+        return ProfileReport.objects.add(
+            user=user,
+            method=request.method,
+            path=request.get_full_path()[:2048],
+            view=view_name(request) or '',
+            status=response.status_code,
+            duration_ms=round(duration, 2),
+            queries=recorder.count,
+            db_ms=round(recorder.duration, 2),
+            report=build_report(stats, recorder),
+            stats=marshal.dumps(stats.stats),
+        )
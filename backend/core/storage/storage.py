@@ -0,0 +1,83 @@
+"""Хранилище медиафайлов с адресацией по содержимому."""
+import hashlib
+import os
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.db import transaction
+
+from core.models import StoredFile
+
+
+class HashedFileSystemStorage(FileSystemStorage):
+    """
+    Файловое хранилище, в котором имя файла - SHA-256 его содержимого:
+    recipes/images/ab/ab12...ef.jpg. Одинаковые загрузки записываются
+    один раз, число ссылок на файл хранится в StoredFile.
+    delete() уменьшает счётчик, а сам файл удаляется после фиксации
+    транзакции, когда ссылок не осталось. Файлы со старыми именами,
+    которых нет в учёте, удаляются сразу после фиксации.
+    """
+
+    chunk_size = 64 * 1024
+
+    def hashed_name(self, name, content):
+        """Имя файла по хешу содержимого в каталоге исходного имени."""
+
+        digest = hashlib.sha256()
+        if hasattr(content, 'seek'):
+            content.seek(0)
+        for chunk in content.chunks(self.chunk_size):
+            digest.update(chunk)
+        if hasattr(content, 'seek'):
+            content.seek(0)
+        digest = digest.hexdigest()
+        directory = os.path.dirname(name)
+        extension = os.path.splitext(name)[1].lower()
+        return f'{directory}/{digest[:2]}/{digest}{extension}'
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        name = self.hashed_name(name, content)
+
+        with transaction.atomic():
+            StoredFile.objects.acquire(name, content.size)
+            if not self.exists(name):
+                saved = self._save(name, content)
+                if saved != name:
+                    # Тот же файл параллельно записал другой процесс.
+                    self.remove(saved)
+        return name
+
+    def delete(self, name):
+        if not name:
+            return
+        if StoredFile.objects.release(name):
+            transaction.on_commit(lambda: self.collect(name))
+        else:
+            transaction.on_commit(lambda: self.remove(name))
+
+    def collect(self, name):
+        """
+        Удаляет файл, если на него не осталось ссылок.
+        Запись удаляется в одной транзакции с файлом, поэтому
+        параллельная загрузка того же файла дождётся удаления
+        и запишет файл заново.
+        """
+
+        with transaction.atomic():
+            deleted, _ = StoredFile.objects.filter(
+                name=name,
+                references=0,
+            ).delete()
+            if deleted:
+                self.remove(name)
+        return bool(deleted)
+
+    def remove(self, name):
+        """Удаляет файл с диска без учёта ссылок."""
+
+        super().delete(name)
@@ -1,6 +1,10 @@
 """Общие функции и утилиты."""
-from django.db.models import Sum
+import hashlib
+
+from django.db.models import F
 from django.shortcuts import get_object_or_404
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.utils.http import http_date
 from rest_framework import status
 from rest_framework.response import Response
 
@@ -32,12 +36,12 @@ def add_or_delete_in_list(
             )
 
         recipe = get_object_or_404(search_model, pk=pk)
-        model.objects.create(user=user, recipe=recipe)
+        model.objects.add(user, recipe)
         serializer = serializer(recipe)
 
         return serializer.data
 
-    num_deleted, _ = obj_queryset.delete()
+    num_deleted = model.objects.remove(user, pk)
     if num_deleted == 0:
         raise DeleteError(
             expression=model.__name__,
@@ -74,32 +78,37 @@ def get_response(search_model, model, user, pk, method, serializer):
     return Response(status=status.HTTP_204_NO_CONTENT)
 
 
-def preparation_shopping_list(request):
-    """Метод для подготовки списка продуктов пользователя."""
-
-    ingredients = request.user.shopping_carts.values(
-        'recipe_id__ingredients_in_recipe__ingredient__name',
-        'recipe_id__ingredients_in_recipe__ingredient__measurement_unit',
-    ).annotate(amount=Sum('recipe_id__ingredients_in_recipe__amount'))
-
-    ingredient_count = ingredients.count()
-    shopping_list = [
-        f'Количество ингедиентов: {ingredient_count}',
-        '\nСписок ингедиентов:\n\n',
-    ]
-    shopping_list += [
-        '{number}) {name} - {amount} ({unit})\n'.format(
-            number=numerate,
-            name=ingredient[
-                'recipe_id__ingredients_in_recipe__ingredient__name'
-            ],
-            amount=ingredient['amount'],
-            unit=ingredient[
-                'recipe_id__ingredients_in_recipe'
-                '__ingredient__measurement_unit'
-            ]
-        )
-        for numerate, ingredient in enumerate(ingredients, 1)
-    ]
+def get_shopping_list(user, chunk_size=2000):
+    """
+    Возвращает итератор ингредиентов из списка продуктов пользователя.
+    Суммы читаются из заранее посчитанной таблицы частями,
+    без загрузки всего списка в память.
+    """
+
+    return user.shopping_cart_ingredients.values(
+        'amount',
+        name=F('ingredient__name'),
+        measurement_unit=F('ingredient__measurement_unit'),
+    ).order_by('name').iterator(chunk_size=chunk_size)
+
+
+def make_etag(*parts):
+    """Метод для вычисления сильного ETag по набору значений."""
+
+    digest = hashlib.md5(repr(parts).encode())
+    return f'"{digest.hexdigest()}"'
+
+
+def set_validators(response, etag, last_modified=None):
+    """
+    Метод для установки заголовков условных запросов.
+    Ответ зависит от пользователя, поэтому он помечается как частный,
+    а повторная проверка выполняется по ETag.
+    """
 
-    return '\n'.join(shopping_list)
+    response['ETag'] = etag
+    if last_modified is not None:
+        response['Last-Modified'] = http_date(last_modified.timestamp())
+    patch_cache_control(response, private=True, no_cache=True)
+    patch_vary_headers(response, ('Authorization',))
+    return response
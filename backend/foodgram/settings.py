@@ -1,5 +1,6 @@
 """Настройки проекта Foodgram."""
 import os
+import sys
 from pathlib import Path
 
 
@@ -39,6 +40,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "core.profiling.profiling.ProfilingMiddleware",
+    "core.metrics.metrics.MetricsMiddleware",
+    "core.instrumentation.instrumentation.PerformanceMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -143,6 +147,125 @@ STATIC_ROOT = BASE_DIR / 'collected_static'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Медиафайлы хранятся по хешу содержимого со счётчиком ссылок,
+# неиспользуемые файлы удаляет команда collect_media
+STORAGES = {
+    'default': {
+        'BACKEND': 'core.storage.storage.HashedFileSystemStorage',
+    },
+    'staticfiles': {
+        'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage',
+    },
+}
+
+# Общий для всех процессов gunicorn кэш
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND',
+            'django.core.cache.backends.filebased.FileBasedCache',
+        ),
+        'LOCATION': os.getenv(
+            'CACHE_LOCATION',
+            os.path.join(BASE_DIR, 'cache'),
+        ),
+    }
+}
+
+# Время жизни значений кэша справочников (теги, ингредиенты)
+REFERENCE_CACHE_TIMEOUT = 24 * 60 * 60
+
+# Количество ингредиентов в выдаче автодополнения
+INGREDIENT_AUTOCOMPLETE_LIMIT = 50
+
+# Подбор рецептов по ингредиентам: максимум рецептов в выдаче
+# и запас в секундах при подгрузке изменённых рецептов в индекс
+PANTRY_RESULTS_LIMIT = 50
+PANTRY_INDEX_SYNC_OVERLAP = 60
+
+# Похожие рецепты: количество соседей рецепта
+# и вес тега относительно ингредиента
+SIMILAR_RECIPES_LIMIT = 10
+SIMILAR_RECIPES_TAG_WEIGHT = 0.5
+# Запас окна поиска изменённых рецептов (в секундах)
+SIMILAR_RECIPES_SYNC_OVERLAP = 60
+
+# Персональная лента: длина ленты, порог подписчиков, выше которого
+# рецепты автора подмешиваются при чтении, окно в днях для них,
+# количество похожих рецептов на одно добавление в избранное
+FEED_LENGTH = 500
+FEED_FANOUT_LIMIT = 10000
+FEED_POPULAR_WINDOW_DAYS = 30
+FEED_SIMILAR_PER_FAVORITE = 3
+
+# Изображения рецептов: максимальный размер загрузки в байтах,
+# максимальная сторона сохраняемого оригинала, ширины вариантов
+# для srcset и количество потоков обработки (0 - обработка
+# в потоке запроса, для тестов)
+IMAGE_MAX_UPLOAD_SIZE = 10 * 1024 * 1024
+IMAGE_MAX_SIDE = 2048
+IMAGE_RENDITION_WIDTHS = (320, 640, 1280)
+IMAGE_WORKERS = 2
+
+# Рейтинг популярности рецептов (команда refresh_trending):
+# окно в днях, период полураспада вклада дня и веса добавлений
+TRENDING_WINDOW_DAYS = 14
+TRENDING_HALF_LIFE_DAYS = 3
+TRENDING_FAVORITE_WEIGHT = 1.0
+TRENDING_SHOPPING_CART_WEIGHT = 0.5
+
+# Периодические задачи (команда run_periodic, сервис scheduler
+# в docker-compose.yml): команда с аргументами и интервал в секундах
+PERIODIC_TASKS = (
+    ('refresh_trending', 10 * 60),
+    ('refresh_similar', 24 * 60 * 60),
+    ('refresh_similar --changed', 10 * 60),
+    ('process_images --older-than 60', 5 * 60),
+    ('trim_feeds', 60 * 60),
+)
+
+# Замеры запросов к API: доля замеряемых запросов (0 - выключено),
+# порог медленного запроса к базе в миллисекундах для лога с EXPLAIN
+# и добавление заголовка Server-Timing к замеренным ответам
+PERFORMANCE_SAMPLE_RATE = float(os.getenv('PERFORMANCE_SAMPLE_RATE', 0.05))
+PERFORMANCE_SLOW_QUERY_MS = float(os.getenv('PERFORMANCE_SLOW_QUERY_MS', 100))
+PERFORMANCE_SERVER_TIMING = True
+
+# Метрики Prometheus (/metrics): токен для заголовка
+# Authorization: Bearer; без токена метрики отдаются только
+# запросам из частных сетей (сборщик в сети docker)
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+
+# Профилирование запросов сотрудников по заголовку X-Profile
+# (команда profile_token): срок действия подписи в секундах,
+# строк в разделах отчёта и сколько последних отчётов хранить
+PROFILING_TOKEN_MAX_AGE = int(os.getenv('PROFILING_TOKEN_MAX_AGE', 3600))
+PROFILING_REPORT_LINES = 40
+PROFILING_MAX_REPORTS = 200
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'performance': {
+            'handlers': ['console'],
+            'level': os.getenv('PERFORMANCE_LOG_LEVEL', 'INFO'),
+            'propagate': False,
+        },
+    },
+}
+
+# TTF-шрифт с кириллицей для выгрузки списка продуктов в PDF
+SHOPPING_LIST_PDF_FONT = os.getenv(
+    'SHOPPING_LIST_PDF_FONT',
+    '/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf',
+)
+
 
 ROOT_URLCONF = "foodgram.urls"
 
@@ -200,3 +323,22 @@ REST_FRAMEWORK = {
 }
 
 PAGE_SIZE = 6
+
+# manage.py test: SQLite и кэш в памяти процесса, изображения
+# обрабатываются в потоке запроса, выборочные замеры выключены.
+# Тесты не требуют внешних сервисов, а количество запросов
+# к базе в них не зависит от случая.
+if sys.argv[1:2] == ['test']:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': ':memory:',
+        }
+    }
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+    IMAGE_WORKERS = 0
+    PERFORMANCE_SAMPLE_RATE = 0
@@ -4,12 +4,15 @@ from django.conf.urls.static import static
 from django.contrib import admin
 from django.urls import include, path
 
+from core.metrics.metrics import metrics
+
 app_name = 'foodgram'
 
 urlpatterns = [
     path('api/', include('users.urls')),
     path('api/', include('api.urls')),
     path('admin/', admin.site.urls),
+    path('metrics', metrics),
 ]
 
 if settings.DEBUG:
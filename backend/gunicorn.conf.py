@@ -0,0 +1,24 @@
+"""Настройки gunicorn."""
+import os
+import shutil
+
+from prometheus_client import multiprocess
+
+bind = '0.0.0.0:8030'
+workers = int(os.getenv('GUNICORN_WORKERS', 3))
+
+
+def on_starting(server):
+    """Удаляет файлы метрик процессов прошлого запуска."""
+
+    directory = os.getenv('PROMETHEUS_MULTIPROC_DIR')
+    if directory:
+        shutil.rmtree(directory, ignore_errors=True)
+        os.makedirs(directory)
+
+
+def child_exit(server, worker):
+    """Сообщает клиенту Prometheus о завершении процесса."""
+
+    if os.getenv('PROMETHEUS_MULTIPROC_DIR'):
+        multiprocess.mark_process_dead(worker.pid)
@@ -5,15 +5,22 @@
 -Теги
 -Избранные рецепты
 -Список продуктов
+-Суммы ингредиентов в списках продуктов
+-Похожие рецепты
+-Записи персональных лент
 """
 from django.contrib import admin
 
+from api.filters.search import get_recipe_search
 from recipes.models import (
     FavoriteRecipeUser,
+    FeedEntry,
     Ingredient,
     IngredientRecipe,
     Recipe,
+    ShoppingCartIngredient,
     ShoppingCartUser,
+    SimilarRecipe,
     TagRecipe,
 )
 
@@ -37,11 +44,25 @@ class RecipeAdmin(admin.ModelAdmin):
         'author',
         'cooking_time',
         'pub_date',
-        'get_favorite_count',
+        'favorites_count',
+        'shopping_cart_count',
+    )
+    readonly_fields = (
+        'favorites_count',
+        'shopping_cart_count',
+        'trending_score',
+        'image_renditions',
     )
     search_fields = ('name',)
     list_filter = ('name', 'author', 'tags')
 
+    def get_search_results(self, request, queryset, search_term):
+        """Поиск по полнотекстовому индексу рецептов."""
+
+        if not search_term.strip():
+            return queryset, False
+        return get_recipe_search().search(queryset, search_term), False
+
 
 @admin.register(TagRecipe)
 class TagRecipeAdmin(admin.ModelAdmin):
@@ -76,3 +97,31 @@ class ShoppingCartUserAdmin(admin.ModelAdmin):
     list_display = ('user', 'recipe')
     search_fields = ('user__username', 'recipe__name')
     list_filter = ('user',)
+
+
+@admin.register(ShoppingCartIngredient)
+class ShoppingCartIngredientAdmin(admin.ModelAdmin):
+    """Регистрация сумм ингредиентов в списках продуктов в админке."""
+
+    list_display = ('user', 'ingredient', 'amount')
+    search_fields = ('user__username', 'ingredient__name')
+    list_filter = ('user',)
+
+
+@admin.register(SimilarRecipe)
+class SimilarRecipeAdmin(admin.ModelAdmin):
+    """Регистрация похожих рецептов в админке."""
+
+    list_display = ('recipe', 'similar', 'score')
+    search_fields = ('recipe__name',)
+    raw_id_fields = ('recipe', 'similar')
+
+
+@admin.register(FeedEntry)
+class FeedEntryAdmin(admin.ModelAdmin):
+    """Регистрация записей персональных лент в админке."""
+
+    list_display = ('user', 'recipe', 'created', 'reason')
+    search_fields = ('user__username', 'recipe__name')
+    list_filter = ('reason',)
+    raw_id_fields = ('user', 'recipe')
@@ -0,0 +1,119 @@
+"""Команда для удаления неиспользуемых медиафайлов."""
+from collections import Counter
+from datetime import timedelta
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from core.models import StoredFile
+from recipes.models import Recipe, rendition_names
+
+
+class Command(BaseCommand):
+    """
+    Пересчитывает ссылки на файлы хранилища по изображениям рецептов
+    и удаляет файлы, на которые никто не ссылается: освобождённые,
+    но не удалённые из-за сбоя, оставшиеся после отката транзакций
+    и замены изображения через админку, а также старые файлы
+    без учёта. Файлы моложе --min-age не трогаются, чтобы не задеть
+    загрузки, транзакции которых ещё не зафиксированы.
+    """
+
+    help = 'Удаление неиспользуемых медиафайлов.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--min-age',
+            type=int,
+            default=24 * 60 * 60,
+            help='Минимальный возраст удаляемого файла в секундах.',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Только показать, что будет удалено.',
+        )
+
+    def references(self):
+        """Считает ссылки рецептов на каждый файл."""
+
+        references = Counter()
+        for image, renditions in Recipe.objects.values_list(
+                'image',
+                'image_renditions',
+        ).iterator():
+            if image:
+                references[image] += 1
+            references.update(rendition_names(renditions))
+        return references
+
+    def walk(self, directory):
+        """Перечисляет файлы каталога хранилища рекурсивно."""
+
+        if not default_storage.exists(directory):
+            return
+        directories, files = default_storage.listdir(directory)
+        for name in files:
+            yield f'{directory}/{name}'
+        for name in directories:
+            yield from self.walk(f'{directory}/{name}')
+
+    def handle(self, *args, **options):
+        dry_run = options['dry_run']
+        before = timezone.now() - timedelta(seconds=options['min_age'])
+
+        # Учёт читается до подсчёта ссылок: счётчик меняется, только
+        # если за это время его никто не изменил.
+        stored = dict(StoredFile.objects.values_list('name', 'references'))
+        references = self.references()
+
+        recounted = 0
+        unused = []
+        for name, count in stored.items():
+            actual = references.get(name, 0)
+            if count != actual and not dry_run:
+                recounted += StoredFile.objects.filter(
+                    name=name,
+                    references=count,
+                ).update(references=actual)
+            if not actual:
+                unused.append(name)
+
+        removed = size = 0
+        for name in unused:
+            if dry_run:
+                self.stdout.write(name)
+                removed += 1
+                continue
+            file_size = default_storage.size(name) if (
+                default_storage.exists(name)
+            ) else 0
+            if default_storage.collect(name):
+                removed += 1
+                size += file_size
+
+        directories = {
+            Recipe._meta.get_field('image').upload_to,
+            Recipe.RENDITIONS_DIRECTORY,
+        }
+        for directory in sorted(directories):
+            for name in self.walk(directory):
+                if name in references or name in stored:
+                    continue
+                if default_storage.get_modified_time(name) > before:
+                    continue
+                removed += 1
+                if dry_run:
+                    self.stdout.write(name)
+                    continue
+                size += default_storage.size(name)
+                default_storage.remove(name)
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Исправлено счётчиков: {recounted}, '
+                f'удалено файлов: {removed} '
+                f'({size / 1024 / 1024:.1f} МБ).'
+            )
+        )
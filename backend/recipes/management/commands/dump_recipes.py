@@ -0,0 +1,155 @@
+"""Команда для выгрузки рецептов и пользователей."""
+import os
+
+from django.contrib.auth import get_user_model
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+
+from core.transfer.transfer import RecordWriter, batched, open_stream
+from recipes.models import (
+    FavoriteRecipeUser,
+    Ingredient,
+    IngredientRecipe,
+    Recipe,
+    ShoppingCartUser,
+    TagRecipe,
+)
+from users.models import Follow
+
+User = get_user_model()
+
+# Пароли и права администраторов не выгружаются.
+USER_FIELDS = (
+    'id',
+    'username',
+    'email',
+    'first_name',
+    'last_name',
+    'is_active',
+    'date_joined',
+    'last_login',
+)
+
+
+class Command(BaseCommand):
+    """
+    Выгружает теги, ингредиенты, пользователей, подписки, рецепты
+    с составом, избранное и списки покупок в каталог:
+    data.ndjson (по записи на строку, в порядке зависимостей)
+    и media/ с изображениями рецептов. Хэши паролей и признаки
+    is_staff и is_superuser не выгружаются. Таблицы читаются
+    итераторами пачками, поэтому память не зависит от объёма.
+    Загрузка - командой load_recipes.
+    """
+
+    help = 'Выгрузка рецептов и пользователей в NDJSON.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Каталог выгрузки.')
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=5000,
+            help='Количество строк, читаемых из базы за раз.',
+        )
+        parser.add_argument(
+            '--gzip',
+            action='store_true',
+            help='Сжать файл записей (data.ndjson.gz).',
+        )
+        parser.add_argument(
+            '--no-media',
+            action='store_true',
+            help='Не копировать изображения рецептов.',
+        )
+
+    def handle(self, *args, **options):
+        path = options['path']
+        self.batch_size = options['batch_size']
+        self.media = None if options['no_media'] else os.path.join(
+            path,
+            'media',
+        )
+        os.makedirs(path, exist_ok=True)
+        name = 'data.ndjson.gz' if options['gzip'] else 'data.ndjson'
+
+        with open_stream(os.path.join(path, name), 'w') as stream:
+            writer = RecordWriter(stream)
+            writer.write_many('tag', self.rows(
+                TagRecipe.objects.all(),
+                'id', 'name', 'color', 'slug',
+            ))
+            writer.write_many('ingredient', self.rows(
+                Ingredient.objects.all(),
+                'id', 'name', 'measurement_unit',
+            ))
+            writer.write_many('user', self.rows(
+                User.objects.all(),
+                *USER_FIELDS,
+            ))
+            writer.write_many('follow', self.rows(
+                Follow.objects.all(),
+                'follower_id', 'following_id',
+            ))
+            writer.write_many('recipe', self.recipes())
+            writer.write_many('recipe_ingredient', self.rows(
+                IngredientRecipe.objects.filter(
+                    recipe__isnull=False,
+                    ingredient__isnull=False,
+                ),
+                'recipe_id', 'ingredient_id', 'amount',
+            ))
+            writer.write_many('favorite', self.rows(
+                FavoriteRecipeUser.objects.all(),
+                'user_id', 'recipe_id', 'added_at',
+            ))
+            writer.write_many('shopping_cart', self.rows(
+                ShoppingCartUser.objects.all(),
+                'user_id', 'recipe_id', 'added_at',
+            ))
+
+        for kind, count in writer.counts.items():
+            self.stdout.write(f'{kind}: {count}')
+        self.stdout.write(self.style.SUCCESS(f'Выгружено в {path}.'))
+
+    def rows(self, queryset, *fields):
+        """Читает строки таблицы по первичному ключу пачками."""
+
+        return queryset.order_by('pk').values(*fields).iterator(
+            chunk_size=self.batch_size,
+        )
+
+    def recipes(self):
+        """
+        Рецепты со слагами тегов. Изображения копируются в каталог
+        выгрузки под своими именами; одинаковые файлы хранилища
+        с адресацией по содержимому копируются один раз.
+        """
+
+        through = Recipe.tags.through
+        for batch in batched(self.rows(
+                Recipe.objects.all(),
+                'id', 'author_id', 'name', 'text', 'cooking_time',
+                'image', 'pub_date',
+        ), self.batch_size):
+            tags = {}
+            for recipe_id, slug in through.objects.filter(
+                    recipe_id__in=[recipe['id'] for recipe in batch],
+            ).values_list('recipe_id', 'tagrecipe__slug'):
+                tags.setdefault(recipe_id, []).append(slug)
+            for recipe in batch:
+                recipe['tags'] = tags.get(recipe['id'], [])
+                if self.media and recipe['image']:
+                    self.copy_image(recipe['image'])
+                yield recipe
+
+    def copy_image(self, name):
+        """Копирует изображение в каталог выгрузки."""
+
+        target = os.path.join(self.media, name)
+        if os.path.exists(target) or not default_storage.exists(name):
+            return
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        with default_storage.open(name) as source, open(target, 'wb') as file:
+            for chunk in source.chunks():
+                file.write(chunk)
@@ -0,0 +1,349 @@
+"""Команда для загрузки каталога ингредиентов."""
+import csv
+import io
+import itertools
+import json
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from core.cache.cache import ingredients_cache
+from recipes.models import Ingredient
+
+NAME_LENGTH = Ingredient._meta.get_field('name').max_length
+UNIT_LENGTH = Ingredient._meta.get_field('measurement_unit').max_length
+
+
+class RowsReader(io.TextIOBase):
+    """
+    Файлоподобный объект, отдающий строки ингредиентов в формате CSV.
+    Нужен для потоковой передачи данных в COPY без записи на диск.
+    """
+
+    def __init__(self, rows, on_row=None):
+        self.rows = iter(rows)
+        self.on_row = on_row
+        self.buffer = ''
+        self.output = io.StringIO()
+        self.writer = csv.writer(self.output)
+
+    def readable(self):
+        return True
+
+    def read(self, size=-1):
+        while size < 0 or len(self.buffer) < size:
+            row = next(self.rows, None)
+            if row is None:
+                break
+            self.writer.writerow(row)
+            self.buffer += self.output.getvalue()
+            self.output.seek(0)
+            self.output.truncate()
+            if self.on_row:
+                self.on_row()
+
+        if size < 0:
+            size = len(self.buffer)
+        chunk, self.buffer = self.buffer[:size], self.buffer[size:]
+        return chunk
+
+
+class Command(BaseCommand):
+    """
+    Загружает ингредиенты из CSV или JSON.
+    На PostgreSQL данные передаются через COPY во временную таблицу,
+    на остальных базах - пакетными вставками. С --update-units
+    единица измерения существующего ингредиента обновляется, если
+    его название однозначно: встречается в каталоге один раз и в файле
+    только с одной единицей. Остальные строки загружаются как с --dedupe.
+    """
+
+    help = 'Загрузка каталога ингредиентов из CSV или JSON.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path',
+            nargs='?',
+            default=str(Path(settings.BASE_DIR) / 'data' / 'ingredients.csv'),
+            help='Путь к файлу с ингредиентами.',
+        )
+        parser.add_argument(
+            '--format',
+            choices=('csv', 'json'),
+            help='Формат файла. По умолчанию определяется по расширению.',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=5000,
+            help='Размер пакета для вставки и отчёта о прогрессе.',
+        )
+        parser.add_argument(
+            '--dedupe',
+            action='store_true',
+            help=(
+                'Пропускать ингредиенты, которые уже есть в каталоге '
+                'или повторяются в файле (по названию и единице измерения).'
+            ),
+        )
+        parser.add_argument(
+            '--update-units',
+            action='store_true',
+            help=(
+                'Обновлять единицу измерения ингредиентов с однозначным '
+                'названием; включает --dedupe.'
+            ),
+        )
+        parser.add_argument(
+            '--no-copy',
+            action='store_true',
+            help='Не использовать COPY даже на PostgreSQL.',
+        )
+
+    def handle(self, *args, **options):
+        path = Path(options['path'])
+        if not path.exists():
+            raise CommandError(f'Файл не найден: {path}')
+
+        file_format = options['format'] or path.suffix.lstrip('.').lower()
+        if file_format in ('jsonl', 'ndjson'):
+            file_format = 'json'
+        if file_format not in ('csv', 'json'):
+            raise CommandError(f'Неизвестный формат файла: {path.suffix}')
+
+        self.batch_size = options['batch_size']
+        self.started = time.perf_counter()
+        self.read = 0
+        self.skipped = 0
+        self.updated = 0
+        dedupe = options['dedupe'] or options['update_units']
+        self.next_report = self.batch_size
+
+        with path.open(encoding='utf-8') as file:
+            rows = self.clean_rows(
+                self.read_csv(file) if file_format == 'csv'
+                else self.read_json(file)
+            )
+            use_copy = (
+                connection.vendor == 'postgresql' and not options['no_copy']
+            )
+            with transaction.atomic():
+                if use_copy:
+                    created = self.load_with_copy(
+                        rows,
+                        dedupe,
+                        options['update_units'],
+                    )
+                else:
+                    created = self.load_with_inserts(
+                        rows,
+                        dedupe,
+                        options['update_units'],
+                    )
+
+        if created or self.updated:
+            ingredients_cache.invalidate()
+
+        elapsed = time.perf_counter() - self.started
+        self.stdout.write(self.style.SUCCESS(
+            f'Прочитано: {self.read}, добавлено: {created}, '
+            f'обновлено: {self.updated}, '
+            f'пропущено: {self.skipped}, время: {elapsed:.2f} с '
+            f'({self.read / max(elapsed, 1e-9):.0f} строк/с)'
+        ))
+
+    def read_csv(self, file):
+        """Читает строки CSV без заголовка или с заголовком."""
+
+        for row in csv.reader(file):
+            if row[:2] == ['name', 'measurement_unit']:
+                continue
+            yield row[:2]
+
+    def read_json(self, file):
+        """
+        Читает JSON-массив объектов или JSON Lines.
+        JSON Lines читается построчно, массив загружается целиком.
+        """
+
+        first = file.read(1)
+        while first.isspace():
+            first = file.read(1)
+
+        if first == '[':
+            items = json.loads(first + file.read())
+        else:
+            items = (
+                json.loads(line)
+                for line in itertools.chain([first + file.readline()], file)
+                if line.strip()
+            )
+
+        for item in items:
+            if isinstance(item, dict):
+                yield item.get('name'), item.get('measurement_unit')
+            else:
+                yield ()
+
+    def clean_rows(self, rows):
+        """
+        Нормализует строки и пропускает некорректные: неполные,
+        пустые, слишком длинные и с нестроковыми значениями из JSON.
+        """
+
+        for row in rows:
+            self.read += 1
+            if len(row) < 2 or not all(
+                    isinstance(value, str) and value.strip()
+                    for value in row[:2]
+            ):
+                self.skipped += 1
+                continue
+            name, measurement_unit = row[0].strip(), row[1].strip()
+            if len(name) > NAME_LENGTH or len(measurement_unit) > UNIT_LENGTH:
+                self.skipped += 1
+                continue
+            yield name, measurement_unit
+
+    def report(self):
+        """Выводит прогресс загрузки после каждого пакета."""
+
+        if self.read < self.next_report:
+            return
+        self.next_report = self.read + self.batch_size
+        elapsed = time.perf_counter() - self.started
+        self.stdout.write(
+            f'Обработано строк: {self.read} '
+            f'({self.read / max(elapsed, 1e-9):.0f} строк/с)'
+        )
+
+    def load_with_inserts(self, rows, dedupe, update_units):
+        """
+        Загружает ингредиенты пакетными вставками. С --update-units
+        все строки с однозначным в каталоге названием откладываются
+        до конца файла: единица обновляется, только если у названия
+        в файле одна единица, как и при загрузке через COPY.
+        """
+
+        existing = set()
+        if dedupe:
+            existing = set(
+                Ingredient.objects.values_list('name', 'measurement_unit')
+            )
+        single = {}
+        if update_units:
+            catalogue = {}
+            for row in Ingredient.objects.values_list(
+                    'pk',
+                    'name',
+                    'measurement_unit',
+            ):
+                catalogue.setdefault(row[1], []).append(row)
+            single = {
+                name: rows[0] for name, rows in catalogue.items()
+                if len(rows) == 1
+            }
+        pending = {}
+
+        created = 0
+        batch = []
+
+        def add(name, measurement_unit):
+            nonlocal created, batch
+            if dedupe:
+                if (name, measurement_unit) in existing:
+                    self.skipped += 1
+                    return
+                existing.add((name, measurement_unit))
+            batch.append(
+                Ingredient(name=name, measurement_unit=measurement_unit)
+            )
+            if len(batch) >= self.batch_size:
+                Ingredient.objects.bulk_create(batch)
+                created += len(batch)
+                batch = []
+                self.report()
+
+        for name, measurement_unit in rows:
+            if name in single:
+                pending.setdefault(name, []).append(measurement_unit)
+            else:
+                add(name, measurement_unit)
+
+        changed = []
+        for name, units in pending.items():
+            pk, _, current_unit = single[name]
+            if len(set(units)) == 1 and units[0] != current_unit:
+                changed.append(
+                    Ingredient(pk=pk, measurement_unit=units[0])
+                )
+                self.skipped += len(units) - 1
+            else:
+                for measurement_unit in units:
+                    add(name, measurement_unit)
+        Ingredient.objects.bulk_update(
+            changed,
+            ('measurement_unit',),
+            batch_size=self.batch_size,
+        )
+        self.updated = len(changed)
+
+        Ingredient.objects.bulk_create(batch)
+        return created + len(batch)
+
+    def load_with_copy(self, rows, dedupe, update_units):
+        """
+        Загружает ингредиенты через COPY во временную таблицу
+        и переносит их в каталог одним запросом, перед этим
+        обновляя единицы измерения с --update-units.
+        """
+
+        table = connection.ops.quote_name(Ingredient._meta.db_table)
+        reader = RowsReader(rows, on_row=self.report)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'CREATE TEMPORARY TABLE ingredient_import '
+                f'(name varchar({NAME_LENGTH}), '
+                f'measurement_unit varchar({UNIT_LENGTH})) '
+                'ON COMMIT DROP'
+            )
+            cursor.cursor.copy_expert(
+                'COPY ingredient_import (name, measurement_unit) '
+                'FROM STDIN WITH (FORMAT csv)',
+                reader,
+            )
+            if update_units:
+                cursor.execute(
+                    f'UPDATE {table} r '
+                    'SET measurement_unit = i.measurement_unit '
+                    'FROM (SELECT name, MIN(measurement_unit) '
+                    'AS measurement_unit FROM ingredient_import '
+                    'GROUP BY name '
+                    'HAVING COUNT(DISTINCT measurement_unit) = 1) i '
+                    'WHERE r.name = i.name '
+                    'AND r.measurement_unit <> i.measurement_unit '
+                    f'AND NOT EXISTS (SELECT 1 FROM {table} x '
+                    'WHERE x.name = r.name AND x.id <> r.id)'
+                )
+                self.updated = cursor.rowcount
+            if dedupe:
+                cursor.execute(
+                    f'INSERT INTO {table} (name, measurement_unit) '
+                    'SELECT DISTINCT i.name, i.measurement_unit '
+                    'FROM ingredient_import i '
+                    f'WHERE NOT EXISTS (SELECT 1 FROM {table} r '
+                    'WHERE r.name = i.name '
+                    'AND r.measurement_unit = i.measurement_unit)'
+                )
+            else:
+                cursor.execute(
+                    f'INSERT INTO {table} (name, measurement_unit) '
+                    'SELECT name, measurement_unit FROM ingredient_import'
+                )
+            created = cursor.rowcount
+
+        self.skipped += self.read - self.skipped - created - self.updated
+        return created
@@ -0,0 +1,381 @@
+"""Команда для загрузки рецептов и пользователей."""
+import itertools
+import os
+from operator import itemgetter
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Q
+
+from core.cache.cache import ingredients_cache, tags_cache
+from core.transfer.transfer import (
+    batched,
+    insert_rows,
+    open_stream,
+    read_records,
+)
+from recipes.management.commands.dump_recipes import USER_FIELDS
+from recipes.models import (
+    FavoriteRecipeUser,
+    Ingredient,
+    IngredientRecipe,
+    Recipe,
+    ShoppingCartUser,
+    TagRecipe,
+)
+from users.models import Follow
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    """
+    Загружает выгрузку команды dump_recipes.
+    Записи читаются из файла по одной и вставляются пачками
+    через bulk_create, каждая пачка - в своей транзакции, поэтому
+    память и размер транзакции не зависят от объёма выгрузки.
+    Ключи пересчитываются на новые: теги сопоставляются по слагу
+    или названию, ингредиенты - по названию и единице измерения,
+    пользователи - по username, рецепты - по автору, названию
+    и дате публикации. Уже загруженные записи не создаются повторно,
+    поэтому загрузку можно запускать снова. Новые пользователи
+    создаются без пароля (вход - после сброса пароля) и без прав
+    администратора. В памяти держатся только соответствия
+    старых и новых id.
+    Изображения сохраняются через хранилище, одинаковые файлы
+    не дублируются. После загрузки пересчитываются счётчики,
+    суммы списков продуктов и поисковый индекс.
+    """
+
+    help = 'Загрузка рецептов и пользователей из NDJSON.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Каталог выгрузки.')
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=5000,
+            help='Количество записей в одной вставке.',
+        )
+
+    def handle(self, *args, **options):
+        path = options['path']
+        for name in ('data.ndjson', 'data.ndjson.gz'):
+            if os.path.exists(os.path.join(path, name)):
+                break
+        else:
+            raise CommandError(f'В {path} нет файла data.ndjson[.gz]')
+        if not connection.features.can_return_rows_from_bulk_insert:
+            raise CommandError(
+                'База данных не возвращает id при пакетной вставке'
+            )
+
+        self.media = os.path.join(path, 'media')
+        self.tags = {}
+        self.ingredients = {}
+        self.users = {}
+        self.recipes = {}
+        self.created_recipes = set()
+        loaders = {
+            'tag': self.load_tags,
+            'ingredient': self.load_ingredients,
+            'user': self.load_users,
+            'follow': self.load_follows,
+            'recipe': self.load_recipes,
+            'recipe_ingredient': self.load_recipe_ingredients,
+            'favorite': self.load_favorites,
+            'shopping_cart': self.load_shopping_carts,
+        }
+
+        counts = {}
+        with open_stream(os.path.join(path, name)) as stream:
+            for kind, records in itertools.groupby(
+                    read_records(stream),
+                    key=itemgetter('type'),
+            ):
+                if kind not in loaders:
+                    raise CommandError(f'Неизвестный тип записи: {kind}')
+                for batch in batched(records, options['batch_size']):
+                    with transaction.atomic():
+                        created = loaders[kind](batch)
+                    counts[kind] = counts.get(kind, 0) + created
+        for kind, count in counts.items():
+            self.stdout.write(f'{kind}: {count}')
+
+        for cache in (tags_cache, ingredients_cache):
+            cache.invalidate()
+        call_command('reconcile_counters', stdout=self.stdout)
+        call_command('shopping_cart_totals', rebuild=True, stdout=self.stdout)
+        call_command('rebuild_search_index', stdout=self.stdout)
+        self.stdout.write(self.style.SUCCESS(
+            'Загрузка завершена. Варианты изображений, похожие рецепты '
+            'и рейтинг строятся командами process_images, '
+            'refresh_similar и refresh_trending.'
+        ))
+
+    def load_tags(self, batch):
+        """Сопоставляет теги по слагу или названию, создаёт новые."""
+
+        existing = {}
+        for tag_id, slug, name in TagRecipe.objects.filter(
+                Q(slug__in=[tag['slug'] for tag in batch])
+                | Q(name__in=[tag['name'] for tag in batch]),
+        ).values_list('id', 'slug', 'name'):
+            existing[slug] = existing[name] = tag_id
+        new = [
+            tag for tag in batch
+            if tag['slug'] not in existing and tag['name'] not in existing
+        ]
+        TagRecipe.objects.bulk_create(
+            (
+                TagRecipe(
+                    name=tag['name'],
+                    color=tag['color'],
+                    slug=tag['slug'],
+                )
+                for tag in new
+            ),
+            ignore_conflicts=True,
+        )
+        existing.update(TagRecipe.objects.filter(
+            slug__in=[tag['slug'] for tag in new],
+        ).values_list('slug', 'id'))
+        for tag in batch:
+            tag_id = existing.get(tag['slug'], existing.get(tag['name']))
+            if tag_id is not None:
+                self.tags[tag['slug']] = tag_id
+        return len(new)
+
+    def load_ingredients(self, batch):
+        """Сопоставляет ингредиенты по названию и единице измерения."""
+
+        existing = {
+            (name, unit): ingredient_id
+            for ingredient_id, name, unit in Ingredient.objects.filter(
+                name__in=[ingredient['name'] for ingredient in batch],
+            ).values_list('id', 'name', 'measurement_unit')
+        }
+        new = []
+        for ingredient in batch:
+            key = (ingredient['name'], ingredient['measurement_unit'])
+            if key in existing:
+                self.ingredients[ingredient['id']] = existing[key]
+            else:
+                new.append(ingredient)
+        created = Ingredient.objects.bulk_create(
+            Ingredient(
+                name=ingredient['name'],
+                measurement_unit=ingredient['measurement_unit'],
+            )
+            for ingredient in new
+        )
+        for ingredient, obj in zip(new, created):
+            self.ingredients[ingredient['id']] = obj.id
+        return len(created)
+
+    def load_users(self, batch):
+        """
+        Сопоставляет пользователей по username, создаёт новых
+        с непригодным для входа паролем.
+        """
+
+        existing = dict(User.objects.filter(
+            username__in=[user['username'] for user in batch],
+        ).values_list('username', 'id'))
+        new = []
+        for user in batch:
+            if user['username'] in existing:
+                self.users[user['id']] = existing[user['username']]
+            else:
+                new.append(user)
+        created = User.objects.bulk_create(
+            User(
+                **{field: user[field] for field in USER_FIELDS[1:]},
+                password=make_password(None),
+            )
+            for user in new
+        )
+        for user, obj in zip(new, created):
+            self.users[user['id']] = obj.id
+        return len(created)
+
+    def load_follows(self, batch):
+        return insert_rows(
+            Follow,
+            ('follower', 'following'),
+            (
+                (
+                    self.users[follow['follower_id']],
+                    self.users[follow['following_id']],
+                )
+                for follow in batch
+                if follow['follower_id'] in self.users
+                and follow['following_id'] in self.users
+            ),
+            ignore_conflicts=True,
+        )
+
+    def load_recipes(self, batch):
+        """
+        Сопоставляет рецепты по автору, названию и дате публикации
+        (с точностью до миллисекунд, как в выгрузке), создаёт новые
+        с тегами. Дата публикации восстанавливается отдельным
+        обновлением: bulk_create заполняет её текущим временем.
+        """
+
+        pub_date = Recipe._meta.get_field('pub_date')
+
+        def key(author_id, name, published):
+            return (
+                author_id,
+                name,
+                published.replace(
+                    microsecond=published.microsecond // 1000 * 1000,
+                ),
+            )
+
+        batch = [
+            recipe for recipe in batch
+            if recipe['author_id'] in self.users
+        ]
+        existing = {
+            key(author_id, name, published): recipe_id
+            for recipe_id, author_id, name, published in (
+                Recipe.objects.filter(
+                    author_id__in={
+                        self.users[recipe['author_id']] for recipe in batch
+                    },
+                    name__in={recipe['name'] for recipe in batch},
+                ).values_list('id', 'author_id', 'name', 'pub_date')
+            )
+        }
+        new = []
+        for recipe in batch:
+            recipe_id = existing.get(key(
+                self.users[recipe['author_id']],
+                recipe['name'],
+                pub_date.to_python(recipe['pub_date']),
+            ))
+            if recipe_id is None:
+                new.append(recipe)
+            else:
+                self.recipes[recipe['id']] = recipe_id
+        batch = new
+
+        created = Recipe.objects.bulk_create(
+            Recipe(
+                author_id=self.users[recipe['author_id']],
+                name=recipe['name'],
+                text=recipe['text'],
+                cooking_time=recipe['cooking_time'],
+                image=self.save_image(recipe['image']),
+            )
+            for recipe in batch
+        )
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f'UPDATE {Recipe._meta.db_table} '
+                'SET pub_date = %s WHERE id = %s',
+                [
+                    (
+                        pub_date.get_db_prep_save(
+                            recipe['pub_date'],
+                            connection,
+                        ),
+                        obj.id,
+                    )
+                    for recipe, obj in zip(batch, created)
+                ],
+            )
+        for recipe, obj in zip(batch, created):
+            self.recipes[recipe['id']] = obj.id
+            self.created_recipes.add(obj.id)
+
+        insert_rows(
+            Recipe.tags.through,
+            ('recipe', 'tagrecipe'),
+            (
+                (obj.id, self.tags[slug])
+                for recipe, obj in zip(batch, created)
+                for slug in recipe['tags']
+                if slug in self.tags
+            ),
+        )
+        return len(created)
+
+    def save_image(self, name):
+        """
+        Сохраняет изображение из каталога выгрузки в хранилище.
+        Если файла в выгрузке нет, но он есть в хранилище
+        (загрузка в ту же среду), на него добавляется ссылка.
+        """
+
+        if not name:
+            return ''
+        source = os.path.join(self.media, name)
+        upload_to = Recipe.image.field.upload_to
+        target = f'{upload_to}/{os.path.basename(name)}'
+        if os.path.exists(source):
+            with open(source, 'rb') as file:
+                return default_storage.save(target, File(file))
+        if default_storage.exists(name):
+            with default_storage.open(name) as file:
+                return default_storage.save(target, file)
+        return ''
+
+    def load_recipe_ingredients(self, batch):
+        """Загружает состав только для созданных рецептов."""
+
+        return insert_rows(
+            IngredientRecipe,
+            ('recipe', 'ingredient', 'amount'),
+            (
+                (
+                    self.recipes[row['recipe_id']],
+                    self.ingredients[row['ingredient_id']],
+                    row['amount'],
+                )
+                for row in batch
+                if self.recipes.get(row['recipe_id']) in self.created_recipes
+                and row['ingredient_id'] in self.ingredients
+            ),
+        )
+
+    def load_user_recipe_list(self, model, batch):
+        """
+        Загружает избранное или список покупок, пропуская пары
+        (пользователь, рецепт), которые уже есть: у списка покупок
+        нет ограничения уникальности, на которое можно положиться.
+        """
+
+        rows = {}
+        for row in batch:
+            user_id = self.users.get(row['user_id'])
+            recipe_id = self.recipes.get(row['recipe_id'])
+            if user_id is not None and recipe_id is not None:
+                rows.setdefault((user_id, recipe_id), row['added_at'])
+        existing = set(model.objects.filter(
+            user_id__in={user_id for user_id, _ in rows},
+            recipe_id__in={recipe_id for _, recipe_id in rows},
+        ).values_list('user_id', 'recipe_id'))
+        return insert_rows(
+            model,
+            ('user', 'recipe', 'added_at'),
+            (
+                (user_id, recipe_id, added_at)
+                for (user_id, recipe_id), added_at in rows.items()
+                if (user_id, recipe_id) not in existing
+            ),
+            ignore_conflicts=True,
+        )
+
+    def load_favorites(self, batch):
+        return self.load_user_recipe_list(FavoriteRecipeUser, batch)
+
+    def load_shopping_carts(self, batch):
+        return self.load_user_recipe_list(ShoppingCartUser, batch)
@@ -0,0 +1,78 @@
+"""Команда для обработки изображений рецептов."""
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    """
+    Создаёт варианты изображений для рецептов, у которых их ещё нет,
+    например загруженных до появления обработки или при сбое пула.
+    Пока изображение не обработано, раздаётся загруженный файл
+    с метаданными (EXIF, координаты съёмки), поэтому команда
+    запускается периодически командой run_periodic (PERIODIC_TASKS)
+    и подбирает задачи, потерянные при перезапуске процесса.
+    С ключом --force заново обрабатывает все изображения,
+    например после изменения IMAGE_RENDITION_WIDTHS.
+    """
+
+    help = 'Обработка изображений рецептов.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--recipe',
+            type=int,
+            action='append',
+            dest='recipe_ids',
+            help=(
+                'Обработать только этот рецепт '
+                '(можно указать несколько раз).'
+            ),
+        )
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Обработать и уже обработанные изображения.',
+        )
+        parser.add_argument(
+            '--older-than',
+            type=int,
+            default=0,
+            help=(
+                'Пропускать рецепты, изменённые менее указанного числа '
+                'секунд назад: их изображения ещё обрабатывает пул.'
+            ),
+        )
+
+    def handle(self, *args, **options):
+        recipes = Recipe.objects.exclude(image='')
+        if options['recipe_ids']:
+            recipes = recipes.filter(id__in=options['recipe_ids'])
+        elif not options['force']:
+            recipes = recipes.filter(image_renditions={})
+        if options['older_than']:
+            recipes = recipes.filter(
+                updated_at__lt=timezone.now() - timedelta(
+                    seconds=options['older_than'],
+                ),
+            )
+
+        processed = failed = 0
+        for recipe_id in recipes.values_list('id', flat=True).iterator():
+            try:
+                if Recipe.objects.process_image(
+                        recipe_id,
+                        force=options['force'] or bool(options['recipe_ids']),
+                ):
+                    processed += 1
+            except (OSError, ValueError) as error:
+                failed += 1
+                self.stderr.write(f'Рецепт {recipe_id}: {error}')
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Обработано изображений: {processed}, ошибок: {failed}.'
+            )
+        )
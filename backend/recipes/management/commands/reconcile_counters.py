@@ -0,0 +1,105 @@
+"""Команда для сверки и исправления счётчиков."""
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+
+from recipes.models import FavoriteRecipeUser, Recipe, ShoppingCartUser
+from users.models import Follow, UserStats
+
+User = get_user_model()
+
+
+def count_of(queryset, field):
+    """Подзапрос количества строк queryset, связанных по полю field."""
+
+    return Coalesce(
+        Subquery(
+            queryset.filter(
+                **{field: OuterRef('pk')}
+            ).order_by().values(field).annotate(
+                total=Count('pk'),
+            ).values('total')
+        ),
+        0,
+    )
+
+
+class Command(BaseCommand):
+    """
+    Пересчитывает счётчики рецептов (избранное, списки продуктов)
+    и авторов (рецепты, подписчики) и исправляет расхождения.
+    """
+
+    help = 'Сверка и исправление счётчиков рецептов и авторов.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Только показать количество расхождений.',
+        )
+
+    def handle(self, *args, **options):
+        recipe_counters = {
+            'favorites_count': count_of(
+                FavoriteRecipeUser.objects.all(),
+                'recipe',
+            ),
+            'shopping_cart_count': count_of(
+                ShoppingCartUser.objects.all(),
+                'recipe',
+            ),
+        }
+        # Первичный ключ UserStats совпадает с id пользователя.
+        user_counters = {
+            'recipes_count': count_of(Recipe.objects.all(), 'author'),
+            'followers_count': count_of(Follow.objects.all(), 'following'),
+        }
+
+        missing_stats = User.objects.filter(stats__isnull=True)
+        self.report('Пользователи без счётчиков', missing_stats.count())
+        self.report(
+            'Рецепты с расхождениями',
+            self.drift(Recipe.objects.all(), recipe_counters),
+        )
+        self.report(
+            'Авторы с расхождениями',
+            self.drift(UserStats.objects.all(), user_counters),
+        )
+
+        if options['dry_run']:
+            return
+
+        with transaction.atomic():
+            UserStats.objects.bulk_create(
+                (
+                    UserStats(user_id=user_id)
+                    for user_id in missing_stats.values_list(
+                        'pk',
+                        flat=True,
+                    ).iterator()
+                ),
+                batch_size=1000,
+            )
+            Recipe.objects.update(**recipe_counters)
+            UserStats.objects.update(**user_counters)
+        self.stdout.write(self.style.SUCCESS('Счётчики пересчитаны.'))
+
+    @staticmethod
+    def drift(queryset, counters):
+        """Количество строк, у которых счётчики не совпадают с расчётом."""
+
+        condition = Q()
+        for field in counters:
+            condition |= ~Q(**{field: F(f'actual_{field}')})
+        return queryset.alias(**{
+            f'actual_{field}': expression
+            for field, expression in counters.items()
+        }).filter(condition).count()
+
+    def report(self, title, value):
+        """Выводит строку отчёта."""
+
+        self.stdout.write(f'{title}: {value}')
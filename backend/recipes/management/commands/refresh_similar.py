@@ -0,0 +1,42 @@
+"""Команда для пересчёта похожих рецептов."""
+from django.core.management.base import BaseCommand
+
+from recipes.models import SimilarRecipe
+
+
+class Command(BaseCommand):
+    """
+    Пересчитывает таблицу похожих рецептов.
+    Запускается периодически командой run_periodic (PERIODIC_TASKS):
+    с --changed часто обновляются рецепты, изменённые с прошлого
+    запуска, полный пересчёт реже учитывает изменение весов
+    ингредиентов и удалённые рецепты. Полный пересчёт нужен
+    и после массовой загрузки.
+    """
+
+    help = 'Пересчёт таблицы похожих рецептов.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--recipe',
+            type=int,
+            action='append',
+            dest='recipe_ids',
+            help='Обновить только этот рецепт (можно указать несколько раз).',
+        )
+        parser.add_argument(
+            '--changed',
+            action='store_true',
+            help='Обновить рецепты, изменённые с прошлого запуска.',
+        )
+
+    def handle(self, *args, **options):
+        if options['recipe_ids']:
+            created = SimilarRecipe.objects.refresh(options['recipe_ids'])
+        elif options['changed']:
+            created = SimilarRecipe.objects.refresh_changed()
+        else:
+            created = SimilarRecipe.objects.rebuild()
+        self.stdout.write(
+            self.style.SUCCESS(f'Сохранено пар похожих рецептов: {created}.')
+        )
@@ -0,0 +1,19 @@
+"""Команда для пересчёта рейтинга популярности рецептов."""
+from django.core.management.base import BaseCommand
+
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    """
+    Пересчитывает рейтинг популярности рецептов за последние дни.
+    Запускается периодически командой run_periodic (PERIODIC_TASKS).
+    """
+
+    help = 'Пересчёт рейтинга популярности рецептов (ordering=trending).'
+
+    def handle(self, *args, **options):
+        updated = Recipe.objects.refresh_trending()
+        self.stdout.write(
+            self.style.SUCCESS(f'Обновлено рецептов: {updated}.')
+        )
@@ -0,0 +1,62 @@
+"""Команда для запуска периодических задач."""
+import shlex
+import time
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+
+class Command(BaseCommand):
+    """
+    Запускает команды из PERIODIC_TASKS (имя команды с аргументами)
+    с их интервалами: все сразу при старте, дальше каждую
+    по истечении её интервала.
+    Ошибка одной задачи выводится и не останавливает остальные.
+    Работает в отдельном процессе (сервис scheduler), поэтому
+    перед каждой задачей закрывает устаревшие соединения с базой.
+    """
+
+    help = (
+        'Запуск периодических задач '
+        '(пересчёт рейтинга и похожих рецептов, ленты).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Выполнить все задачи один раз и завершиться.',
+        )
+
+    def handle(self, *args, **options):
+        due = {name: 0.0 for name, interval in settings.PERIODIC_TASKS}
+        while True:
+            for name, interval in settings.PERIODIC_TASKS:
+                if due[name] <= time.monotonic():
+                    self.run(name)
+                    due[name] = time.monotonic() + interval
+            if options['once']:
+                return
+            time.sleep(max(min(due.values()) - time.monotonic(), 0))
+
+    def run(self, name):
+        """Выполняет одну задачу."""
+
+        close_old_connections()
+        started = time.perf_counter()
+        try:
+            call_command(
+                *shlex.split(name),
+                stdout=self.stdout,
+                stderr=self.stderr,
+            )
+        except Exception as error:
+            self.stderr.write(f'{name}: {error!r}')
+        else:
+            self.stdout.write(
+                f'{name}: {time.perf_counter() - started:.1f} с'
+            )
+        finally:
+            close_old_connections()
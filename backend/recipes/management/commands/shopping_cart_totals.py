@@ -0,0 +1,53 @@
+"""Команда для проверки и пересборки сумм в списках продуктов."""
+from django.core.management.base import BaseCommand, CommandError
+
+from recipes.models import ShoppingCartIngredient
+
+
+class Command(BaseCommand):
+    """
+    Сравнивает сохранённые суммы ингредиентов в списках продуктов
+    с пересчитанными по рецептам и при необходимости пересобирает их.
+    """
+
+    help = 'Проверка и пересборка сумм ингредиентов в списках продуктов.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--rebuild',
+            action='store_true',
+            help='Пересобрать суммы вместо проверки.',
+        )
+        parser.add_argument(
+            '--user',
+            type=int,
+            action='append',
+            dest='user_ids',
+            help='Ограничить пользователем (можно указать несколько раз).',
+        )
+
+    def handle(self, *args, **options):
+        user_ids = options['user_ids']
+
+        if options['rebuild']:
+            ShoppingCartIngredient.objects.rebuild(user_ids)
+            self.stdout.write(self.style.SUCCESS('Суммы пересобраны.'))
+            return
+
+        drift = 0
+        for user_id, ingredient_id, expected, stored in (
+                ShoppingCartIngredient.objects.find_drift(user_ids)
+        ):
+            drift += 1
+            if options['verbosity'] > 1:
+                self.stdout.write(
+                    f'user={user_id} ingredient={ingredient_id} '
+                    f'expected={expected} stored={stored}'
+                )
+
+        if drift:
+            raise CommandError(
+                f'Найдено расхождений: {drift}. '
+                'Запустите команду с --rebuild.'
+            )
+        self.stdout.write(self.style.SUCCESS('Расхождений нет.'))
@@ -0,0 +1,30 @@
+"""Команда для ограничения длины персональных лент."""
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from recipes.models import FeedEntry
+
+
+class Command(BaseCommand):
+    """
+    Удаляет из персональных лент записи сверх FEED_LENGTH последних.
+    Запускается периодически командой run_periodic (PERIODIC_TASKS).
+    """
+
+    help = 'Ограничение длины персональных лент.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user',
+            type=int,
+            action='append',
+            dest='user_ids',
+            help='Ограничить пользователем (можно указать несколько раз).',
+        )
+
+    def handle(self, *args, **options):
+        deleted = FeedEntry.objects.trim(options['user_ids'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Удалено записей: {deleted} '
+            f'(длина ленты {settings.FEED_LENGTH}).'
+        ))
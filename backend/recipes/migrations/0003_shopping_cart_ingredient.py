@@ -0,0 +1,71 @@
+# Generated by Django 4.2.3 on 2026-10-18 13:03
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import F, Sum
+import django.db.models.deletion
+
+
+def fill_shopping_cart_ingredients(apps, schema_editor):
+    """Заполняет суммы ингредиентов по существующим спискам продуктов."""
+
+    ShoppingCartUser = apps.get_model('recipes', 'ShoppingCartUser')
+    ShoppingCartIngredient = apps.get_model(
+        'recipes',
+        'ShoppingCartIngredient',
+    )
+    prefix = 'recipe__ingredients_in_recipe__'
+    rows = ShoppingCartUser.objects.filter(
+        **{f'{prefix}ingredient__isnull': False}
+    ).values(
+        'user_id',
+        ingredient=F(f'{prefix}ingredient_id'),
+    ).annotate(total=Sum(f'{prefix}amount'))
+    ShoppingCartIngredient.objects.bulk_create(
+        (
+            ShoppingCartIngredient(
+                user_id=row['user_id'],
+                ingredient_id=row['ingredient'],
+                amount=row['total'],
+            )
+            for row in rows.iterator()
+        ),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('recipes', '0002_auto_20230724_1540'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='ingredient',
+            name='measurement_unit',
+            field=models.CharField(max_length=20, verbose_name='Единица измерения'),
+        ),
+        migrations.CreateModel(
+            name='ShoppingCartIngredient',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('amount', models.PositiveIntegerField(verbose_name='Количество')),
+                ('ingredient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='in_shopping_carts', to='recipes.ingredient', verbose_name='Ингредиент')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='shopping_cart_ingredients', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Ингредиент в списке продуктов',
+                'verbose_name_plural': 'Ингредиенты в списках продуктов',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='shoppingcartingredient',
+            constraint=models.UniqueConstraint(fields=('user', 'ingredient'), name='unique_shopping_cart_ingredient'),
+        ),
+        migrations.RunPython(
+            fill_shopping_cart_ingredients,
+            migrations.RunPython.noop,
+        ),
+    ]
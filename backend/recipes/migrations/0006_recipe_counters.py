@@ -0,0 +1,55 @@
+# Generated by Django 4.2.3 on 2026-10-18 13:11
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_by_recipe(model):
+    """Подзапрос количества записей модели для рецепта."""
+
+    return Coalesce(
+        Subquery(
+            model.objects.filter(
+                recipe=OuterRef('pk'),
+            ).order_by().values('recipe').annotate(
+                total=Count('pk'),
+            ).values('total')
+        ),
+        0,
+    )
+
+
+def fill_counters(apps, schema_editor):
+    """Заполняет счётчики существующих рецептов."""
+
+    Recipe = apps.get_model('recipes', 'Recipe')
+    Recipe.objects.update(
+        favorites_count=count_by_recipe(
+            apps.get_model('recipes', 'FavoriteRecipeUser'),
+        ),
+        shopping_cart_count=count_by_recipe(
+            apps.get_model('recipes', 'ShoppingCartUser'),
+        ),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0005_recipe_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='favorites_count',
+            field=models.PositiveIntegerField(db_index=True, default=0, verbose_name='В избранном'),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='shopping_cart_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='В списках продуктов'),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
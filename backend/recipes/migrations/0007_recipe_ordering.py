@@ -0,0 +1,61 @@
+# Generated by Django 4.2.3 on 2026-10-18 13:14
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+import django.utils.timezone
+
+
+def fill_added_at(apps, schema_editor):
+    """
+    Дата добавления существующих записей неизвестна.
+    Берётся дата публикации рецепта, чтобы старые добавления
+    не считались свежими при первом расчёте рейтинга.
+    """
+
+    Recipe = apps.get_model('recipes', 'Recipe')
+    for model_name in ('FavoriteRecipeUser', 'ShoppingCartUser'):
+        apps.get_model('recipes', model_name).objects.update(
+            added_at=Subquery(
+                Recipe.objects.filter(
+                    pk=OuterRef('recipe_id'),
+                ).values('pub_date')[:1]
+            ),
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0006_recipe_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='favoriterecipeuser',
+            name='added_at',
+            field=models.DateTimeField(db_index=True, default=django.utils.timezone.now, verbose_name='Дата добавления'),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='trending_score',
+            field=models.FloatField(default=0, verbose_name='Рейтинг популярности за последние дни'),
+        ),
+        migrations.AddField(
+            model_name='shoppingcartuser',
+            name='added_at',
+            field=models.DateTimeField(db_index=True, default=django.utils.timezone.now, verbose_name='Дата добавления'),
+        ),
+        migrations.RunPython(fill_added_at, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['-favorites_count', '-id'], name='recipe_popular_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['-trending_score', '-id'], name='recipe_trending_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['cooking_time', '-id'], name='recipe_quickest_idx'),
+        ),
+    ]
@@ -0,0 +1,60 @@
+"""Полнотекстовый индекс рецептов (PostgreSQL и SQLite FTS5)."""
+from django.db import migrations
+
+POSTGRESQL = (
+    'CREATE TABLE IF NOT EXISTS recipes_recipe_search ('
+    'recipe_id bigint PRIMARY KEY REFERENCES recipes_recipe (id) '
+    'ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED, '
+    'document tsvector NOT NULL)',
+    'CREATE INDEX IF NOT EXISTS recipes_recipe_search_document '
+    'ON recipes_recipe_search USING gin (document)',
+    'INSERT INTO recipes_recipe_search (recipe_id, document) '
+    "SELECT r.id, setweight(to_tsvector('russian', r.name), 'A') || "
+    "setweight(to_tsvector('russian', "
+    "coalesce(string_agg(i.name, ' '), '')), 'B') || "
+    "setweight(to_tsvector('russian', r.text), 'C') "
+    'FROM recipes_recipe r '
+    'LEFT JOIN recipes_ingredientrecipe ir ON ir.recipe_id = r.id '
+    'LEFT JOIN recipes_ingredient i ON i.id = ir.ingredient_id '
+    'GROUP BY r.id ON CONFLICT (recipe_id) DO NOTHING',
+)
+
+SQLITE = (
+    'CREATE VIRTUAL TABLE IF NOT EXISTS recipes_recipe_search '
+    "USING fts5(name, ingredients, text, tokenize='unicode61')",
+    'INSERT INTO recipes_recipe_search (rowid, name, ingredients, text) '
+    "SELECT r.id, r.name, coalesce(group_concat(i.name, ' '), ''), r.text "
+    'FROM recipes_recipe r '
+    'LEFT JOIN recipes_ingredientrecipe ir ON ir.recipe_id = r.id '
+    'LEFT JOIN recipes_ingredient i ON i.id = ir.ingredient_id '
+    'GROUP BY r.id',
+)
+
+
+def create_index(apps, schema_editor):
+    """Создаёт и заполняет таблицу полнотекстового индекса."""
+
+    statements = {
+        'postgresql': POSTGRESQL,
+        'sqlite': SQLITE,
+    }.get(schema_editor.connection.vendor, ())
+    for sql in statements:
+        schema_editor.execute(sql)
+
+
+def drop_index(apps, schema_editor):
+    """Удаляет таблицу полнотекстового индекса."""
+
+    if schema_editor.connection.vendor in ('postgresql', 'sqlite'):
+        schema_editor.execute('DROP TABLE IF EXISTS recipes_recipe_search')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0007_recipe_ordering'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
@@ -1,9 +1,28 @@
 """Модели приложения recipes."""
+import itertools
+import math
+from datetime import datetime, time, timedelta
+
+import numpy as np
+from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
 from django.core.validators import MaxValueValidator, MinValueValidator
-from django.db import models
+from django.db import connection, models, transaction
+from django.db.models import Count, F, FilteredRelation, Q, Sum, Window
+from django.db.models.functions import (
+    Coalesce,
+    Greatest,
+    RowNumber,
+    TruncDate,
+)
+from django.utils import timezone
+from scipy import sparse
 
+from core.images.images import make_renditions
+from core.transfer.transfer import batched
 from core.validators.validators import ColorValidator
+from users.models import Follow, UserStats
 
 User = get_user_model()
 
@@ -50,6 +69,143 @@ class TagRecipe(models.Model):
         return self.name
 
 
+class RecipeManager(models.Manager):
+    """
+    Менеджер рецептов.
+    Пересчитывает рейтинг популярности за последние дни
+    и готовит изображения рецептов к раздаче.
+    """
+
+    def trending_scores(self, now=None):
+        """
+        Считает рейтинг рецептов по добавлениям в избранное и
+        в списки продуктов за TRENDING_WINDOW_DAYS дней.
+        Добавления группируются по дням, вклад каждого дня
+        убывает вдвое за TRENDING_HALF_LIFE_DAYS дней.
+        Возвращает словарь {id рецепта: рейтинг}.
+        """
+
+        now = now or timezone.now()
+        today = timezone.localdate(now)
+        since = timezone.make_aware(datetime.combine(
+            today - timedelta(days=settings.TRENDING_WINDOW_DAYS - 1),
+            time.min,
+        ))
+        scores = {}
+        for model, weight in (
+                (FavoriteRecipeUser, settings.TRENDING_FAVORITE_WEIGHT),
+                (ShoppingCartUser, settings.TRENDING_SHOPPING_CART_WEIGHT),
+        ):
+            for recipe_id, day, total in model.objects.filter(
+                    added_at__gte=since,
+                    added_at__lte=now,
+            ).annotate(
+                day=TruncDate('added_at'),
+            ).values('recipe_id', 'day').annotate(
+                total=Count('pk'),
+            ).values_list('recipe_id', 'day', 'total').iterator():
+                age = (today - day).days
+                scores[recipe_id] = scores.get(recipe_id, 0) + (
+                    weight * total
+                    * 0.5 ** (age / settings.TRENDING_HALF_LIFE_DAYS)
+                )
+        return {
+            recipe_id: round(score, 4)
+            for recipe_id, score in scores.items()
+        }
+
+    @transaction.atomic
+    def refresh_trending(self, now=None, batch_size=1000):
+        """
+        Сохраняет рейтинг популярности в поле trending_score.
+        Обновляются только рецепты, у которых рейтинг изменился.
+        Возвращает количество обновлённых рецептов.
+        """
+
+        scores = self.trending_scores(now)
+        stored = dict(
+            self.filter(trending_score__gt=0).values_list(
+                'id',
+                'trending_score',
+            )
+        )
+        changed = [
+            self.model(id=recipe_id, trending_score=score)
+            for recipe_id, score in scores.items()
+            if stored.get(recipe_id) != score
+        ]
+        self.bulk_update(changed, ('trending_score',), batch_size=batch_size)
+        outdated = stored.keys() - scores.keys()
+        self.filter(id__in=outdated).update(trending_score=0)
+        return len(changed) + len(outdated)
+
+    def process_image(self, recipe_id, force=False):
+        """
+        Пересохраняет изображение рецепта без метаданных
+        и с ограничением размера и создаёт варианты для srcset.
+        Если за время обработки изображение заменили, результат
+        отбрасывается. Прежние файлы освобождаются в хранилище.
+        Возвращает True, если изображение обработано.
+        """
+
+        recipe = self.filter(pk=recipe_id).only(
+            'image',
+            'image_renditions',
+        ).first()
+        if recipe is None or not recipe.image:
+            return False
+        if recipe.image_renditions and not force:
+            return False
+
+        storage = recipe.image.storage
+        original, renditions = make_renditions(storage, recipe.image.name)
+
+        # Файлы сохраняются в одной транзакции с рецептом, чтобы
+        # счётчики ссылок в хранилище не расходились с рецептами.
+        with transaction.atomic():
+            original = storage.save(
+                f'{Recipe.image.field.upload_to}/{original.name}',
+                original,
+            )
+            renditions = {
+                format_name: {
+                    width: storage.save(
+                        f'{Recipe.RENDITIONS_DIRECTORY}/{file.name}',
+                        file,
+                    )
+                    for width, file in sizes.items()
+                }
+                for format_name, sizes in renditions.items()
+            }
+            updated = self.filter(
+                pk=recipe_id,
+                image=recipe.image.name,
+            ).update(
+                image=original,
+                image_renditions=renditions,
+                updated_at=timezone.now(),
+            )
+            if updated:
+                obsolete = [recipe.image.name] + rendition_names(
+                    recipe.image_renditions,
+                )
+            else:
+                obsolete = [original] + rendition_names(renditions)
+            for name in obsolete:
+                storage.delete(name)
+        return bool(updated)
+
+
+def rendition_names(renditions):
+    """Имена файлов всех вариантов изображения."""
+
+    return [
+        name
+        for sizes in renditions.values()
+        for name in sizes.values()
+    ]
+
+
 class Recipe(models.Model):
     """Модель рецепта."""
 
@@ -66,6 +222,11 @@ class Recipe(models.Model):
         upload_to='recipes/images',
         verbose_name='Изображение',
     )
+    image_renditions = models.JSONField(
+        default=dict,
+        blank=True,
+        verbose_name='Варианты изображения',
+    )
     name = models.CharField(max_length=200, verbose_name='Название')
     text = models.TextField(verbose_name='Описание')
     cooking_time = models.PositiveIntegerField(
@@ -76,20 +237,62 @@ class Recipe(models.Model):
         auto_now_add=True,
         verbose_name='Дата публикации',
     )
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        verbose_name='Дата изменения',
+    )
+    favorites_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='В избранном',
+    )
+    shopping_cart_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='В списках продуктов',
+    )
+    trending_score = models.FloatField(
+        default=0,
+        verbose_name='Рейтинг популярности за последние дни',
+    )
+
+    objects = RecipeManager()
+
+    RENDITIONS_DIRECTORY = 'recipes/renditions'
 
     class Meta:
         ordering = ('-pub_date',)
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
+        indexes = (
+            models.Index(
+                fields=('-favorites_count', '-id'),
+                name='recipe_popular_idx',
+            ),
+            models.Index(
+                fields=('-trending_score', '-id'),
+                name='recipe_trending_idx',
+            ),
+            models.Index(
+                fields=('cooking_time', '-id'),
+                name='recipe_quickest_idx',
+            ),
+        )
 
     def __str__(self):
         return self.name
 
     @property
     def get_favorite_count(self):
-        """Считает количество добавлений рецепта в избранное."""
+        """Возвращает количество добавлений рецепта в избранное."""
 
-        return FavoriteRecipeUser.objects.filter(recipe=self).count()
+        return self.favorites_count
+
+    @classmethod
+    def increment(cls, recipe_id, field, delta=1):
+        """Атомарно изменяет счётчик рецепта, не опуская его ниже нуля."""
+
+        cls.objects.filter(pk=recipe_id).update(
+            **{field: Greatest(F(field) + delta, 0)}
+        )
 
 
 class IngredientRecipe(models.Model):
@@ -119,6 +322,80 @@ class IngredientRecipe(models.Model):
         return f'{self.ingredient} - {self.amount}'
 
 
+class UserRecipeListManager(models.Manager):
+    """
+    Менеджер списков рецептов пользователя.
+    Вместе со списком обновляет счётчик рецепта counter_field.
+    """
+
+    counter_field = None
+
+    @transaction.atomic
+    def add(self, user, recipe):
+        """Добавляет рецепт в список пользователя."""
+
+        obj = self.create(user=user, recipe=recipe)
+        Recipe.increment(recipe.id, self.counter_field)
+        return obj
+
+    @transaction.atomic
+    def remove(self, user, recipe_id):
+        """
+        Удаляет рецепт из списка пользователя.
+        Возвращает количество удалённых записей.
+        """
+
+        num_deleted, _ = self.filter(user=user, recipe_id=recipe_id).delete()
+        if num_deleted:
+            Recipe.increment(recipe_id, self.counter_field, -num_deleted)
+        return num_deleted
+
+
+class FavoriteRecipeManager(UserRecipeListManager):
+    """
+    Менеджер избранных рецептов.
+    Вместе с избранным пополняет ленту пользователя похожими рецептами.
+    """
+
+    counter_field = 'favorites_count'
+
+    @transaction.atomic
+    def add(self, user, recipe):
+        obj = super().add(user, recipe)
+        transaction.on_commit(
+            lambda: FeedEntry.objects.add_similar(user.id, recipe.id)
+        )
+        return obj
+
+
+class ShoppingCartManager(UserRecipeListManager):
+    """
+    Менеджер списков продуктов.
+    Вместе со списком обновляет суммы ингредиентов пользователя.
+    """
+
+    counter_field = 'shopping_cart_count'
+
+    @transaction.atomic
+    def add(self, user, recipe):
+        obj = super().add(user, recipe)
+        ShoppingCartIngredient.objects.apply(
+            {user.id: 1},
+            ShoppingCartIngredient.objects.recipe_amounts(recipe.id),
+        )
+        return obj
+
+    @transaction.atomic
+    def remove(self, user, recipe_id):
+        num_deleted = super().remove(user, recipe_id)
+        if num_deleted:
+            ShoppingCartIngredient.objects.apply(
+                {user.id: -num_deleted},
+                ShoppingCartIngredient.objects.recipe_amounts(recipe_id),
+            )
+        return num_deleted
+
+
 class FavoriteRecipeUser(models.Model):
     """Модель избранных рецептов пользователя."""
 
@@ -132,6 +409,13 @@ class FavoriteRecipeUser(models.Model):
         related_name='in_favorite',
         on_delete=models.CASCADE,
     )
+    added_at = models.DateTimeField(
+        default=timezone.now,
+        db_index=True,
+        verbose_name='Дата добавления',
+    )
+
+    objects = FavoriteRecipeManager()
 
     class Meta:
         verbose_name = 'Избранный рецепт'
@@ -160,6 +444,13 @@ class ShoppingCartUser(models.Model):
         related_name='recipes_in_shopping_cart',
         on_delete=models.CASCADE,
     )
+    added_at = models.DateTimeField(
+        default=timezone.now,
+        db_index=True,
+        verbose_name='Дата добавления',
+    )
+
+    objects = ShoppingCartManager()
 
     class Meta:
         verbose_name = 'Список продуктов пользователя'
@@ -167,3 +458,754 @@ class ShoppingCartUser(models.Model):
 
     def __str__(self):
         return f'{self.user} - {self.shopping_card}'
+
+
+class ShoppingCartIngredientManager(models.Manager):
+    """
+    Менеджер сумм ингредиентов в списках продуктов.
+    Суммы обновляются по разнице, без пересчёта всего списка.
+    """
+
+    def recipe_amounts(self, recipe_id):
+        """Возвращает количество каждого ингредиента рецепта."""
+
+        return dict(
+            IngredientRecipe.objects.filter(
+                recipe_id=recipe_id,
+                ingredient__isnull=False,
+            ).values('ingredient_id').annotate(
+                total=Sum('amount'),
+            ).values_list('ingredient_id', 'total')
+        )
+
+    @transaction.atomic
+    def apply(self, users, amounts):
+        """
+        Применяет изменения количества ингредиентов к спискам продуктов.
+        users - словарь {id пользователя: сколько раз применить изменения},
+        amounts - словарь {id ингредиента: изменение количества}.
+        Новые суммы записываются одной вставкой с обновлением
+        при конфликте, обнулённые удаляются одним запросом, поэтому
+        количество запросов не зависит от того, какие суммы уже есть.
+        """
+
+        amounts = {
+            ingredient_id: amount
+            for ingredient_id, amount in amounts.items()
+            if amount
+        }
+        if not users or not amounts:
+            return
+
+        rows = {
+            (row.user_id, row.ingredient_id): row
+            for row in self.select_for_update().filter(
+                user_id__in=users,
+                ingredient_id__in=amounts,
+            )
+        }
+        to_save = []
+        for user_id, times in users.items():
+            for ingredient_id, amount in amounts.items():
+                row = rows.get((user_id, ingredient_id))
+                total = amount * times + (row.amount if row else 0)
+                if row is None and total <= 0:
+                    continue
+                to_save.append(self.model(
+                    user_id=user_id,
+                    ingredient_id=ingredient_id,
+                    amount=max(total, 0),
+                ))
+
+        self.bulk_create(
+            to_save,
+            update_conflicts=True,
+            unique_fields=('user', 'ingredient'),
+            update_fields=('amount',),
+        )
+        self.filter(
+            user_id__in=users,
+            ingredient_id__in=amounts,
+            amount=0,
+        ).delete()
+
+    def change_recipe(self, recipe_id, old_amounts, new_amounts=None):
+        """
+        Обновляет суммы у всех пользователей с рецептом в списке продуктов
+        после изменения ингредиентов рецепта.
+        """
+
+        if new_amounts is None:
+            new_amounts = self.recipe_amounts(recipe_id)
+        amounts = {
+            ingredient_id: (
+                new_amounts.get(ingredient_id, 0)
+                - old_amounts.get(ingredient_id, 0)
+            )
+            for ingredient_id in {*old_amounts, *new_amounts}
+        }
+        users = {}
+        for user_id in ShoppingCartUser.objects.filter(
+                recipe_id=recipe_id,
+        ).values_list('user_id', flat=True):
+            users[user_id] = users.get(user_id, 0) + 1
+        self.apply(users, amounts)
+
+    def expected(self, user_ids=None):
+        """
+        Пересчитывает суммы по спискам продуктов.
+        Возвращает итератор кортежей (пользователь, ингредиент, количество),
+        упорядоченных по пользователю и ингредиенту.
+        """
+
+        prefix = 'recipe__ingredients_in_recipe__'
+        queryset = ShoppingCartUser.objects.filter(
+            **{f'{prefix}ingredient__isnull': False}
+        )
+        if user_ids is not None:
+            queryset = queryset.filter(user_id__in=user_ids)
+        return queryset.values(
+            'user_id',
+            ingredient=F(f'{prefix}ingredient_id'),
+        ).annotate(
+            total=Sum(f'{prefix}amount'),
+        ).order_by('user_id', 'ingredient').values_list(
+            'user_id',
+            'ingredient',
+            'total',
+        ).iterator()
+
+    def find_drift(self, user_ids=None):
+        """
+        Сравнивает сохранённые суммы с пересчитанными.
+        Возвращает итератор расхождений
+        (пользователь, ингредиент, ожидаемое, сохранённое).
+        """
+
+        stored = self.all()
+        if user_ids is not None:
+            stored = stored.filter(user_id__in=user_ids)
+        stored = stored.order_by('user_id', 'ingredient_id').values_list(
+            'user_id',
+            'ingredient_id',
+            'amount',
+        ).iterator()
+        expected = self.expected(user_ids)
+
+        actual_row = next(stored, None)
+        expected_row = next(expected, None)
+        while actual_row or expected_row:
+            actual_key = actual_row and actual_row[:2]
+            expected_key = expected_row and expected_row[:2]
+            if actual_row is None or (
+                    expected_row is not None and expected_key < actual_key
+            ):
+                yield (*expected_key, expected_row[2], 0)
+                expected_row = next(expected, None)
+            elif expected_row is None or actual_key < expected_key:
+                yield (*actual_key, 0, actual_row[2])
+                actual_row = next(stored, None)
+            else:
+                if actual_row[2] != expected_row[2]:
+                    yield (*actual_key, expected_row[2], actual_row[2])
+                actual_row = next(stored, None)
+                expected_row = next(expected, None)
+
+    @transaction.atomic
+    def rebuild(self, user_ids=None, batch_size=1000):
+        """Пересобирает суммы ингредиентов в списках продуктов."""
+
+        stored = self.all()
+        if user_ids is not None:
+            stored = stored.filter(user_id__in=user_ids)
+        stored.delete()
+
+        batch = []
+        for user_id, ingredient_id, amount in self.expected(user_ids):
+            batch.append(self.model(
+                user_id=user_id,
+                ingredient_id=ingredient_id,
+                amount=amount,
+            ))
+            if len(batch) >= batch_size:
+                self.bulk_create(batch)
+                batch = []
+        self.bulk_create(batch)
+
+
+class ShoppingCartIngredient(models.Model):
+    """Модель суммы ингредиента в списке продуктов пользователя."""
+
+    user = models.ForeignKey(
+        User,
+        related_name='shopping_cart_ingredients',
+        on_delete=models.CASCADE,
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        related_name='in_shopping_carts',
+        on_delete=models.CASCADE,
+        verbose_name='Ингредиент',
+    )
+    amount = models.PositiveIntegerField(verbose_name='Количество')
+
+    objects = ShoppingCartIngredientManager()
+
+    class Meta:
+        verbose_name = 'Ингредиент в списке продуктов'
+        verbose_name_plural = 'Ингредиенты в списках продуктов'
+        constraints = (
+            models.UniqueConstraint(
+                fields=('user', 'ingredient'),
+                name='unique_shopping_cart_ingredient',
+            ),
+        )
+
+    def __str__(self):
+        return f'{self.user} - {self.ingredient} - {self.amount}'
+
+
+class SimilarRecipeManager(models.Manager):
+    """
+    Менеджер таблицы похожих рецептов.
+    Рецепт описывается разреженным вектором ингредиентов (с весами IDF)
+    и тегов (с весом SIMILAR_RECIPES_TAG_WEIGHT). Похожесть -
+    косинусная мера, соседями считаются только рецепты хотя бы
+    с одним общим ингредиентом. Для каждого рецепта хранятся
+    SIMILAR_RECIPES_LIMIT ближайших соседей. Таблица обновляется
+    не при сохранении рецепта, а командой refresh_similar
+    из PERIODIC_TASKS.
+    """
+
+    block_size = 1000
+    refreshed_key = 'similar_recipes:refreshed_at'
+
+    @staticmethod
+    def compositions(recipe_ids=None):
+        """
+        Возвращает словарь
+        {id рецепта: (множество ингредиентов, множество тегов)}.
+        """
+
+        ingredients = IngredientRecipe.objects.filter(
+            recipe__isnull=False,
+            ingredient__isnull=False,
+        )
+        tags = Recipe.tags.through.objects.all()
+        if recipe_ids is not None:
+            ingredients = ingredients.filter(recipe_id__in=recipe_ids)
+            tags = tags.filter(recipe_id__in=recipe_ids)
+
+        compositions = {}
+        for recipe_id, ingredient_id in ingredients.values_list(
+                'recipe_id',
+                'ingredient_id',
+        ).iterator():
+            compositions.setdefault(
+                recipe_id,
+                (set(), set()),
+            )[0].add(ingredient_id)
+        for recipe_id, tag_id in tags.values_list(
+                'recipe_id',
+                'tagrecipe_id',
+        ).iterator():
+            if recipe_id in compositions:
+                compositions[recipe_id][1].add(tag_id)
+        return compositions
+
+    @staticmethod
+    def vectors(compositions, frequencies, total):
+        """
+        Строит нормированные векторы рецептов.
+        frequencies - словарь {ингредиент: количество рецептов с ним},
+        total - общее количество рецептов.
+        Возвращает массив id рецептов и матрицы CSR
+        ингредиентной и теговой частей векторов.
+        """
+
+        recipe_ids = np.array(sorted(compositions), dtype=np.int64)
+        ingredient_columns = {
+            ingredient_id: column
+            for column, ingredient_id in enumerate(sorted(frequencies))
+        }
+        tag_columns = {
+            tag_id: column
+            for column, tag_id in enumerate(sorted({
+                tag_id
+                for _, tag_ids in compositions.values()
+                for tag_id in tag_ids
+            }))
+        }
+        idf = {
+            ingredient_id: math.log((1 + total) / (1 + frequency)) + 1
+            for ingredient_id, frequency in frequencies.items()
+        }
+        tag_weight = settings.SIMILAR_RECIPES_TAG_WEIGHT
+
+        ingredient_data, ingredient_indices, ingredient_indptr = [], [], [0]
+        tag_data, tag_indices, tag_indptr = [], [], [0]
+        for recipe_id in recipe_ids.tolist():
+            ingredient_ids, tag_ids = compositions[recipe_id]
+            norm = math.sqrt(
+                sum(idf[item] ** 2 for item in ingredient_ids)
+                + tag_weight ** 2 * len(tag_ids)
+            )
+            for ingredient_id in ingredient_ids:
+                ingredient_indices.append(ingredient_columns[ingredient_id])
+                ingredient_data.append(idf[ingredient_id] / norm)
+            for tag_id in tag_ids:
+                tag_indices.append(tag_columns[tag_id])
+                tag_data.append(tag_weight / norm)
+            ingredient_indptr.append(len(ingredient_indices))
+            tag_indptr.append(len(tag_indices))
+
+        shape = len(recipe_ids)
+        return (
+            recipe_ids,
+            sparse.csr_matrix(
+                (ingredient_data, ingredient_indices, ingredient_indptr),
+                shape=(shape, len(ingredient_columns)),
+                dtype=np.float32,
+            ),
+            sparse.csr_matrix(
+                (tag_data, tag_indices, tag_indptr),
+                shape=(shape, len(tag_columns)),
+                dtype=np.float32,
+            ),
+        )
+
+    @staticmethod
+    def similarity(left, right):
+        """
+        Косинусная мера между строками двух наборов векторов
+        (ингредиентная и теговая части). Считается только для пар
+        с общими ингредиентами. Возвращает массивы
+        (строка left, строка right, мера).
+        """
+
+        scores = (left[0] @ right[0].T).tocoo()
+        rows, columns = scores.row, scores.col
+        tags = np.asarray(
+            left[1][rows].multiply(right[1][columns]).sum(axis=1),
+        ).ravel()
+        return rows, columns, scores.data + tags
+
+    @staticmethod
+    def top(rows, columns, scores, limit):
+        """Оставляет limit пар с наибольшей мерой для каждой строки."""
+
+        order = np.lexsort((-scores, rows))
+        rows, columns, scores = rows[order], columns[order], scores[order]
+        starts = np.searchsorted(rows, rows, side='left')
+        keep = np.arange(len(rows)) - starts < limit
+        return rows[keep], columns[keep], scores[keep]
+
+    def insert(self, rows, batch_size=5000):
+        """
+        Вставляет пары (рецепт, похожий рецепт, мера) пакетами
+        через executemany: объекты моделей для сотен тысяч пар
+        создавать слишком дорого. Возвращает количество пар.
+        """
+
+        table = self.model._meta.db_table
+        sql = (
+            f'INSERT INTO {table} (recipe_id, similar_id, score) '
+            'VALUES (%s, %s, %s)'
+        )
+        inserted = 0
+        with connection.cursor() as cursor:
+            for batch in batched(rows, batch_size):
+                cursor.executemany(sql, batch)
+                inserted += len(batch)
+        return inserted
+
+    def frequencies(self, ingredient_ids=None):
+        """Количество рецептов с каждым ингредиентом."""
+
+        queryset = IngredientRecipe.objects.filter(
+            recipe__isnull=False,
+            ingredient__isnull=False,
+        )
+        if ingredient_ids is not None:
+            queryset = queryset.filter(ingredient_id__in=ingredient_ids)
+        return dict(
+            queryset.values('ingredient_id').annotate(
+                total=Count('recipe_id', distinct=True),
+            ).values_list('ingredient_id', 'total')
+        )
+
+    def nearest(self, recipe_ids, ingredients, tags, positions):
+        """
+        Находит SIMILAR_RECIPES_LIMIT соседей рецептов в строках
+        positions среди всех векторов. Векторы перемножаются блоками
+        по block_size строк. Возвращает итератор троек
+        (рецепт, похожий рецепт, мера).
+        """
+
+        for start in range(0, len(positions), self.block_size):
+            block = positions[start:start + self.block_size]
+            rows, columns, scores = self.similarity(
+                (ingredients[block], tags[block]),
+                (ingredients, tags),
+            )
+            rows = block[rows]
+            other = rows != columns
+            rows, columns, scores = self.top(
+                rows[other],
+                columns[other],
+                scores[other],
+                settings.SIMILAR_RECIPES_LIMIT,
+            )
+            yield from zip(
+                recipe_ids[rows].tolist(),
+                recipe_ids[columns].tolist(),
+                scores.tolist(),
+            )
+
+    def all_vectors(self):
+        """Векторы всех рецептов с ингредиентами."""
+
+        return self.vectors(
+            self.compositions(),
+            self.frequencies(),
+            Recipe.objects.count(),
+        )
+
+    @transaction.atomic
+    def rebuild(self):
+        """
+        Пересчитывает соседей всех рецептов и запоминает время
+        запуска для refresh_changed.
+        Возвращает количество сохранённых пар.
+        """
+
+        started = timezone.now()
+        recipe_ids, ingredients, tags = self.all_vectors()
+        self.all().delete()
+        created = self.insert(self.nearest(
+            recipe_ids,
+            ingredients,
+            tags,
+            np.arange(len(recipe_ids)),
+        ))
+        cache.set(self.refreshed_key, started, None)
+        return created
+
+    @transaction.atomic
+    def refresh(self, recipe_ids):
+        """
+        Обновляет соседей изменённых рецептов без полного пересчёта.
+        Кроме них заново считаются соседи рецептов, у которых
+        изменённые рецепты были в списке или могут в него попасть
+        (есть общие ингредиенты), поэтому списки не укорачиваются.
+        Списки фильтров по id разбиваются на пакеты по block_size.
+        Возвращает количество сохранённых пар.
+        """
+
+        recipe_ids = set(recipe_ids)
+        vector_ids, ingredients, tags = self.all_vectors()
+        changed = np.flatnonzero(np.isin(vector_ids, list(recipe_ids)))
+        _, columns, _ = self.similarity(
+            (ingredients[changed], tags[changed]),
+            (ingredients, tags),
+        )
+        affected = recipe_ids | set(vector_ids[columns].tolist())
+        for batch in batched(recipe_ids, self.block_size):
+            affected.update(self.filter(
+                similar_id__in=batch,
+            ).values_list('recipe_id', flat=True))
+
+        for batch in batched(affected, self.block_size):
+            self.filter(recipe_id__in=batch).delete()
+        return self.insert(self.nearest(
+            vector_ids,
+            ingredients,
+            tags,
+            np.flatnonzero(np.isin(vector_ids, list(affected))),
+        ))
+
+    def refresh_changed(self):
+        """
+        Обновляет соседей рецептов, изменённых с прошлого запуска.
+        Время запуска хранится в общем кэше; окно захватывает
+        SIMILAR_RECIPES_SYNC_OVERLAP секунд назад, чтобы не пропустить
+        транзакции, зафиксированные с задержкой. Без сохранённого
+        времени выполняется полный пересчёт.
+        Возвращает количество сохранённых пар.
+        """
+
+        since = cache.get(self.refreshed_key)
+        if since is None:
+            return self.rebuild()
+        started = timezone.now()
+        created = self.refresh(Recipe.objects.filter(
+            updated_at__gte=since - timedelta(
+                seconds=settings.SIMILAR_RECIPES_SYNC_OVERLAP,
+            ),
+        ).values_list('id', flat=True))
+        cache.set(self.refreshed_key, started, None)
+        return created
+
+
+class SimilarRecipe(models.Model):
+    """Модель похожего рецепта (предрассчитанные соседи)."""
+
+    recipe = models.ForeignKey(
+        Recipe,
+        related_name='similar_recipes',
+        on_delete=models.CASCADE,
+    )
+    similar = models.ForeignKey(
+        Recipe,
+        related_name='similar_to',
+        on_delete=models.CASCADE,
+    )
+    score = models.FloatField(verbose_name='Похожесть')
+
+    objects = SimilarRecipeManager()
+
+    class Meta:
+        verbose_name = 'Похожий рецепт'
+        verbose_name_plural = 'Похожие рецепты'
+        constraints = (
+            models.UniqueConstraint(
+                fields=('recipe', 'similar'),
+                name='unique_similar_recipe',
+            ),
+        )
+        indexes = (
+            models.Index(
+                fields=('recipe', '-score'),
+                name='similar_recipe_score_idx',
+            ),
+        )
+
+    def __str__(self):
+        return f'{self.recipe} - {self.similar}'
+
+
+class FeedEntryManager(models.Manager):
+    """
+    Менеджер персональных лент.
+    Новые рецепты раскладываются по лентам подписчиков при публикации.
+    Рецепты авторов, у которых подписчиков больше FEED_FANOUT_LIMIT,
+    не раскладываются, а подмешиваются в ленту при чтении.
+    Длина ленты ограничивается до FEED_LENGTH командой trim_feeds.
+    """
+
+    @staticmethod
+    def is_popular(author_id):
+        """Рецепты автора подмешиваются при чтении, а не раскладываются."""
+
+        return UserStats.objects.filter(
+            user_id=author_id,
+            followers_count__gt=settings.FEED_FANOUT_LIMIT,
+        ).exists()
+
+    def fan_out(self, recipe):
+        """
+        Добавляет рецепт в ленты подписчиков автора одним запросом.
+        Возвращает количество добавленных записей.
+        """
+
+        if self.is_popular(recipe.author_id):
+            return 0
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {self.model._meta.db_table} '
+                '(user_id, recipe_id, created, reason) '
+                'SELECT follower_id, %s, %s, %s '
+                f'FROM {Follow._meta.db_table} WHERE following_id = %s '
+                'ON CONFLICT DO NOTHING',
+                (
+                    recipe.id,
+                    connection.ops.adapt_datetimefield_value(
+                        recipe.pub_date,
+                    ),
+                    self.model.FOLLOW,
+                    recipe.author_id,
+                ),
+            )
+            return cursor.rowcount
+
+    def follow(self, user, author):
+        """Добавляет в ленту последние рецепты нового автора."""
+
+        if self.is_popular(author.id):
+            return
+        self.bulk_create(
+            (
+                self.model(
+                    user=user,
+                    recipe_id=recipe_id,
+                    created=pub_date,
+                    reason=self.model.FOLLOW,
+                )
+                for recipe_id, pub_date in author.recipes.order_by(
+                    '-pub_date',
+                ).values_list('id', 'pub_date')[:settings.FEED_LENGTH]
+            ),
+            ignore_conflicts=True,
+        )
+
+    def unfollow(self, user, author):
+        """Убирает из ленты рецепты автора."""
+
+        self.filter(
+            user=user,
+            recipe__author=author,
+            reason=self.model.FOLLOW,
+        ).delete()
+
+    def add_similar(self, user_id, recipe_id):
+        """
+        Добавляет в ленту рецепты, похожие на добавленный в избранное,
+        одним запросом INSERT ... SELECT. Свои и уже избранные рецепты
+        пропускаются. Возвращает количество добавленных записей.
+        """
+
+        similar = SimilarRecipe.objects.filter(
+            recipe_id=recipe_id,
+        ).exclude(
+            similar__author_id=user_id,
+        ).exclude(
+            similar__in_favorite__user_id=user_id,
+        ).order_by('-score').annotate(
+            feed_user=models.Value(user_id),
+            feed_recipe=F('similar_id'),
+            feed_created=models.Value(
+                timezone.now(),
+                output_field=models.DateTimeField(),
+            ),
+            feed_reason=models.Value(self.model.SIMILAR),
+        ).values_list(
+            'feed_user',
+            'feed_recipe',
+            'feed_created',
+            'feed_reason',
+        )[:settings.FEED_SIMILAR_PER_FAVORITE]
+        sql, params = similar.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {self.model._meta.db_table} '
+                '(user_id, recipe_id, created, reason) '
+                f'SELECT * FROM ({sql}) similar_recipes WHERE TRUE '
+                'ON CONFLICT DO NOTHING',
+                params,
+            )
+            return cursor.rowcount
+
+    def trim(self, user_ids=None, batch_size=1000):
+        """
+        Удаляет записи сверх FEED_LENGTH последних в каждой ленте.
+        Возвращает количество удалённых записей.
+        """
+
+        queryset = self.all()
+        if user_ids is not None:
+            queryset = queryset.filter(user_id__in=user_ids)
+        outdated = queryset.annotate(
+            position=Window(
+                RowNumber(),
+                partition_by=F('user_id'),
+                order_by=(F('created').desc(), F('id').desc()),
+            ),
+        ).filter(
+            position__gt=settings.FEED_LENGTH,
+        ).values_list('id', flat=True).iterator()
+
+        deleted = 0
+        while batch := list(itertools.islice(outdated, batch_size)):
+            deleted += self.filter(id__in=batch).delete()[0]
+        return deleted
+
+    def feed(self, user):
+        """
+        Возвращает ленту пользователя: рецепты из его записей ленты
+        и рецепты популярных авторов из подписок за последние
+        FEED_POPULAR_WINDOW_DAYS дней. Время в ленте (feed_at) -
+        время записи, для рецептов популярных авторов - публикации.
+        """
+
+        popular = Follow.objects.filter(
+            follower=user,
+            following__stats__followers_count__gt=settings.FEED_FANOUT_LIMIT,
+        ).values('following_id')
+        since = timezone.now() - timedelta(
+            days=settings.FEED_POPULAR_WINDOW_DAYS,
+        )
+        return Recipe.objects.annotate(
+            entry=FilteredRelation(
+                'feed_entries',
+                condition=Q(feed_entries__user=user),
+            ),
+        ).filter(
+            Q(entry__isnull=False)
+            | Q(author_id__in=popular, pub_date__gte=since)
+        ).annotate(
+            feed_at=Coalesce('entry__created', 'pub_date'),
+        ).order_by('-feed_at', '-id')
+
+
+class FeedEntry(models.Model):
+    """Модель записи персональной ленты пользователя."""
+
+    FOLLOW = 'follow'
+    SIMILAR = 'similar'
+    REASONS = (
+        (FOLLOW, 'Подписка на автора'),
+        (SIMILAR, 'Похож на избранное'),
+    )
+
+    user = models.ForeignKey(
+        User,
+        related_name='feed_entries',
+        on_delete=models.CASCADE,
+    )
+    recipe = models.ForeignKey(
+        Recipe,
+        related_name='feed_entries',
+        on_delete=models.CASCADE,
+    )
+    created = models.DateTimeField(verbose_name='Время в ленте')
+    reason = models.CharField(
+        max_length=16,
+        choices=REASONS,
+        verbose_name='Причина',
+    )
+
+    objects = FeedEntryManager()
+
+    class Meta:
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Записи лент'
+        constraints = (
+            models.UniqueConstraint(
+                fields=('user', 'recipe'),
+                name='unique_feed_entry',
+            ),
+        )
+        indexes = (
+            models.Index(
+                fields=('user', '-created', '-id'),
+                name='feed_entry_user_created_idx',
+            ),
+        )
+
+    def __str__(self):
+        return f'{self.user} - {self.recipe}'
+
+
+def release_recipe_images(sender, instance, **kwargs):
+    """
+    Освобождает изображение и варианты удалённого рецепта.
+    Файлы удаляются хранилищем, когда на них не осталось ссылок.
+    """
+
+    if not instance.image:
+        return
+    storage = instance.image.storage
+    for name in [instance.image.name] + rendition_names(
+            instance.image_renditions,
+    ):
+        storage.delete(name)
@@ -4,6 +4,8 @@ from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
 from django.contrib.auth import get_user_model
 from django.contrib.auth.forms import UserChangeForm, UserCreationForm
 
+from users.models import UserStats
+
 User = get_user_model()
 
 
@@ -62,3 +64,12 @@ class CustomUserAdmin(BaseUserAdmin):
 
 admin.site.unregister(User)
 admin.site.register(User, CustomUserAdmin)
+
+
+@admin.register(UserStats)
+class UserStatsAdmin(admin.ModelAdmin):
+    """Регистрация счётчиков авторов в админке."""
+
+    list_display = ('user', 'recipes_count', 'followers_count')
+    readonly_fields = ('recipes_count', 'followers_count')
+    search_fields = ('user__username',)
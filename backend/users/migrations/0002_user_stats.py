@@ -0,0 +1,63 @@
+# Generated by Django 4.2.3 on 2026-10-18 13:11
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+import django.db.models.deletion
+
+
+def fill_user_stats(apps, schema_editor):
+    """Заполняет счётчики рецептов и подписчиков авторов."""
+
+    User = apps.get_model(*settings.AUTH_USER_MODEL.split('.'))
+    Recipe = apps.get_model('recipes', 'Recipe')
+    Follow = apps.get_model('users', 'Follow')
+    UserStats = apps.get_model('users', 'UserStats')
+
+    recipes = Recipe.objects.filter(
+        author=OuterRef('pk'),
+    ).order_by().values('author').annotate(total=Count('pk'))
+    followers = Follow.objects.filter(
+        following=OuterRef('pk'),
+    ).order_by().values('following').annotate(total=Count('pk'))
+    rows = User.objects.annotate(
+        recipes_total=Coalesce(Subquery(recipes.values('total')), 0),
+        followers_total=Coalesce(Subquery(followers.values('total')), 0),
+    ).values_list('pk', 'recipes_total', 'followers_total')
+    UserStats.objects.bulk_create(
+        (
+            UserStats(
+                user_id=user_id,
+                recipes_count=recipes_count,
+                followers_count=followers_count,
+            )
+            for user_id, recipes_count, followers_count in rows.iterator()
+        ),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('users', '0001_initial'),
+        ('recipes', '0006_recipe_counters'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserStats',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to=settings.AUTH_USER_MODEL, verbose_name='пользователь')),
+                ('recipes_count', models.PositiveIntegerField(default=0, verbose_name='рецептов')),
+                ('followers_count', models.PositiveIntegerField(default=0, verbose_name='подписчиков')),
+            ],
+            options={
+                'verbose_name': 'Счётчики автора',
+                'verbose_name_plural': 'Счётчики авторов',
+            },
+        ),
+        migrations.RunPython(fill_user_stats, migrations.RunPython.noop),
+    ]
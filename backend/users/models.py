@@ -1,7 +1,8 @@
 """Модель подписки."""
 from django.contrib.auth import get_user_model
 from django.db import models
-from django.db.models import CheckConstraint, UniqueConstraint
+from django.db.models import CheckConstraint, F, UniqueConstraint
+from django.db.models.functions import Greatest
 
 User = get_user_model()
 
@@ -38,3 +39,47 @@ class Follow(models.Model):
 
     def __str__(self):
         return f'{self.follower} подписан на {self.following}'
+
+
+class UserStatsManager(models.Manager):
+    """Менеджер счётчиков пользователя."""
+
+    def increment(self, user_id, field, delta=1):
+        """
+        Атомарно изменяет счётчик пользователя, не опуская его ниже нуля.
+        Строка счётчиков создаётся при первом изменении.
+        """
+
+        update = {field: Greatest(F(field) + delta, 0)}
+        if not self.filter(user_id=user_id).update(**update):
+            self.get_or_create(user_id=user_id)
+            self.filter(user_id=user_id).update(**update)
+
+
+class UserStats(models.Model):
+    """Модель счётчиков автора."""
+
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stats',
+        verbose_name='пользователь',
+    )
+    recipes_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='рецептов',
+    )
+    followers_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='подписчиков',
+    )
+
+    objects = UserStatsManager()
+
+    class Meta:
+        verbose_name = 'Счётчики автора'
+        verbose_name_plural = 'Счётчики авторов'
+
+    def __str__(self):
+        return f'{self.user}: {self.recipes_count} / {self.followers_count}'
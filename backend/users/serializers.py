@@ -40,6 +40,10 @@ class CustomUserSerializer(UserCreateSerializer):
         }
 
     def get_is_subscribed(self, obj):
+        flags = self.context.get('flags')
+        if flags is not None:
+            return obj.id in flags['subscribed']
+
         request = self.context.get('request')
 
         if request.user.is_anonymous:
@@ -12,8 +12,16 @@ router = DefaultRouter()
 router.register('users', CustomUserViewSet, basename='users')
 
 urlpatterns = [
-    path('users/subscriptions/', SubscriptionsView.as_view()),
-    path('users/<int:id>/subscribe/', FollowUserView.as_view()),
+    path(
+        'users/subscriptions/',
+        SubscriptionsView.as_view(),
+        name='subscriptions',
+    ),
+    path(
+        'users/<int:id>/subscribe/',
+        FollowUserView.as_view(),
+        name='subscribe',
+    ),
     path('', include(router.urls)),
     path('', include('djoser.urls')),
     path('auth/', include('djoser.urls.authtoken')),
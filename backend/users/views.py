@@ -1,6 +1,7 @@
 """Обработчики приложения users."""
 from django.contrib.auth import get_user_model
 from djoser.views import UserViewSet
+from rest_framework.response import Response
 
 from users.serializers import CustomUserSerializer
 
@@ -13,3 +14,33 @@ class CustomUserViewSet(UserViewSet):
     queryset = User.objects.all()
     serializer_class = CustomUserSerializer
     pagination_class = None
+
+    def get_subscribed(self, users):
+        """
+        Метод для получения подписок текущего пользователя на набор
+        пользователей. Выполняется одним запросом, а не запросом
+        на каждого пользователя.
+        """
+
+        user = self.request.user
+        if user.is_anonymous or not users:
+            return set()
+        return set(
+            user.follower.filter(
+                following_id__in=[obj.id for obj in users],
+            ).values_list('following_id', flat=True)
+        )
+
+    def list(self, request, *args, **kwargs):
+        """Метод вывода списка пользователей."""
+
+        queryset = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(queryset)
+        users = list(queryset) if page is None else page
+        context = self.get_serializer_context()
+        context['flags'] = {'subscribed': self.get_subscribed(users)}
+        serializer = self.get_serializer(users, many=True, context=context)
+
+        if page is None:
+            return Response(serializer.data)
+        return self.get_paginated_response(serializer.data)